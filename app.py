@@ -1,30 +1,39 @@
 import streamlit as st
 import pandas as pd
 import scraper
-import os
-import subprocess
+from result_cache import ResultCache
+from price_history import PriceHistory
+from workbook import (merge_results, export_results, iter_sheet, read_columns, read_header,
+                      supports_streaming, STAR_COLUMNS)
+from canonical import canonical_url
+from collections import deque
+from itertools import islice
+from journal import journal_for
+from browser_pool import ensure_chromium_installed
+from metrics import shared_metrics
+import hashlib
 from datetime import datetime
 import time
 from io import BytesIO
 
-# --- Helper: Install Playwright Browsers ---
-def install_playwright():
-    """Ensure Playwright browsers are installed (essential for Cloud)"""
-    try:
-        # Check if we can run a simple playwright command, if not, install
-        subprocess.run(["playwright", "install", "chromium"], check=True)
-    except Exception as e:
-        st.error(f"Failed to install Playwright browsers: {e}")
-
-# Call installation once
-if "playwright_installed" not in st.session_state:
-    with st.spinner("Preparing scraping engine..."):
-        install_playwright()
-    st.session_state["playwright_installed"] = True
+# Result rows shown on screen after a streamed (.xlsx) run
+PREVIEW_ROWS = 50
 
 # --- UI Configuration ---
 st.set_page_config(page_title="Product Price Checker", page_icon="🛒", layout="wide")
 
+# --- Helper: Install Playwright Browsers ---
+@st.cache_resource(show_spinner="Preparing scraping engine...")
+def install_playwright():
+    """Ensure Playwright browsers are installed (essential for Cloud).
+    Runs once per server process; a marker next to the browsers skips it across restarts too."""
+    return ensure_chromium_installed()
+
+try:
+    install_playwright()
+except Exception as e:
+    st.error(f"Failed to install Playwright browsers: {e}")
+
 st.title("🛒 Product Price Checker")
 st.markdown("""
 Upload an Excel file with a list of product URLs to scrape the latest prices, stock status, and seller info.
@@ -32,28 +41,32 @@ Upload an Excel file with a list of product URLs to scrape the latest prices, st
 """)
 
 # --- Template Download ---
-sample_data = {
-    'URL': [
-        'https://www.takealot.com/eufy-robot-vacuum-e25-omni-black/PLID99819622',
-        'https://www.takealot.com/eufy-robot-vacuum-e28-omni-black/PLID99819592'
-    ],
-    'Product Code': [
-        'AECT2353G11',
-        'AECT2352G11'
-    ],
-    'Description': [
-        'eufy Robot Vacuum E25 Omni - Black',
-        'eufy Robot Vacuum E28 Omni - Black'
-    ]
-}
-sample_df = pd.DataFrame(sample_data)
-template_buffer = BytesIO()
-with pd.ExcelWriter(template_buffer, engine='openpyxl') as writer:
-    sample_df.to_excel(writer, index=False)
+@st.cache_data
+def template_bytes():
+    """The sample workbook, built once rather than on every rerun"""
+    sample_data = {
+        'URL': [
+            'https://www.takealot.com/eufy-robot-vacuum-e25-omni-black/PLID99819622',
+            'https://www.takealot.com/eufy-robot-vacuum-e28-omni-black/PLID99819592'
+        ],
+        'Product Code': [
+            'AECT2353G11',
+            'AECT2352G11'
+        ],
+        'Description': [
+            'eufy Robot Vacuum E25 Omni - Black',
+            'eufy Robot Vacuum E28 Omni - Black'
+        ]
+    }
+    sample_df = pd.DataFrame(sample_data)
+    template_buffer = BytesIO()
+    with pd.ExcelWriter(template_buffer, engine='openpyxl') as writer:
+        sample_df.to_excel(writer, index=False)
+    return template_buffer.getvalue()
 
 st.download_button(
     label="📥 Download Sample Excel Template",
-    data=template_buffer.getvalue(),
+    data=template_bytes(),
     file_name="template.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
     help="Download this template to see the required format. Fill in your URLs, Product Codes, and Descriptions."
@@ -64,65 +77,152 @@ uploaded_file = st.file_uploader("Upload Excel File", type=["xlsx", "xls"])
 
 if uploaded_file:
     try:
-        df = pd.read_excel(uploaded_file)
+        # .xlsx is read and written a row at a time (openpyxl read-only / write-only); .xls goes through pandas
+        streaming = supports_streaming(uploaded_file.name)
+        if streaming:
+            header = read_header(uploaded_file)
+            preview_rows = list(islice(iter_sheet(uploaded_file), 1, 6))
+            preview = pd.DataFrame(preview_rows, columns=header)
+            urls = read_columns(uploaded_file, ('URL',))['URL'] if 'URL' in header else []
+        else:
+            df = pd.read_excel(uploaded_file)
+            header = list(df.columns)
+            preview = df.head()
+            urls = df['URL'].tolist() if 'URL' in header else []
         
-        if 'URL' not in df.columns:
+        if 'URL' not in header:
             st.error("The Excel file must have a 'URL' column.")
         else:
-            st.write(f"Loaded **{len(df)}** products.")
-            st.dataframe(df.head())
+            st.write(f"Loaded **{len(urls)}** products.")
+            st.dataframe(preview)
+            
+            concurrency = st.slider("Parallel browser tabs", min_value=1, max_value=8, value=2,
+                                    help="How many products are scraped at the same time. Higher is faster but more likely to trip anti-bot checks.")
+            
+            col_cache, col_age, col_refresh = st.columns(3)
+            use_cache = col_cache.checkbox("Reuse recent results", value=True,
+                                           help="Products anyone checked recently are served from the shared cache instead of being scraped again.")
+            max_age_hours = col_age.number_input("Max result age (hours)", min_value=0.25, max_value=168.0, value=4.0, step=0.25,
+                                                 disabled=not use_cache)
+            force_refresh = col_refresh.checkbox("Force refresh", value=False, disabled=not use_cache,
+                                                 help="Scrape every product again and update the cache.")
+            
+            col_history, col_changed = st.columns(2)
+            keep_history = col_history.checkbox("Save to price history", value=True,
+                                                help="Append this run's prices to the local price history, so the next run can tell what changed.")
+            changed_only = col_changed.checkbox("Download changed rows only", value=False, disabled=not keep_history,
+                                                help="Only products whose RSP, stock or seller changed since their previous check (or that are new).") and keep_history
+            
+            # A run of this exact file that was interrupted (crash, rerun, sleep) left a journal behind
+            journal = journal_for(hashlib.sha1(uploaded_file.getvalue()).hexdigest())
+            journaled = len(journal.load())
+            resume = False
+            if journaled:
+                resume = st.checkbox(f"Resume interrupted run ({journaled} products already done)", value=True,
+                                     help="Only the products the previous run did not finish are scraped.")
             
             if st.button("🚀 Start Scraping"):
-                urls = df['URL'].tolist()
                 progress_bar = st.progress(0)
                 status_text = st.empty()
+                metrics_panel = st.empty()
+                live_table = st.empty()
                 
                 # --- Callback for Progress ---
-                def update_progress(index, url):
-                    progress = (index) / len(urls)
+                def update_progress(completed, url):
+                    progress = completed / len(urls)
                     progress_bar.progress(progress)
-                    status_text.text(f"Processing ({index+1}/{len(urls)}): {url}")
+                    status_text.text(f"Processed ({completed}/{len(urls)}): {url}")
+                
+                # --- Live metrics (process-wide, so other sessions' batches show up too) ---
+                def show_metrics():
+                    m = shared_metrics().snapshot()
+                    with metrics_panel.container():
+                        cols = st.columns(6)
+                        cols[0].metric("Pages/min", f"{m['pages_per_minute']:.1f}")
+                        cols[1].metric("In flight", m['in_flight'])
+                        cols[2].metric("Block rate", f"{m['block_rate']:.0%}")
+                        cols[3].metric("Retries", m['retries'])
+                        cols[4].metric("Transferred", f"{m['bytes'] / 1e6:.1f} MB")
+                        memory = m['browser_memory_bytes']
+                        cols[5].metric("Browser memory", f"{memory / 1e6:.0f} MB" if memory else "n/a")
+                        if m['domains']:
+                            st.dataframe(pd.DataFrame.from_dict(m['domains'], orient='index'))
                 
                 # --- Run Scraper ---
                 with st.spinner("Scraping in progress... Do not close this tab."):
                     try:
-                        results = scraper.scrape_products_batch(urls, progress_callback=update_progress)
+                        cache = ResultCache() if use_cache else None
+                        history = PriceHistory() if keep_history else None
+                        changed = None
+                        # One result per distinct product; the output joins them back onto every row
+                        results = {}
+                        recent = deque(maxlen=200)
+                        last_refresh = 0.0
+                        try:
+                            rows = scraper.scrape_products_iter(urls, progress_callback=update_progress, concurrency=concurrency,
+                                                                cache=cache, max_age=max_age_hours * 3600,
+                                                                force_refresh=force_refresh,
+                                                                journal=journal, resume=resume, history=history)
+                            for i, result in rows:
+                                results.setdefault(canonical_url(result['Link']), result)
+                                recent.append(result)
+                                # Show the latest finished rows, redrawn at most once a second
+                                if time.monotonic() - last_refresh > 1.0:
+                                    show_metrics()
+                                    live_table.dataframe(pd.DataFrame(list(recent)))
+                                    last_refresh = time.monotonic()
+                            if history is not None:
+                                changed = history.changed_rows(results.values())
+                        finally:
+                            if cache is not None:
+                                cache.close()
+                            if history is not None:
+                                history.close()
+                        show_metrics()
+                        live_table.empty()
                         
                         # --- Process Results ---
-                        results_df = pd.DataFrame(results)
-                        
                         # Rename scraper columns to avoid overwriting User's Input if they exist
-                        if 'Product Code' in df.columns and 'Product Code' in results_df.columns:
-                            results_df.rename(columns={'Product Code': 'Platform ID'}, inplace=True)
-                        
-                        if 'Description' in df.columns and 'Description' in results_df.columns:
-                            results_df.rename(columns={'Description': 'Scraped Description'}, inplace=True)
+                        renames = {}
+                        if 'Product Code' in header:
+                            renames['Product Code'] = 'Platform ID'
+                        if 'Description' in header:
+                            renames['Description'] = 'Scraped Description'
                         
-                        # Merge results back to original
-                        for col in results_df.columns:
-                            df[col] = results_df[col].values
-                            
-                        # Cleanup Columns
-                        cols_to_remove = ["1★", "2★", "3★", "4★", "5★"]
-                        df.drop(columns=[c for c in cols_to_remove if c in df.columns], inplace=True)
-                        df['Last Checked'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        # --- Build the Download ---
+                        # Results are joined back onto the original rows by product, not by row position.
+                        # 'Last Checked' comes per row from the scraper (cached rows keep their original time).
+                        output_filename = f"checked_prices_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+                        export_rows = results.values()
+                        export_columns = None
+                        if changed is not None:
+                            st.info(f"{len(changed)} of {len(results)} products changed since their previous check (or are new).")
+                            if changed_only:
+                                export_rows = changed
+                                export_columns = history.changed_columns(results.values())
+                                output_filename = output_filename.replace("checked_prices_", "changed_prices_")
+                        buffer = BytesIO()
+                        if streaming:
+                            export_results(uploaded_file, export_rows, buffer, renames=renames, only_matched=changed_only,
+                                           columns=export_columns)
+                            # Only the first rows are shown; the full sheet is the download
+                            output_preview = pd.DataFrame(list(islice(export_rows, PREVIEW_ROWS)))
+                        else:
+                            df = merge_results(df, export_rows, renames=renames, only_matched=changed_only,
+                                               columns=export_columns)
+                            df.drop(columns=[c for c in STAR_COLUMNS if c in df.columns], inplace=True)
+                            # Pandas requires an engine for writing to buffer (openpyxl)
+                            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                                df.to_excel(writer, index=False)
+                            output_preview = df
+                        journal.discard()
                         
                         progress_bar.progress(1.0)
                         status_text.success("Done!")
                         
                         st.success("Scraping Completed Successfully!")
-                        st.dataframe(df)
+                        st.dataframe(output_preview)
                         
-                        # --- Download ---
-                        output_filename = f"checked_prices_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                        
-                        # Save to a buffer (compatible with st.download_button)
-                        # Pandas requires an engine for writing to buffer (openpyxl)
-                        from io import BytesIO
-                        buffer = BytesIO()
-                        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                            df.to_excel(writer, index=False)
-                            
                         st.download_button(
                             label="📥 Download Updated Excel",
                             data=buffer.getvalue(),
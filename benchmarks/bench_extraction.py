@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+# CPU cost of the extraction hot paths, per call. No browser or network is involved.
+#
+#   python benchmarks/bench_extraction.py                   # run and print
+#   python benchmarks/bench_extraction.py --save baseline   # ...and store benchmarks/baselines/baseline.json
+#   python benchmarks/bench_extraction.py --compare baseline --threshold 0.25
+#
+# --compare exits with status 1 when a case got slower than the baseline by more than the
+# threshold (a fraction), so it can gate a release. Timings compare best-of-N, the least noisy.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import scraper
+from offline_extract import _Document, extract_html, scrape_html
+
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+PAGES = {
+    'amazon': ("https://www.amazon.co.za/Belkin/dp/B09MR14ZWT/", os.path.join(ROOT, "fixtures", "pages", "amazon_B09MR14ZWT.html")),
+    'takealot': ("https://www.takealot.com/xiaomi/PLID91193746", os.path.join(ROOT, "fixtures", "pages", "takealot_PLID91193746.html")),
+    'makro': ("https://www.makro.co.za/keter-mallorca-plastic-lounger/p/itm1043178e868c2?pid=LCEHACU2DEVQGEQJ", os.path.join(ROOT, "makro_debug.html")),
+}
+
+# What each page must extract to; a case is only timed once its page extracts correctly
+EXPECTED = {
+    'amazon': {'Description': 'Belkin Thunderbolt 4 Dock Pro', 'RSP': '5689,00', 'Original Price': '7499,00',
+               'Seller': 'Belkin SA and Fulfilled by Amazon', 'Stock Availability': 'In stock'},
+    # The same product as fixtures/takealot/PLID91193746.json
+    'takealot': {'Description': 'Xiaomi Smart Air Purifier 4 Compact', 'RSP': '1,799', 'Original Price': '2,199',
+                 'Stock Availability': 'In Stock', 'Province': 'JHB, CPT', 'Rating': '4.6', 'Review Count': '58'},
+    'makro': {'Description': 'Keter Mallorca Plastic Lounger', 'RSP': '1990', 'Seller': 'FirstDutchBrands',
+              'Stock Availability': 'In Stock'},
+}
+
+PRICE_STRINGS = ["R 1,299", "R1 299.00", "R 5 689,00", "1990", "N/A", "Price Not Found", "", "R 12,499.99 was R 14,999"]
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def _jsonld_scripts():
+    # A long @graph (breadcrumbs, organisation, offers...) with the Product node last, plus a plain list
+    graph = [{'@type': 'ListItem', 'position': i, 'name': f'Category {i}', 'item': f'https://example.com/c/{i}'}
+             for i in range(300)]
+    graph.append({'@type': 'Product', 'name': 'Widget', 'sku': 'W1',
+                  'offers': [{'price': '199.00', 'availability': 'https://schema.org/InStock', 'seller': {'name': 'Shop'}}],
+                  'aggregateRating': {'ratingValue': 4.5, 'reviewCount': 12}})
+    return [json.dumps({'@context': 'https://schema.org', '@graph': graph}),
+            json.dumps([{'@type': 'Organization', 'name': 'Shop'}] * 50),
+            'not json']
+
+def _next_data():
+    # Takealot-sized __NEXT_DATA__: thousands of nested nodes before the product
+    filler = [{'id': i, 'widgets': [{'type': 'banner', 'props': {'items': [{'title': f't{i}-{j}', 'tags': ['a', 'b']}
+                                                                           for j in range(10)]}}]}
+              for i in range(400)]
+    product = {'core': {'title': 'Xiaomi Smart Air Purifier 4 Compact'},
+               'buybox': {'prettyPrice': 'R 1,799', 'prettyOldPrice': 'R 2,199',
+                          'stockAvailability': {'status': 'In stock'}, 'seller': {'name': 'Gadget Hub'}},
+               'reviews': {'starRating': 4.6, 'reviewCount': 58}}
+    return {'props': {'pageProps': {'layout': filler, 'data': {'product': product}}}}
+
+def check_extraction(site, html, url):
+    """Raise AssertionError naming every field the page extracts differently from EXPECTED"""
+    result = scrape_html(html, url)
+    wrong = {field: (result.get(field), want) for field, want in EXPECTED[site].items() if result.get(field) != want}
+    assert not wrong, f"{site} page extracts wrongly (got, expected): {wrong}"
+
+def cases():
+    """{name: zero-argument callable}"""
+    # The rendered text of a real page, as the price fallback sees it
+    page_text = _Document(_read(PAGES['makro'][1])).page_text('rendered')
+    scripts = _jsonld_scripts()
+    next_data = _next_data()
+    found = {
+        'clean_price': lambda: [scraper.clean_price(p) for p in PRICE_STRINGS],
+        'extract_price_from_text': lambda: scraper.extract_price_from_text(page_text),
+        'parse_jsonld_scripts': lambda: scraper.parse_jsonld_scripts(scripts),
+        'parse_takealot_next_data': lambda: scraper.parse_takealot_next_data(next_data),
+    }
+    for site, (url, path) in PAGES.items():
+        html = _read(path)
+        check_extraction(site, html, url)
+        extraction = extract_html(html, site)
+        found[f'finish_extraction[{site}]'] = lambda e=extraction, u=url, s=site: scraper.finish_extraction(scraper._empty_result(u), e, u, s)
+        found[f'offline_extraction[{site}]'] = lambda h=html, u=url: scrape_html(h, u)
+    return found
+
+def measure(fn, repeats=7, min_time=0.2):
+    """Seconds per call for each of `repeats` runs, the call count per run calibrated to last min_time"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed * 4 > min_time else 10
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - start) / number)
+    return runs, number
+
+def run(selected=None, repeats=7, min_time=0.2):
+    results = {}
+    for name, fn in cases().items():
+        if selected and not any(s in name for s in selected):
+            continue
+        runs, number = measure(fn, repeats, min_time)
+        results[name] = {
+            'best_us': round(min(runs) * 1e6, 2),
+            'median_us': round(statistics.median(runs) * 1e6, 2),
+            'stdev_us': round(statistics.pstdev(runs) * 1e6, 2),
+            'calls_per_run': number,
+        }
+        print(f"{name:<36} best {results[name]['best_us']:>12.2f} us   median {results[name]['median_us']:>12.2f} us")
+    return results
+
+def baseline_path(name):
+    return name if name.endswith('.json') else os.path.join(BASELINE_DIR, f"{name}.json")
+
+def save(name, results):
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent=2)
+    print(f"Saved {path}")
+
+def compare(name, results, threshold):
+    """Print the change against a saved baseline; returns the names of cases that regressed"""
+    with open(baseline_path(name), encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressed = []
+    print(f"--- vs {name} (threshold {threshold:+.0%}) ---")
+    for case, result in results.items():
+        before = baseline.get(case)
+        if not before:
+            print(f"{case:<36} new")
+            continue
+        change = result['best_us'] / before['best_us'] - 1
+        flag = ''
+        if change > threshold:
+            regressed.append(case)
+            flag = '  REGRESSION'
+        print(f"{case:<36} {before['best_us']:>12.2f} -> {result['best_us']:>12.2f} us  {change:+7.1%}{flag}")
+    return regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the extraction hot paths.")
+    parser.add_argument("cases", nargs="*", help="only run cases whose name contains one of these")
+    parser.add_argument("--save", metavar="NAME", help="store the results as a baseline")
+    parser.add_argument("--compare", metavar="NAME", help="compare against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before failing (default 0.25)")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timing run")
+    args = parser.parse_args(argv)
+
+    try:
+        results = run(args.cases, args.repeats, args.min_time)
+    except AssertionError as e:
+        # Timing a page that extracts the wrong values would only record the wrong output
+        print(e)
+        return 1
+    if args.save:
+        save(args.save, results)
+    if args.compare and compare(args.compare, results, args.threshold):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
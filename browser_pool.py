@@ -0,0 +1,278 @@
+import asyncio
+import atexit
+import glob
+import importlib.metadata
+import os
+import subprocess
+import sys
+import threading
+from resource_policy import ResourcePolicy, ResourceBlocker
+from network_tape import active_tape
+from metrics import shared_metrics
+from rate_limit import domain_of
+
+# Idle tabs kept open per context between batches; more than this are closed on release
+DEFAULT_MAX_IDLE_TABS = 8
+
+# Warm contexts kept per browser (batches without Makro links pick a random user agent each)
+DEFAULT_MAX_CONTEXTS = 4
+
+# --- Browser install check ---
+# `playwright install chromium` takes seconds even when there is nothing to do, so a marker
+# named after the Playwright version is left next to the downloaded browsers once it has run.
+
+def playwright_browsers_path():
+    """Where Playwright keeps its browsers (PLAYWRIGHT_BROWSERS_PATH or the per-OS default)"""
+    path = os.environ.get('PLAYWRIGHT_BROWSERS_PATH')
+    if path and path != '0':
+        return path
+    if sys.platform == 'win32':
+        return os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), 'ms-playwright')
+    if sys.platform == 'darwin':
+        return os.path.expanduser('~/Library/Caches/ms-playwright')
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'ms-playwright')
+
+def ensure_chromium_installed():
+    """Install Playwright's Chromium unless this Playwright version already did. Returns True if an install ran."""
+    root = playwright_browsers_path()
+    marker = os.path.join(root, f".price-checker-chromium-{importlib.metadata.version('playwright')}")
+    if os.path.exists(marker) and glob.glob(os.path.join(root, 'chromium*')):
+        return False
+    subprocess.run([sys.executable, '-m', 'playwright', 'install', 'chromium'], check=True)
+    os.makedirs(root, exist_ok=True)
+    with open(marker, 'w') as f:
+        f.write('ok\n')
+    return True
+
+class WarmContext:
+    """One browser context (user agent, stealth script, resource routing) plus its idle tabs"""
+
+    def __init__(self, context, blocker=None, max_idle_tabs=DEFAULT_MAX_IDLE_TABS):
+        self.context = context
+        self.blocker = blocker
+        self.max_idle_tabs = max_idle_tabs
+        self.in_use = 0
+        self._idle = []
+        # page -> the metrics registry of the batch holding it
+        self._metrics = {}
+
+    async def acquire(self, metrics=None):
+        """A tab for one batch; metrics is the registry its traffic counts towards (None: shared_metrics())"""
+        self.in_use += 1
+        page = None
+        while self._idle and page is None:
+            page = self._idle.pop()
+            if page.is_closed():
+                page = None
+        if page is None:
+            try:
+                page = await self.context.new_page()
+            except Exception:
+                self.in_use -= 1
+                raise
+        if metrics is not None:
+            self._metrics[page] = metrics
+        return page
+
+    async def release(self, page):
+        self.in_use -= 1
+        self._metrics.pop(page, None)
+        if page.is_closed():
+            return
+        if len(self._idle) < self.max_idle_tabs:
+            self._idle.append(page)
+        else:
+            await page.close()
+
+    async def count_bytes(self, request):
+        # Everything a product page pulls in (CDNs included) counts towards the retailer's domain
+        try:
+            sizes = await request.sizes()
+            page = request.frame.page
+            page_url = page.url
+        except Exception:
+            return
+        registry = self._metrics.get(page) or shared_metrics()
+        registry.transferred(domain_of(page_url) or 'other', 'browser',
+                             sizes['responseBodySize'] + sizes['responseHeadersSize'])
+
+    async def close(self):
+        self._idle.clear()
+        self._metrics.clear()
+        try:
+            await self.context.close()
+        except Exception:
+            # Already gone with its browser
+            pass
+
+class BrowserManager:
+    """Keeps a Chromium (and one warm context per user agent / resource policy) alive between batches.
+
+    The async methods must all be called from one event loop. A manager used by the synchronous
+    API runs that loop itself on a daemon thread (start_loop / submit), so any thread can share
+    the same warm browser; scraper.shared_browser_manager() returns the process-wide one.
+
+    ws_endpoint connects to an already running Playwright browser server instead of launching
+    Chromium, so several processes can share one browser, e.g. started with
+    `playwright run-server --port 3000` and connected to as ws://localhost:3000/.
+    """
+
+    def __init__(self, playwright_factory, launch_args=(), context_options=None, init_script=None,
+                 ws_endpoint=None, max_idle_tabs=DEFAULT_MAX_IDLE_TABS, max_contexts=DEFAULT_MAX_CONTEXTS):
+        self.playwright_factory = playwright_factory
+        self.launch_args = list(launch_args)
+        self.context_options = context_options or {}
+        self.init_script = init_script
+        self.ws_endpoint = ws_endpoint
+        self.max_idle_tabs = max_idle_tabs
+        self.max_contexts = max_contexts
+        self.launches = 0
+        self._playwright = None
+        self._browser = None
+        self._contexts = {}
+        self._lock = None
+        self._loop = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    # --- Async API (one event loop) ---
+
+    def _healthy(self):
+        try:
+            return self._browser is not None and self._browser.is_connected()
+        except Exception:
+            return False
+
+    async def _ensure_browser(self):
+        if self._healthy():
+            return self._browser
+        # First use, or the browser crashed / the server went away: start over
+        if self._browser is not None:
+            print("Browser disconnected; starting a new one")
+            for warm in self._contexts.values():
+                await warm.close()
+            self._contexts.clear()
+        if self._playwright is None:
+            self._playwright = await self.playwright_factory().start()
+        if self.ws_endpoint:
+            self._browser = await self._playwright.chromium.connect(self.ws_endpoint)
+        else:
+            self._browser = await self._playwright.chromium.launch(headless=True, args=self.launch_args)
+        self.launches += 1
+        return self._browser
+
+    async def context(self, user_agent, resource_policy=None):
+        """Warm context for this user agent and resource policy (None: default policy, False: no blocking).
+        While a network tape is active (see network_tape.py) its contexts are separate and routed through it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            browser = await self._ensure_browser()
+            tape = active_tape()
+            key = (user_agent, resource_policy, tape)
+            warm = self._contexts.get(key)
+            if warm is None:
+                options = dict(self.context_options)
+                if tape is not None:
+                    # Service worker requests would bypass the tape's routing
+                    options['service_workers'] = 'block'
+                context = await browser.new_context(user_agent=user_agent, **options)
+                if self.init_script:
+                    await context.add_init_script(self.init_script)
+                if tape is not None:
+                    # Routed before the blocker's handler, which runs first and falls back to it
+                    await tape.attach(context)
+                blocker = None
+                if resource_policy is not False:
+                    blocker = ResourceBlocker(resource_policy or ResourcePolicy())
+                    await blocker.attach(context)
+                warm = WarmContext(context, blocker, self.max_idle_tabs)
+                context.on('requestfinished', warm.count_bytes)
+                self._contexts[key] = warm
+                await self._trim_contexts()
+            return warm
+
+    async def _trim_contexts(self):
+        # Oldest first (dicts keep insertion order); contexts with tabs out are never closed
+        for key in list(self._contexts):
+            if len(self._contexts) <= self.max_contexts:
+                break
+            warm = self._contexts[key]
+            if warm.in_use == 0:
+                del self._contexts[key]
+                await warm.close()
+
+    async def health_check(self):
+        """Open and close a blank tab in a fresh context; relaunches first if the browser is gone"""
+        browser = await self._ensure_browser()
+        context = await browser.new_context()
+        try:
+            page = await context.new_page()
+            await page.close()
+            return True
+        except Exception:
+            return False
+        finally:
+            await context.close()
+
+    async def close(self):
+        for warm in self._contexts.values():
+            await warm.close()
+        self._contexts.clear()
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    # --- Thread API ---
+
+    @property
+    def loop(self):
+        return self.start_loop()
+
+    def start_loop(self):
+        """Start (once) the daemon thread whose event loop owns the browser"""
+        with self._thread_lock:
+            if self._thread is None:
+                self._start_thread()
+        return self._loop
+
+    def _start_thread(self):
+        started = threading.Event()
+
+        def run():
+            # Playwright drives the browser through a subprocess, which needs the Proactor loop on Windows
+            self._loop = asyncio.ProactorEventLoop() if sys.platform == 'win32' else asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="browser-manager", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the manager's loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start_loop())
+
+    def shutdown(self, timeout=30):
+        """Close the browser and stop the loop thread"""
+        if self._thread is None:
+            return
+        try:
+            self.submit(self.close()).result(timeout)
+        except Exception as e:
+            print(f"Browser shutdown failed: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+        self._loop = None
+
+    def register_shutdown(self):
+        atexit.register(self.shutdown)
+        return self
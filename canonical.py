@@ -0,0 +1,75 @@
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track where a click came from; they never change the product
+TRACKING_PARAMS = ('gclid', 'fbclid', 'msclkid', 'ref', 'ref_')
+TRACKING_PREFIXES = ('utm_',)
+
+# Makro (Flipkart platform) campaign, listing and product-id parameters; the /p/itm... path names the product
+MAKRO_IGNORED_PARAMS = ('cmpid', 'lid', 'pid', 'otracker', 'srno', 'ssid', 'iid')
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+def _takealot_key(host, path, query):
+    # The slug in front of the PLID is cosmetic: /eufy-robot-vacuum/PLID99819622 == /x/PLID99819622
+    match = re.search(r'(PLID\d+)', path, re.IGNORECASE)
+    if match:
+        return '/' + match.group(1).upper(), []
+    return path, query
+
+def _amazon_key(host, path, query):
+    # /Some-Title/dp/B09MR14ZWT/ref=sr_1_1 -> /dp/B09MR14ZWT
+    match = re.search(r'/(?:dp|gp/product)/([A-Z0-9]{10})', path, re.IGNORECASE)
+    if match:
+        return '/dp/' + match.group(1).upper(), []
+    return path, query
+
+def _makro_key(host, path, query):
+    return path, [(k, v) for k, v in query if k.lower() not in MAKRO_IGNORED_PARAMS]
+
+# Retailer rules, keyed by registered domain: (host, path, query pairs) -> (path, query pairs)
+RETAILER_RULES = {
+    'takealot.com': _takealot_key,
+    'amazon.co.za': _amazon_key,
+    'makro.co.za': _makro_key,
+}
+
+def canonical_url(url):
+    """Normalise a product URL so every spelling of the same product maps to the same string.
+
+    Lower-cases scheme and host, drops the fragment, tracking parameters and a trailing slash,
+    and sorts what is left of the query. Retailer rules then reduce the URL to what names the
+    product: the PLID for Takealot, the ASIN for Amazon, and the path without the cmpid/lid/pid
+    parameters for Makro. Anything that is not an http(s) URL comes back stripped but unchanged.
+    """
+    url = str(url).strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+        return url
+
+    host = parts.hostname.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/') or '/'
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k)]
+
+    for domain, rule in RETAILER_RULES.items():
+        if host == domain or host.endswith('.' + domain):
+            path, query = rule(host, path, query)
+            break
+
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    return urlunsplit(('https', host, path, urlencode(sorted(query)), ''))
+
+def group_by_product(urls):
+    """Group input positions by canonical URL, in first-seen order: {canonical: [indexes]}"""
+    groups = {}
+    for i, url in enumerate(urls):
+        groups.setdefault(canonical_url(url), []).append(i)
+    return groups
@@ -0,0 +1,292 @@
+import json
+
+# --- Declarative extraction plans ---
+# Each retailer's selectors and fallbacks are described as named probes. A plan is compiled
+# once into a single JavaScript function, so one page.evaluate returns every candidate value;
+# the priority and cleanup rules are then applied in Python (see the finish_* helpers in scraper.py).
+#
+# Probe keys:
+#   path     list of CSS selectors, each taking the first match inside the previous node
+#            ('..' steps up to the parent element). Starts from the document, or from `scope`.
+#   scope    name of an entry in the plan's 'scopes' (first selector that exists, else the document)
+#   text     start from the first innermost element whose text contains this (case-insensitive),
+#            like Playwright's get_by_text(..., exact=False)
+#   re/flags same, matching a regular expression instead
+#   all      return a list: every match of this selector inside the node (or every text match)
+#   visible  keep only rendered elements
+#   take     'text' (textContent, default), 'inner' (innerText), 'attr:<name>', 'exists',
+#            'prev' / 'prev2' (innerText of the previous / second previous sibling), 'parent'
+#   fields   with `all`: return a dict per element, one entry per sub-probe {'sel', 'take'}
+#
+# A probe whose node is missing yields None (or [] for `all`).
+
+AMAZON_CORE_PRICE_CONTAINERS = [
+    '#corePriceDisplay_desktop_feature_div',
+    '#corePrice_desktop',
+    '#apex_desktop',
+    '.priceToPay'  # Fallback container
+]
+AMAZON_FALLBACK_PRICE_SELECTORS = ['#priceblock_ourprice', '#priceblock_dealprice', '.a-price.a-text-price.a-size-medium .a-offscreen']
+AMAZON_ORIGINAL_PRICE_SELECTORS = [
+    '#corePriceDisplay_desktop_feature_div .a-text-price .a-offscreen',
+    '#corePrice_desktop .a-text-price .a-offscreen',
+    '.basisPrice .a-offscreen',
+    'span[data-a-strike="true"]',
+    '.a-price.a-text-price .a-offscreen'
+]
+AMAZON_SELLER_SELECTORS = ['#merchant-info', '#sellerProfileTriggerId', 'div[tabular-attribute-name="Sold by"]', '.offer-display-feature-text-message']
+
+MAKRO_PRICE_SELECTORS = ['.price', '.prod-price', '[data-test="product-price"]', 'div[class*="price"]']
+
+TAKEALOT_PRICE_SELECTORS = ['.buy-box-price', '[data-ref="buy-box-price"]', '.price-container', 'div[class*="price"]']
+TAKEALOT_ORIGINAL_PRICE_SELECTORS = ['.buy-box-old-price', '[data-ref="buy-box-list-price"]', '.list-price', 'div[class*="list-price"]']
+TAKEALOT_SELLER_SELECTORS = ['.seller-name span', '.seller-name a', '[data-ref="seller-name"]', '.pdp-module_seller-name_3-h0m']
+TAKEALOT_SHIPPING_LOCATIONS = [("Durban", "DBN"), ("Johannesburg", "JHB"), ("Cape Town", "CPT")]
+
+def _amazon_probes():
+    probes = {
+        'title': {'path': ['#productTitle']},
+        'h1': {'path': ['h1']},
+        'whole': {'path': ['.a-price-whole']},
+        'fraction': {'path': ['.a-price-fraction']},
+        # "List Price:" label, then the price inside the same parent
+        'list_price_offscreen': {'text': 'List Price:', 'path': ['..', '.a-text-price .a-offscreen']},
+        'list_price_parent': {'text': 'List Price:', 'path': ['..'], 'take': 'inner'},
+        'availability': {'path': ['#availability']},
+        'rating_out_of': {'path': ['span[data-hook="rating-out-of-text"]']},
+        'rating_star': {'path': ['.a-icon-star']},
+        'review_text': {'path': ['#acrCustomerReviewText']},
+        'review_total': {'path': ['span[data-hook="total-review-count"]']},
+        'review_matches': {'re': r'\d[\d,]*\s+(global\s+)?(ratings|reviews)', 'flags': 'i', 'all': True},
+        'asin': {'path': ['#ASIN'], 'take': 'attr:value'},
+    }
+    for i, container in enumerate(AMAZON_CORE_PRICE_CONTAINERS):
+        probes[f'core{i}_offscreen'] = {'path': [container, '.priceToPay', '.a-offscreen']}
+        probes[f'core{i}_whole'] = {'path': [container, '.priceToPay', '.a-price-whole']}
+        probes[f'core{i}_fraction'] = {'path': [container, '.priceToPay', '.a-price-fraction']}
+        probes[f'core{i}_apex'] = {'path': [container, '.apexPriceToPay .a-offscreen']}
+        probes[f'core{i}_prices'] = {'path': [container], 'all': '.a-price:not(.a-text-price)', 'visible': True,
+                                     'fields': {'offscreen': {'sel': '.a-offscreen'}, 'text': {}}}
+    for i, sel in enumerate(AMAZON_FALLBACK_PRICE_SELECTORS):
+        probes[f'fallback{i}'] = {'all': sel, 'visible': True}
+    for i, sel in enumerate(AMAZON_ORIGINAL_PRICE_SELECTORS):
+        probes[f'original{i}'] = {'all': sel}
+    for i, sel in enumerate(AMAZON_SELLER_SELECTORS):
+        probes[f'seller{i}'] = {'path': [sel]}
+    return probes
+
+def _makro_probes():
+    probes = {
+        'h1': {'path': ['h1']},
+        'seller_name': {'path': ['#sellerName']},
+    }
+    for i, sel in enumerate(MAKRO_PRICE_SELECTORS):
+        probes[f'price{i}'] = {'path': [sel]}
+    return probes
+
+def _takealot_probes():
+    probes = {
+        'h1': {'path': ['h1']},
+        # Buybox list price lives in a sidebar, so it is looked up page-wide
+        'list_price_currency': {'path': ['span[class*="buybox-offer-module_list-price"]', 'span[class*="currency"]']},
+        'list_price': {'path': ['span[class*="buybox-offer-module_list-price"]']},
+        'currency_plus': {'scope': 'product', 'all': 'span[class*="currency"][class*="plus"]'},
+        'list_price_matches': {'scope': 'product', 're': 'List price|Was', 'flags': 'i', 'all': True},
+        'sold_by': {'text': 'Sold by', 'all': True},
+        'stock_class': {'path': ['.stock-availability']},
+        'stock_ref': {'path': ['[data-ref="stock-availability"]']},
+        'review_els': {'text': 'Review', 'all': True,
+                       'fields': {'text': {}, 'prev': {'take': 'prev'}, 'prev2': {'take': 'prev2'}, 'parent': {'take': 'parent'}}},
+        'rating_score': {'path': ['.rating-score']},
+        'rating_matches': {'re': r'^\s*\d\.\d\s*$', 'all': True},
+    }
+    for i, sel in enumerate(TAKEALOT_PRICE_SELECTORS):
+        probes[f'price{i}'] = {'scope': 'product', 'path': [sel]}
+    for i, sel in enumerate(TAKEALOT_ORIGINAL_PRICE_SELECTORS):
+        probes[f'original{i}'] = {'scope': 'product', 'path': [sel], 'take': 'inner'}
+    for i, sel in enumerate(TAKEALOT_SELLER_SELECTORS):
+        probes[f'seller{i}'] = {'path': [sel]}
+    return probes
+
+# --- Text heuristics ---
+# Phrase checks and the R-price fallback regex run in the browser over the page text, once per
+# page, so a small dict comes back instead of the whole body text. 'rendered' searches innerText
+# (what the shopper sees); 'dom' also covers hidden text, like get_by_text. Phrases are lower case.
+TEXT_HEURISTICS = {
+    'out_of_stock': {'phrases': ['out of stock', 'sold out']},
+    'add_to_cart': {'phrases': ['add to cart']},
+    'sold_by_takealot': {'phrases': ['sold by takealot']},
+    'supplier_out_of_stock': {'phrases': ['supplier out of stock'], 'source': 'dom'},
+    'first_price': {'pattern': r'R\s?[\d,.]+\d'},
+}
+for _place, _code in TAKEALOT_SHIPPING_LOCATIONS:
+    TEXT_HEURISTICS[f'shipped_{_code}'] = {'phrases': [f"shipped from {_place.lower()}"], 'source': 'dom'}
+
+def _heuristics(*names):
+    return {name: TEXT_HEURISTICS[name] for name in names}
+
+PLANS = {
+    'amazon': {'probes': _amazon_probes(), 'heuristics': _heuristics('first_price')},
+    'makro': {'probes': _makro_probes(), 'heuristics': _heuristics('out_of_stock', 'add_to_cart', 'first_price')},
+    'takealot': {
+        # Main product container, to avoid scanning related products/footer
+        'scopes': {'product': ['.pdp-main-panel', '.pdp-body']},
+        'probes': _takealot_probes(),
+        'heuristics': _heuristics(*TEXT_HEURISTICS),
+    },
+    None: {'probes': {}, 'heuristics': _heuristics('first_price')},
+}
+
+# Generic interpreter; the plan is inlined as a JSON literal when compiled
+_INTERPRETER_JS = """() => {
+    const PLAN = %s;
+    const norm = s => (s || '').replace(/\\s+/g, ' ').trim();
+    const visible = el => {
+        const r = el.getBoundingClientRect();
+        return r.width > 0 && r.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const take = (el, how) => {
+        if (!el) return null;
+        how = how || 'text';
+        if (how === 'text') return el.textContent;
+        if (how === 'inner') return el.innerText;
+        if (how === 'exists') return true;
+        if (how.indexOf('attr:') === 0) return el.getAttribute(how.slice(5));
+        if (how === 'prev') return el.previousElementSibling ? el.previousElementSibling.innerText : '';
+        if (how === 'prev2') {
+            const p = el.previousElementSibling;
+            return p && p.previousElementSibling ? p.previousElementSibling.innerText : '';
+        }
+        if (how === 'parent') return el.parentElement ? el.parentElement.innerText : '';
+        return null;
+    };
+    const q = (root, sel) => root === document ? document.querySelector(sel) : root.querySelector(':scope ' + sel);
+    const qa = (root, sel) => Array.from(root === document ? document.querySelectorAll(sel) : root.querySelectorAll(':scope ' + sel));
+    const SKIP = {SCRIPT: 1, STYLE: 1, NOSCRIPT: 1, TEMPLATE: 1};
+    // Innermost elements whose text passes the test, like Playwright's get_by_text
+    const byText = (root, test) => {
+        const out = [];
+        const walk = el => {
+            if (SKIP[el.tagName]) return false;
+            let childHit = false;
+            for (const child of el.children) {
+                if (walk(child)) childHit = true;
+            }
+            if (childHit) return true;
+            if (test(norm(el.textContent))) {
+                out.push(el);
+                return true;
+            }
+            return false;
+        };
+        const start = root === document ? document.body : root;
+        if (start) walk(start);
+        return out;
+    };
+
+    const scopes = {};
+    for (const [name, sels] of Object.entries(PLAN.scopes || {})) {
+        scopes[name] = document;
+        for (const sel of sels) {
+            const el = document.querySelector(sel);
+            if (el) { scopes[name] = el; break; }
+        }
+    }
+
+    const resolve = probe => {
+        let node = probe.scope ? scopes[probe.scope] : document;
+        let nodes = null;
+        if (probe.text || probe.re) {
+            let test;
+            if (probe.re) {
+                const re = new RegExp(probe.re, probe.flags || '');
+                test = t => re.test(t);
+            } else {
+                const needle = probe.text.toLowerCase();
+                test = t => t.toLowerCase().indexOf(needle) !== -1;
+            }
+            const matches = byText(node, test);
+            if (probe.all && !probe.path) nodes = matches;
+            else node = matches[0] || null;
+        }
+        for (const step of probe.path || []) {
+            if (!node) break;
+            node = step === '..' ? node.parentElement : q(node, step);
+        }
+        if (probe.all && !nodes) nodes = node && typeof probe.all === 'string' ? qa(node, probe.all) : [];
+        if (nodes) {
+            if (probe.visible) nodes = nodes.filter(visible);
+            return nodes.map(el => {
+                if (!probe.fields) return take(el, probe.take);
+                const row = {};
+                for (const [key, field] of Object.entries(probe.fields)) {
+                    row[key] = take(field.sel ? q(el, field.sel) : el, field.take);
+                }
+                return row;
+            });
+        }
+        if (!node || node === document) return null;
+        if (probe.visible && !visible(node)) return null;
+        return take(node, probe.take);
+    };
+
+    const candidates = {};
+    for (const [name, probe] of Object.entries(PLAN.probes)) {
+        try { candidates[name] = resolve(probe); } catch (e) { candidates[name] = probe.all ? [] : null; }
+    }
+
+    // Page text is built at most once per source, however many heuristics read it
+    const texts = {};
+    const pageText = source => {
+        if (!(source in texts)) {
+            let raw = '';
+            if (document.body && source === 'dom') {
+                const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT, {
+                    acceptNode: n => n.parentElement && SKIP[n.parentElement.tagName] ? NodeFilter.FILTER_REJECT : NodeFilter.FILTER_ACCEPT
+                });
+                const parts = [];
+                while (walker.nextNode()) parts.push(walker.currentNode.nodeValue);
+                raw = parts.join(' ');
+            } else if (document.body) {
+                raw = document.body.innerText;
+            }
+            texts[source] = raw.replace(/\s+/g, ' ');
+        }
+        return texts[source];
+    };
+    const heuristics = {};
+    for (const [name, h] of Object.entries(PLAN.heuristics || {})) {
+        const text = pageText(h.source || 'rendered');
+        if (h.pattern) {
+            const m = text.match(new RegExp(h.pattern));
+            heuristics[name] = m ? m[0] : null;
+        } else {
+            const lower = text.toLowerCase();
+            heuristics[name] = h.phrases.some(p => lower.indexOf(p) !== -1);
+        }
+    }
+
+    let nextData = null;
+    const nd = document.getElementById('__NEXT_DATA__');
+    if (nd) { try { nextData = JSON.parse(nd.textContent); } catch (e) {} }
+
+    return {
+        title: document.title,
+        jsonld: Array.from(document.querySelectorAll('script[type="application/ld+json"]')).map(s => s.textContent),
+        next_data: nextData,
+        candidates: candidates,
+        heuristics: heuristics
+    };
+}"""
+
+_compiled = {}
+
+def compile_plan(plan):
+    """Turn a plan into the source of a single page.evaluate function"""
+    return _INTERPRETER_JS % json.dumps(plan)
+
+def plan_js(site):
+    """Compiled extraction function for a retailer (None for unsupported sites), built once"""
+    if site not in _compiled:
+        _compiled[site] = compile_plan(PLANS[site])
+    return _compiled[site]
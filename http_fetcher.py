@@ -0,0 +1,136 @@
+import functools
+import importlib.util
+import threading
+from resource_policy import host_of
+from network_tape import active_tape
+
+@functools.lru_cache(maxsize=1)
+def html_parser():
+    """lxml when installed, else the stdlib parser. Resolved on first parse to keep imports cheap."""
+    return 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+DEFAULT_TIMEOUT = (5, 15)  # (connect, read) seconds
+
+# Statuses retailers answer with when they rate limit or challenge a client
+BLOCK_STATUSES = (403, 429, 503)
+
+# Title / small-page markers of an anti-bot interstitial rather than a product page
+BLOCK_MARKERS = (
+    'captcha',
+    'human',
+    'denied',
+    'robot check',
+    'pardon our interruption',
+    'are you a robot',
+    'unusual traffic',
+)
+
+class HttpPage:
+    """Outcome of a plain HTTP GET"""
+
+    def __init__(self, url, status, html, blocked):
+        self.url = url
+        self.status = status
+        self.html = html
+        self.blocked = blocked
+
+class SessionPool:
+    """One keep-alive requests.Session per domain, shared by every worker of a batch"""
+
+    def __init__(self, user_agent, pool_size=4, timeout=DEFAULT_TIMEOUT, observer=None, byte_counter=None):
+        self.user_agent = user_agent
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # observer(url, blocked) hears about every response, e.g. to feed a rate limiter
+        self.observer = observer
+        # byte_counter(url, size) hears the body size of every response, e.g. for metrics
+        self.byte_counter = byte_counter
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url):
+        host = host_of(url)
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                # requests costs tens of ms to import, so it loads with the first session
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                # A record / replay tape, when active, stands in for the network
+                tape = active_tape()
+                adapter = tape.http_adapter(self.pool_size) if tape else HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update({
+                    'User-Agent': self.user_agent,
+                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                    'Accept-Language': 'en-ZA,en-US;q=0.9,en;q=0.8',
+                })
+                self._sessions[host] = session
+            return session
+
+    def get(self, url, observe=True, report_as=None, **kwargs):
+        """Blocking GET through the domain's pooled session.
+        report_as is the URL the observer and byte_counter hear about instead of url, e.g. the
+        product page an API request is for, so the retailer's own rate limit sees the answer."""
+        kwargs.setdefault('timeout', self.timeout)
+        response = self.session_for(url).get(url, **kwargs)
+        if self.byte_counter:
+            self.byte_counter(report_as or url, len(response.content))
+        if observe and self.observer:
+            self.observer(report_as or url, response.status_code in BLOCK_STATUSES)
+        return response
+
+    def fetch_page(self, url):
+        """GET a product page and flag anti-bot responses"""
+        response = self.get(url, observe=False)
+        html = response.text
+        page = HttpPage(response.url, response.status_code, html, looks_blocked(response.status_code, html))
+        if self.observer:
+            self.observer(url, page.blocked)
+        return page
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+def looks_blocked(status, html):
+    if status in BLOCK_STATUSES:
+        return True
+    soup_title = ''
+    lowered = (html or '').lower()
+    start = lowered.find('<title')
+    if start != -1:
+        end = lowered.find('</title>', start)
+        soup_title = lowered[start:end if end != -1 else start + 300]
+    if any(marker in soup_title for marker in BLOCK_MARKERS):
+        return True
+    # Interstitials are tiny pages; real product pages are hundreds of KB
+    return len(lowered) < 20000 and any(marker in lowered for marker in BLOCK_MARKERS)
+
+def meta_tags(soup):
+    """property/name/itemprop -> content of a parsed page's meta tags, first one winning"""
+    meta = {}
+    for tag in soup.find_all('meta'):
+        key = tag.get('property') or tag.get('name') or tag.get('itemprop')
+        if key and tag.get('content') is not None and key not in meta:
+            meta[key] = tag['content']
+    return meta
+
+def map_meta_tags(meta):
+    """Map OpenGraph / product meta tags onto our result fields"""
+    extracted = {}
+    title = meta.get('og:title') or meta.get('twitter:title')
+    if title: extracted['Description'] = title
+    price = meta.get('product:price:amount') or meta.get('og:price:amount') or meta.get('price')
+    if price: extracted['RSP'] = price
+    currency = meta.get('product:price:currency') or meta.get('og:price:currency') or meta.get('priceCurrency')
+    if currency: extracted['Currency'] = currency
+    availability = meta.get('product:availability') or meta.get('og:availability') or meta.get('availability')
+    if availability: extracted['Stock Availability'] = availability.split('/')[-1]
+    sku = meta.get('product:retailer_item_id') or meta.get('sku')
+    if sku: extracted['Product Code'] = sku
+    return extracted
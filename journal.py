@@ -0,0 +1,67 @@
+import json
+import os
+import threading
+from canonical import canonical_url
+
+JOURNAL_DIR = os.environ.get("PRICE_JOURNAL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "journals"))
+
+class RunJournal:
+    """Append-only JSONL record of the rows a batch has finished, so an interrupted run can resume.
+
+    Each line is {"key": canonical URL, "result": row} and is flushed to disk as soon as the row finishes.
+    A line cut short by a crash is ignored on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self):
+        """Finished rows from earlier runs: {canonical URL: result}, latest entry winning"""
+        finished = {}
+        if not os.path.exists(self.path):
+            return finished
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and 'key' in entry:
+                    finished[entry['key']] = entry.get('result') or {}
+        return finished
+
+    def record(self, url, result):
+        line = json.dumps({'key': canonical_url(url), 'result': result}, default=str)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+                # Start on a fresh line if a crash cut the last entry short
+                if self._file.tell() and not self._ends_with_newline():
+                    self._file.write('\n')
+            self._file.write(line + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        """Close and delete the journal once its run has been saved"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def journal_for(name, directory=JOURNAL_DIR):
+    """Journal stored under `directory` for a run identified by name (e.g. a hash of the uploaded file)"""
+    return RunJournal(os.path.join(directory, f"{name}.jsonl"))
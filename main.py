@@ -2,6 +2,10 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import pandas as pd
 import scraper
+from result_cache import ResultCache
+from price_history import PriceHistory
+from workbook import merge_results, export_results, read_columns, supports_streaming, STAR_COLUMNS
+from journal import RunJournal
 import threading
 import os
 from datetime import datetime
@@ -52,46 +56,39 @@ class PriceCheckerApp:
         self.btn_load.config(state="disabled")
         self.lbl_status.config(text="Processing... Please wait.")
         
+        # An interrupted run of this file leaves its journal next to it; asked here, since Tk is not thread-safe
+        journal = RunJournal(os.path.splitext(self.file_path)[0] + ".journal.jsonl")
+        resume = bool(journal.load()) and messagebox.askyesno(
+            "Resume", "A previous run of this file did not finish.\nResume it and skip the products already checked?")
+        
         # Run in separate thread to keep UI responsive
-        thread = threading.Thread(target=self.process_file)
+        thread = threading.Thread(target=self.process_file, args=(journal, resume))
         thread.start()
         
-    def process_file(self):
+    def process_file(self, journal, resume=False):
         try:
-            df = pd.read_excel(self.file_path)
+            # .xlsx is read and written a row at a time; older .xls files go through pandas
+            streaming = supports_streaming(self.file_path)
+            if streaming:
+                try:
+                    urls = read_columns(self.file_path, ('URL',))['URL']
+                except KeyError:
+                    urls = None
+            else:
+                df = pd.read_excel(self.file_path)
+                urls = df['URL'].tolist() if 'URL' in df.columns else None
             
-            if 'URL' not in df.columns:
+            if urls is None:
                 messagebox.showerror("Error", "The Excel file must have a 'URL' column.")
                 self.reset_ui()
                 return
 
-            total_urls = len(df)
+            total_urls = len(urls)
             self.progress["maximum"] = total_urls
             
-            results_list = []
-            
-            for index, row in df.iterrows():
-                url = row['URL']
-                self.root.after(0, lambda u=url: self.lbl_status.config(text=f"Checking: {u[:30]}..."))
-                
-                # Call new scraper function which returns a dict
-                data = scraper.scrape_product(url)
-                results_list.append(data)
-                
+            def on_progress(completed, url):
+                self.root.after(0, lambda u=str(url): self.lbl_status.config(text=f"Checked: {u[:30]}..."))
                 self.root.after(0, self.progress.step, 1)
-                
-            # Convert results to DataFrame
-            results_df = pd.DataFrame(results_list)
-            
-            # Update original dataframe with new columns
-            for col in results_df.columns:
-                df[col] = results_df[col].values
-
-            # Remove requested columns that are no longer needed
-            cols_to_remove = ["1★", "2★", "3★", "4★", "5★"]
-            df.drop(columns=[c for c in cols_to_remove if c in df.columns], inplace=True)
-
-            df['Last Checked'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             # Save to new file
             directory = os.path.dirname(self.file_path)
@@ -100,7 +97,26 @@ class PriceCheckerApp:
             new_filename = f"{name}_updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
             save_path = os.path.join(directory, new_filename)
             
-            df.to_excel(save_path, index=False)
+            # Rows checked within the cache TTL are not scraped again
+            cache = ResultCache()
+            # Each run's prices are appended to the local price history
+            history = PriceHistory()
+            try:
+                rows = scraper.scrape_products_iter(urls, progress_callback=on_progress, cache=cache,
+                                                    journal=journal, resume=resume, history=history)
+                results = (result for i, result in rows)
+                if streaming:
+                    # Joined to the input by product, holding one result dict per distinct product
+                    export_results(self.file_path, results, save_path)
+                else:
+                    # Update original dataframe with new columns, joined by product rather than by row position
+                    df = merge_results(df, list(results))
+                    df.drop(columns=[c for c in STAR_COLUMNS if c in df.columns], inplace=True)
+                    df.to_excel(save_path, index=False)
+            finally:
+                cache.close()
+                history.close()
+            journal.discard()
             
             self.root.after(0, lambda: messagebox.showinfo("Success", f"Done! Saved as:\n{new_filename}"))
             self.root.after(0, lambda: self.lbl_status.config(text="Completed."))
@@ -0,0 +1,295 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rate_limit import domain_of
+
+# --- Live metrics ---
+# A process-wide registry every batch feeds as it runs (see scraper.scrape_products_iter_async),
+# readable while the job is still going: as Prometheus text (serve_metrics() / MetricsFileWriter)
+# or as snapshot() for the Streamlit panel.
+
+# name: (type, help)
+METRICS = {
+    'price_pages_total': ('counter', 'Products finished, by retailer domain, source tier and outcome (ok or error class)'),
+    'price_pages_per_minute': ('gauge', 'Products finished per minute over the last five minutes'),
+    'price_in_flight_pages': ('gauge', 'Products being scraped right now'),
+    'price_responses_total': ('counter', 'Product page and API responses seen, by retailer domain'),
+    'price_blocked_responses_total': ('counter', 'Responses that were block pages, 403/429/503 or interstitials'),
+    'price_retries_total': ('counter', 'Retries scheduled, by retailer domain and error class'),
+    'price_bytes_total': ('counter', 'Response bytes transferred, by retailer domain and tier (http, browser)'),
+    'price_rate_limit_per_second': ('gauge', 'Current adaptive rate-limit rate, by retailer domain'),
+    'price_browser_memory_bytes': ('gauge', 'Resident memory of the child processes: Playwright driver, Chromium (and shard workers)'),
+}
+
+# Computed when read, from the registry itself or the process tree
+_DERIVED = {'price_pages_per_minute', 'price_browser_memory_bytes'}
+
+PAGE_RATE_WINDOW = 300
+DEFAULT_METRICS_PORT = 9464
+
+def _process_tree_rss(root_pid):
+    """Total RSS in bytes of root_pid's descendants, or None where it cannot be read"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            return sum(child.memory_info().rss for child in psutil.Process(root_pid).children(recursive=True))
+        except Exception:
+            return None
+    if not sys.platform.startswith('linux'):
+        return None
+    # /proc/<pid>/stat: field 4 is the parent pid, field 24 the RSS in pages
+    parents, rss = {}, {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        parents[int(entry)] = int(fields[1])
+        rss[int(entry)] = int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+    total, frontier = 0, {root_pid}
+    while frontier:
+        children = {pid for pid, parent in parents.items() if parent in frontier}
+        total += sum(rss[pid] for pid in children)
+        frontier = children
+    return total
+
+def browser_memory_bytes():
+    return _process_tree_rss(os.getpid())
+
+def delta(current, previous):
+    """What changed between two MetricsRegistry.values() readings"""
+    return {key: value - previous.get(key, 0) for key, value in current.items() if value != previous.get(key, 0)}
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsRegistry:
+    """Counters and gauges keyed by name and labels; safe to update from any thread"""
+
+    def __init__(self, window=PAGE_RATE_WINDOW):
+        self.window = window
+        self.started = time.time()
+        self._values = {}
+        self._finished = deque()
+        self._lock = threading.Lock()
+
+    def _key(self, name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[self._key(name, labels)] = value
+
+    def get(self, name, **labels):
+        with self._lock:
+            return self._values.get(self._key(name, labels), 0)
+
+    def total(self, name, **labels):
+        """Sum over every series of name whose labels include the given ones"""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(v for (n, l), v in self._values.items() if n == name and wanted <= set(l))
+
+    # --- Events, as the scraper reports them ---
+
+    def page_started(self, domain):
+        self.inc('price_in_flight_pages', 1, domain=domain)
+
+    def page_stopped(self, domain):
+        self.inc('price_in_flight_pages', -1, domain=domain)
+
+    def page_finished(self, domain, source, outcome):
+        self.inc('price_pages_total', domain=domain, source=source, outcome=outcome)
+        now = time.monotonic()
+        with self._lock:
+            self._finished.append(now)
+
+    def response(self, domain, blocked):
+        self.inc('price_responses_total', domain=domain)
+        if blocked:
+            self.inc('price_blocked_responses_total', domain=domain)
+
+    def retry(self, domain, error_class):
+        self.inc('price_retries_total', domain=domain, error_class=error_class)
+
+    def transferred(self, domain, tier, size):
+        if size:
+            self.inc('price_bytes_total', size, domain=domain, tier=tier)
+
+    # --- Worker processes ---
+
+    def values(self):
+        """Every series except the derived ones, as {(name, labels): value}"""
+        with self._lock:
+            return {key: v for key, v in self._values.items() if key[0] not in _DERIVED}
+
+    def merge(self, delta):
+        """Add another registry's changes (see delta()), e.g. a shard worker's, to this one"""
+        now = time.monotonic()
+        with self._lock:
+            for key, value in delta.items():
+                self._values[key] = self._values.get(key, 0) + value
+                if key[0] == 'price_pages_total':
+                    self._finished.extend([now] * int(value))
+
+    # --- Derived values ---
+
+    def pages_per_minute(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._finished and now - self._finished[0] > self.window:
+                self._finished.popleft()
+            count = len(self._finished)
+        span = min(self.window, time.time() - self.started)
+        return count * 60 / span if span > 0 else 0.0
+
+    def _refresh_derived(self):
+        self.set('price_pages_per_minute', round(self.pages_per_minute(), 3))
+        memory = browser_memory_bytes()
+        if memory is not None:
+            self.set('price_browser_memory_bytes', memory)
+
+    def snapshot(self):
+        """Headline numbers plus a per-domain breakdown, for dashboards"""
+        self._refresh_derived()
+        with self._lock:
+            domains = sorted({dict(labels).get('domain') for (name, labels) in self._values if dict(labels).get('domain')})
+        per_domain = {}
+        for domain in domains:
+            responses = self.total('price_responses_total', domain=domain)
+            blocked = self.total('price_blocked_responses_total', domain=domain)
+            per_domain[domain] = {
+                'pages': self.total('price_pages_total', domain=domain),
+                'errors': self.total('price_pages_total', domain=domain) - self.total('price_pages_total', domain=domain, outcome='ok'),
+                'in_flight': self.total('price_in_flight_pages', domain=domain),
+                'block_rate': round(blocked / responses, 3) if responses else 0.0,
+                'retries': self.total('price_retries_total', domain=domain),
+                'bytes': self.total('price_bytes_total', domain=domain),
+                'rate_limit': round(self.get('price_rate_limit_per_second', domain=domain), 3) or None,
+            }
+        responses = self.total('price_responses_total')
+        return {
+            'pages': self.total('price_pages_total'),
+            'pages_per_minute': self.get('price_pages_per_minute'),
+            'in_flight': self.total('price_in_flight_pages'),
+            'block_rate': round(self.total('price_blocked_responses_total') / responses, 3) if responses else 0.0,
+            'retries': self.total('price_retries_total'),
+            'bytes': self.total('price_bytes_total'),
+            'browser_memory_bytes': self.get('price_browser_memory_bytes') or None,
+            'domains': per_domain,
+        }
+
+    def render(self):
+        """Prometheus text exposition format"""
+        self._refresh_derived()
+        with self._lock:
+            values = dict(self._values)
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            series = sorted((labels, value) for (n, labels), value in values.items() if n == name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series:
+                # Merged worker gauges pick up float noise
+                value = round(value, 6) if isinstance(value, float) else value
+                label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+class ResponseMeter:
+    """Stands in for a rate limiter's report(url, blocked): counts the response, passes it on to the
+    limiter (if any) and publishes the domain's new rate. Also counts the bytes of HTTP tier responses."""
+
+    def __init__(self, registry, limiter=None):
+        self.registry = registry
+        self.limiter = limiter
+
+    def report(self, url, blocked):
+        domain = domain_of(url)
+        self.registry.response(domain, blocked)
+        if self.limiter:
+            self.limiter.report(url, blocked)
+            self.registry.set('price_rate_limit_per_second', round(self.limiter.bucket_for(url).rate, 3), domain=domain)
+
+    def http_bytes(self, url, size):
+        self.registry.transferred(domain_of(url), 'http', size)
+
+_shared_metrics = None
+_shared_metrics_lock = threading.Lock()
+
+def shared_metrics():
+    """Process-wide registry; every batch in the process feeds it"""
+    global _shared_metrics
+    with _shared_metrics_lock:
+        if _shared_metrics is None:
+            _shared_metrics = MetricsRegistry()
+        return _shared_metrics
+
+# --- Exposition ---
+
+def serve_metrics(port=DEFAULT_METRICS_PORT, host='127.0.0.1', registry=None):
+    """Serve GET /metrics on a daemon thread; returns the server (server.shutdown() stops it)"""
+    registry = registry or shared_metrics()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+def write_metrics_file(path, registry=None):
+    """Write the Prometheus text atomically (e.g. for node_exporter's textfile collector)"""
+    registry = registry or shared_metrics()
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+class MetricsFileWriter:
+    """Rewrites a metrics file every `interval` seconds on a daemon thread, and once more on stop()"""
+
+    def __init__(self, path, interval=15.0, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or shared_metrics()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-file", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            write_metrics_file(self.path, self.registry)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        write_metrics_file(self.path, self.registry)
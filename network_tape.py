@@ -0,0 +1,324 @@
+import asyncio
+import base64
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from rate_limit import domain_of
+
+# --- Network record / replay ---
+# A tape captures every exchange a batch makes, browser and HTTP tier alike, as one HAR file per
+# domain, and can later serve them back with no network at all, so the whole pipeline runs
+# deterministically (e.g. to benchmark a scraper change against the same pages).
+#
+#     with recording('tapes/nightly'):
+#         scrape_products_batch(urls)
+#     with replaying('tapes/nightly', latency=0.2):
+#         scrape_products_batch(urls)
+#
+# While a tape is active, BrowserManager attaches it to every new context (behind the resource
+# blocker, so blocked requests are neither recorded nor served) and SessionPool routes its requests
+# through it. The active tape is also described in PRICE_NETWORK_TAPE, so worker processes started
+# by sharding.py record / replay too.
+
+TAPE_ENV = 'PRICE_NETWORK_TAPE'
+
+# Headers that describe the wire encoding; bodies are stored decoded
+_WIRE_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+_TEXT_TYPES = ('text/', 'json', 'javascript', 'xml')
+
+def _tape_key(method, url):
+    return method.upper(), url.split('#', 1)[0]
+
+def _headers_list(headers):
+    return [{'name': k, 'value': v} for k, v in headers.items()]
+
+def _replay_headers(entry):
+    return {h['name']: h['value'] for h in entry['response']['headers'] if h['name'].lower() not in _WIRE_HEADERS}
+
+def _content(body, mime_type):
+    content = {'size': len(body), 'mimeType': mime_type}
+    if any(t in mime_type for t in _TEXT_TYPES):
+        try:
+            content['text'] = body.decode('utf-8')
+            return content
+        except UnicodeDecodeError:
+            pass
+    content['text'] = base64.b64encode(body).decode('ascii')
+    content['encoding'] = 'base64'
+    return content
+
+def _body(entry):
+    content = entry['response'].get('content') or {}
+    text = content.get('text') or ''
+    return base64.b64decode(text) if content.get('encoding') == 'base64' else text.encode('utf-8')
+
+class HarRecorder:
+    """Records every exchange, then writes <directory>/<domain>.har on close().
+
+    A file that already exists (another worker process, an earlier run) is never overwritten;
+    the new one is written as <domain>.1.har, <domain>.2.har and so on, and replay reads them all.
+    """
+
+    mode = 'record'
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, method, url, request_headers, status, status_text, headers, body, elapsed):
+        mime_type = next((v for k, v in headers.items() if k.lower() == 'content-type'), '')
+        entry = {
+            'startedDateTime': datetime.now(timezone.utc).isoformat(),
+            'time': round(elapsed * 1000, 1),
+            'request': {
+                'method': method, 'url': url, 'httpVersion': 'HTTP/1.1', 'cookies': [],
+                'headers': _headers_list(request_headers), 'queryString': [], 'headersSize': -1, 'bodySize': -1,
+            },
+            'response': {
+                'status': status, 'statusText': status_text or '', 'httpVersion': 'HTTP/1.1', 'cookies': [],
+                'headers': _headers_list(headers), 'content': _content(body, mime_type),
+                'redirectURL': next((v for k, v in headers.items() if k.lower() == 'location'), ''),
+                'headersSize': -1, 'bodySize': len(body),
+            },
+            'cache': {},
+            'timings': {'send': 0, 'wait': round(elapsed * 1000, 1), 'receive': 0},
+        }
+        with self._lock:
+            self._entries.setdefault(domain_of(url) or 'unknown', []).append(entry)
+
+    # --- Browser side ---
+
+    async def attach(self, context):
+        await context.route("**/*", self._handle)
+
+    async def _handle(self, route):
+        request = route.request
+        started = time.perf_counter()
+        try:
+            # Redirects are recorded hop by hop, as the browser follows them
+            response = await route.fetch(max_redirects=0)
+            body = await response.body()
+        except Exception:
+            await route.abort()
+            return
+        self.add(request.method, request.url, await request.all_headers(), response.status,
+                 response.status_text, response.headers, body, time.perf_counter() - started)
+        await route.fulfill(response=response, body=body)
+
+    # --- HTTP tier side ---
+
+    def http_adapter(self, pool_size):
+        recording_adapter, _ = _adapters()
+        return recording_adapter(self, pool_connections=1, pool_maxsize=pool_size)
+
+    def close(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            entries, self._entries = self._entries, {}
+        for domain, domain_entries in entries.items():
+            har = {'log': {'version': '1.2', 'creator': {'name': 'price-checker', 'version': '1'},
+                           'entries': domain_entries}}
+            for n in range(1000):
+                name = f"{domain}.har" if n == 0 else f"{domain}.{n}.har"
+                try:
+                    with open(os.path.join(self.directory, name), 'x', encoding='utf-8') as f:
+                        json.dump(har, f)
+                    break
+                except FileExistsError:
+                    continue
+
+    def describe(self):
+        return {'mode': self.mode, 'directory': self.directory}
+
+class HarReplayer:
+    """Serves recorded exchanges instead of the network; anything not on the tape fails to load.
+
+    latency: 'recorded' (each exchange takes as long as it did when recorded), seconds per request,
+    {domain: seconds} (None key for the rest), a callable(url) -> seconds, or None for no delay.
+    A URL requested more often than it was recorded gets its last recording again.
+    """
+
+    mode = 'replay'
+
+    def __init__(self, directory, latency='recorded'):
+        self.directory = directory
+        self.latency = latency
+        self.served = 0
+        self.missed = 0
+        self._entries = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.har'):
+                with open(os.path.join(directory, name), encoding='utf-8') as f:
+                    for entry in json.load(f)['log']['entries']:
+                        key = _tape_key(entry['request']['method'], entry['request']['url'])
+                        self._entries.setdefault(key, []).append(entry)
+
+    def lookup(self, method, url):
+        key = _tape_key(method, url)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.missed += 1
+                return None
+            n = self._seen.get(key, 0)
+            self._seen[key] = n + 1
+            self.served += 1
+            return entries[min(n, len(entries) - 1)]
+
+    def delay_for(self, url, entry):
+        latency = self.latency
+        if latency is None:
+            return 0.0
+        if latency == 'recorded':
+            return entry.get('time', 0) / 1000
+        if callable(latency):
+            return latency(url)
+        if isinstance(latency, dict):
+            domain = domain_of(url)
+            return next((s for d, s in latency.items() if d and (domain == d or domain.endswith('.' + d))),
+                        latency.get(None, 0.0))
+        return float(latency)
+
+    # --- Browser side ---
+
+    async def attach(self, context):
+        await context.route("**/*", self._handle)
+
+    async def _handle(self, route):
+        request = route.request
+        entry = self.lookup(request.method, request.url)
+        if entry is None:
+            await route.abort('internetdisconnected')
+            return
+        delay = self.delay_for(request.url, entry)
+        if delay:
+            await asyncio.sleep(delay)
+        response = entry['response']
+        await route.fulfill(status=response['status'], headers=_replay_headers(entry), body=_body(entry))
+
+    # --- HTTP tier side ---
+
+    def http_adapter(self, pool_size):
+        _, replay_adapter = _adapters()
+        return replay_adapter(self)
+
+    def close(self):
+        print(f"Replay: {self.served} exchanges served, {self.missed} not on the tape")
+
+    def describe(self):
+        latency = self.latency if not callable(self.latency) else 'recorded'
+        if isinstance(latency, dict):
+            latency = {'' if d is None else d: s for d, s in latency.items()}
+        return {'mode': self.mode, 'directory': self.directory, 'latency': latency}
+
+# --- HTTP tier adapters ---
+# requests is only needed once the HTTP tier opens a session, so the adapters are defined on first use
+
+@functools.lru_cache(maxsize=1)
+def _adapters():
+    """(recording adapter class, replaying adapter class)"""
+    import requests
+    from requests.adapters import BaseAdapter, HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    class _RecordingAdapter(HTTPAdapter):
+        def __init__(self, recorder, **kwargs):
+            super().__init__(**kwargs)
+            self.recorder = recorder
+
+        def send(self, request, **kwargs):
+            started = time.perf_counter()
+            response = super().send(request, **kwargs)
+            self.recorder.add(request.method, request.url, request.headers, response.status_code, response.reason,
+                              response.headers, response.content, time.perf_counter() - started)
+            return response
+
+    class _ReplayAdapter(BaseAdapter):
+        def __init__(self, replayer):
+            super().__init__()
+            self.replayer = replayer
+
+        def send(self, request, **kwargs):
+            entry = self.replayer.lookup(request.method, request.url)
+            if entry is None:
+                raise requests.ConnectionError(f"Not on the tape: {request.method} {request.url}", request=request)
+            delay = self.replayer.delay_for(request.url, entry)
+            if delay:
+                time.sleep(delay)
+            response = requests.Response()
+            response.status_code = entry['response']['status']
+            response.reason = entry['response'].get('statusText', '')
+            response.headers = CaseInsensitiveDict(_replay_headers(entry))
+            response.encoding = get_encoding_from_headers(response.headers)
+            response._content = _body(entry)
+            response.url = request.url
+            response.request = request
+            return response
+
+        def close(self):
+            pass
+
+    return _RecordingAdapter, _ReplayAdapter
+
+# --- Active tape ---
+
+_active = None
+_active_lock = threading.Lock()
+
+def _from_env():
+    spec = os.environ.get(TAPE_ENV)
+    if not spec:
+        return None
+    spec = json.loads(spec)
+    if spec['mode'] == 'record':
+        return HarRecorder(spec['directory'])
+    latency = spec.get('latency', 'recorded')
+    if isinstance(latency, dict):
+        latency = {d or None: s for d, s in latency.items()}
+    return HarReplayer(spec['directory'], latency)
+
+def active_tape():
+    """The tape this process records to or replays from, or None for the live network"""
+    global _active
+    with _active_lock:
+        if _active is None and os.environ.get(TAPE_ENV):
+            # A worker process inheriting its parent's tape; saved when the process exits
+            _active = _from_env()
+            if _active.mode == 'record':
+                import atexit
+                atexit.register(_active.close)
+        return _active
+
+@contextlib.contextmanager
+def use_tape(tape):
+    """Make tape the active one for the duration (closing it afterwards, which saves a recording)"""
+    global _active
+    with _active_lock:
+        previous, previous_env = _active, os.environ.get(TAPE_ENV)
+        _active = tape
+        os.environ[TAPE_ENV] = json.dumps(tape.describe())
+    try:
+        yield tape
+    finally:
+        with _active_lock:
+            _active = previous
+            if previous_env is None:
+                os.environ.pop(TAPE_ENV, None)
+            else:
+                os.environ[TAPE_ENV] = previous_env
+        tape.close()
+
+def recording(directory):
+    return use_tape(HarRecorder(directory))
+
+def replaying(directory, latency='recorded'):
+    return use_tape(HarReplayer(directory, latency))
@@ -0,0 +1,290 @@
+import json
+import re
+import sys
+
+import scraper
+from extraction_plans import PLANS
+from http_fetcher import html_parser, looks_blocked, meta_tags
+from retries import BLOCKED
+
+# --- Offline extraction ---
+# Runs the same extraction plans as the browser (extraction_plans.PLANS) over raw HTML, so saved
+# snapshots can be re-extracted after a selector fix without re-fetching or launching Chromium.
+# The interpreter mirrors _INTERPRETER_JS probe for probe; without a layout engine, 'visible' and
+# innerText are approximated from markup (hidden attribute, inline display/visibility styles,
+# block-level tags).
+
+SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'dd', 'details', 'dialog', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li',
+    'main', 'nav', 'ol', 'p', 'pre', 'section', 'summary', 'table', 'tbody', 'thead', 'tfoot', 'tr', 'ul',
+}
+_HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden', re.I)
+_SPACES = re.compile(r'\s+')
+
+def _norm(text):
+    return _SPACES.sub(' ', text or '').strip()
+
+class _Document:
+    """One parsed page, with textContent memoised per element (text probes read it many times)"""
+
+    def __init__(self, html):
+        # Only offline extraction needs bs4
+        from bs4 import BeautifulSoup
+        from bs4.element import Tag, NavigableString, PreformattedString
+        self._tag = Tag
+        # Comments, doctypes and the like are not text in the DOM
+        self._string, self._not_text = NavigableString, PreformattedString
+        self.soup = BeautifulSoup(html, html_parser())
+        self.body = self.soup.body or self.soup
+        self._text = {}
+        self._norm_text = {}
+
+    # --- DOM helpers ---
+
+    def is_tag(self, node):
+        return isinstance(node, self._tag)
+
+    def is_text(self, node):
+        return isinstance(node, self._string) and not isinstance(node, self._not_text)
+
+    def text(self, el):
+        """textContent"""
+        key = id(el)
+        if key not in self._text:
+            self._text[key] = ''.join(self.text(c) if self.is_tag(c) else str(c)
+                                      for c in el.children if self.is_tag(c) or self.is_text(c))
+        return self._text[key]
+
+    def norm_text(self, el):
+        key = id(el)
+        if key not in self._norm_text:
+            self._norm_text[key] = _norm(self.text(el))
+        return self._norm_text[key]
+
+    def hidden(self, el):
+        return el.has_attr('hidden') or bool(_HIDDEN_STYLE.search(el.get('style') or ''))
+
+    def visible(self, el):
+        while self.is_tag(el) and el is not self.soup:
+            if self.hidden(el):
+                return False
+            el = el.parent
+        return True
+
+    def inner_text(self, el):
+        """innerText, approximated: hidden and non-rendered subtrees dropped, block elements on their own lines"""
+        parts = []
+
+        def walk(node):
+            for child in node.children:
+                if self.is_text(child):
+                    parts.append(_SPACES.sub(' ', str(child)))
+                elif self.is_tag(child):
+                    if child.name in SKIP_TAGS or self.hidden(child):
+                        continue
+                    if child.name == 'br':
+                        parts.append('\n')
+                        continue
+                    block = child.name in BLOCK_TAGS
+                    if block:
+                        parts.append('\n')
+                    walk(child)
+                    if block:
+                        parts.append('\n')
+
+        walk(el)
+        lines = (_SPACES.sub(' ', line).strip() for line in ''.join(parts).split('\n'))
+        return '\n'.join(line for line in lines if line)
+
+    def parent(self, el):
+        parent = el.parent
+        return parent if self.is_tag(parent) and parent is not self.soup else None
+
+    def q(self, root, sel):
+        return self.soup.select_one(sel) if root is self.soup else root.select_one(':scope ' + sel)
+
+    def qa(self, root, sel):
+        return self.soup.select(sel) if root is self.soup else root.select(':scope ' + sel)
+
+    def by_text(self, root, test):
+        """Innermost elements whose text passes the test, like Playwright's get_by_text"""
+        out = []
+
+        def walk(el):
+            if el.name in SKIP_TAGS:
+                return False
+            child_hit = False
+            for child in el.children:
+                if self.is_tag(child) and walk(child):
+                    child_hit = True
+            if child_hit:
+                return True
+            if test(self.norm_text(el)):
+                out.append(el)
+                return True
+            return False
+
+        start = self.body if root is self.soup else root
+        if start is not None:
+            walk(start)
+        return out
+
+    # --- Plan interpreter ---
+
+    def take(self, el, how=None):
+        if el is None:
+            return None
+        how = how or 'text'
+        if how == 'text':
+            return self.text(el)
+        if how == 'inner':
+            return self.inner_text(el)
+        if how == 'exists':
+            return True
+        if how.startswith('attr:'):
+            value = el.get(how[5:])
+            return ' '.join(value) if isinstance(value, list) else value
+        if how in ('prev', 'prev2'):
+            prev = el.find_previous_sibling()
+            if how == 'prev2':
+                prev = prev.find_previous_sibling() if prev is not None else None
+            return self.inner_text(prev) if prev is not None else ''
+        if how == 'parent':
+            parent = self.parent(el)
+            return self.inner_text(parent) if parent is not None else ''
+        return None
+
+    def resolve(self, probe, scopes):
+        node = scopes[probe['scope']] if probe.get('scope') else self.soup
+        nodes = None
+        if probe.get('text') or probe.get('re'):
+            if probe.get('re'):
+                pattern = re.compile(probe['re'], re.I if 'i' in probe.get('flags', '') else 0)
+                test = lambda t: bool(pattern.search(t))
+            else:
+                needle = probe['text'].lower()
+                test = lambda t: needle in t.lower()
+            matches = self.by_text(node, test)
+            if probe.get('all') and not probe.get('path'):
+                nodes = matches
+            else:
+                node = matches[0] if matches else None
+        for step in probe.get('path') or []:
+            if node is None:
+                break
+            node = self.parent(node) if step == '..' else self.q(node, step)
+        if probe.get('all') and nodes is None:
+            nodes = self.qa(node, probe['all']) if node is not None and isinstance(probe['all'], str) else []
+        if nodes is not None:
+            if probe.get('visible'):
+                nodes = [el for el in nodes if self.visible(el)]
+            if not probe.get('fields'):
+                return [self.take(el, probe.get('take')) for el in nodes]
+            return [{key: self.take(self.q(el, field['sel']) if field.get('sel') else el, field.get('take'))
+                     for key, field in probe['fields'].items()} for el in nodes]
+        if node is None or node is self.soup:
+            return None
+        if probe.get('visible') and not self.visible(node):
+            return None
+        return self.take(node, probe.get('take'))
+
+    def page_text(self, source):
+        if source == 'dom':
+            raw = ' '.join(str(s) for s in self.body.descendants
+                           if self.is_text(s) and s.parent.name not in SKIP_TAGS)
+        else:
+            raw = self.inner_text(self.body)
+        return _SPACES.sub(' ', raw)
+
+    def run(self, plan):
+        scopes = {}
+        for name, sels in (plan.get('scopes') or {}).items():
+            scopes[name] = next((el for el in map(self.soup.select_one, sels) if el is not None), self.soup)
+
+        candidates = {}
+        for name, probe in plan['probes'].items():
+            try:
+                candidates[name] = self.resolve(probe, scopes)
+            except Exception:
+                candidates[name] = [] if probe.get('all') else None
+
+        texts = {}
+        heuristics = {}
+        for name, h in (plan.get('heuristics') or {}).items():
+            source = h.get('source', 'rendered')
+            if source not in texts:
+                texts[source] = self.page_text(source)
+            text = texts[source]
+            if h.get('pattern'):
+                match = re.search(h['pattern'], text)
+                heuristics[name] = match.group(0) if match else None
+            else:
+                lower = text.lower()
+                heuristics[name] = any(p in lower for p in h['phrases'])
+
+        next_data = None
+        script = self.soup.find('script', id='__NEXT_DATA__')
+        if script is not None:
+            try:
+                next_data = json.loads(script.get_text())
+            except ValueError:
+                pass
+
+        return {
+            'title': _norm(self.soup.title.get_text()) if self.soup.title else '',
+            'jsonld': [s.get_text() for s in self.soup.find_all('script', attrs={'type': 'application/ld+json'})],
+            'next_data': next_data,
+            'candidates': candidates,
+            'heuristics': heuristics,
+        }
+
+def extract_html(html, site=None, next_data=None):
+    """What plan_js(site) returns in the browser, computed from raw HTML.
+
+    next_data (a dict or its JSON text) replaces the page's own __NEXT_DATA__, for snapshots that
+    stored the blob separately.
+    """
+    extraction = _Document(html).run(PLANS[site])
+    if next_data is not None:
+        extraction['next_data'] = json.loads(next_data) if isinstance(next_data, (str, bytes)) else next_data
+    return extraction
+
+def extract_http_page(html, site=None):
+    """(extract_html(html, site), the page's meta tags) from a single parse, for the HTTP tier"""
+    document = _Document(html)
+    return document.run(PLANS[site]), meta_tags(document.soup)
+
+def scrape_html(html, url, next_data=None):
+    """Finished result dict for a saved page, as the browser tier would have produced it"""
+    result = scraper._empty_result(url)
+    site = scraper.site_for(url)
+    scraper.finish_extraction(result, extract_html(html, site, next_data), url, site)
+    if result["Error"] == "Price Not Found" and looks_blocked(200, html):
+        result["Error"] = "Blocked (saved page is an anti-bot interstitial)"
+        result["Error Class"] = BLOCKED
+    result["Source"] = "Snapshot"
+    return result
+
+def url_of_snapshot(html):
+    """The page's own URL, from <link rel="canonical"> or og:url, or None"""
+    match = (re.search(r'<link[^>]+rel=["\']canonical["\'][^>]*href=["\']([^"\']+)', html, re.I)
+             or re.search(r'<link[^>]+href=["\']([^"\']+)["\'][^>]*rel=["\']canonical', html, re.I)
+             or re.search(r'<meta[^>]+property=["\']og:url["\'][^>]*content=["\']([^"\']+)', html, re.I))
+    return match.group(1) if match else None
+
+if __name__ == "__main__":
+    # python offline_extract.py page.html [more.html ...] [--url URL]
+    # Prints one JSON result per snapshot; without --url each page's canonical link is used.
+    args = sys.argv[1:]
+    url = None
+    if '--url' in args:
+        i = args.index('--url')
+        url = args[i + 1]
+        del args[i:i + 2]
+    for path in args:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        page_url = url or url_of_snapshot(html) or path
+        print(json.dumps(dict(scrape_html(html, page_url), Snapshot=path), default=str))
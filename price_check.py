@@ -0,0 +1,276 @@
+"""Headless batch run, for cron jobs and containers.
+
+    python -m price_check products.xlsx -o checked.xlsx --concurrency 4 --resume
+    python -m price_check urls.txt --format jsonl --retailer makro --max-age 6
+    python -m price_check products.xlsx --changed-only -o moved.xlsx
+
+Scraper logs go to stderr; stdout gets one JSON summary of the run (rows/sec, error counts,
+per-domain latency), so `python -m price_check ... > summary.json` works as is.
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+import scraper
+from canonical import group_by_product
+from journal import RunJournal
+from metrics import serve_metrics, MetricsFileWriter
+from price_history import PriceHistory, DEFAULT_HISTORY_PATH
+from network_tape import recording, replaying
+from rate_limit import domain_of
+from result_cache import ResultCache, DEFAULT_CACHE_PATH
+from workbook import merge_results, export_results, read_columns, supports_streaming, STAR_COLUMNS
+
+RETAILERS = ('takealot', 'amazon', 'makro', 'other')
+FORMATS = ('xlsx', 'csv', 'jsonl')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m price_check", description="Check the prices of a list of product URLs.")
+    parser.add_argument("input", help="Excel (.xlsx/.xls), .csv, or a text file with one URL per line")
+    parser.add_argument("-o", "--output", help="output path (default: <input>_updated_<timestamp>.<format>)")
+    parser.add_argument("-f", "--format", choices=FORMATS, help="output format (default: from --output, else xlsx)")
+    parser.add_argument("--url-column", default="URL", help="column holding the product links (default: URL)")
+    parser.add_argument("--retailer", action="append", choices=RETAILERS,
+                        help="only check links from this retailer (repeatable); other rows are left unchecked")
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="tabs working in parallel per process")
+    parser.add_argument("-p", "--processes", type=int, default=1,
+                        help="worker processes, each with its own browser (default: 1)")
+    parser.add_argument("--browser-only", action="store_true", help="skip the HTTP and API tiers")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="result cache path (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="neither read nor write the result cache")
+    parser.add_argument("--max-age", type=float, help="only reuse cached rows checked within this many hours")
+    parser.add_argument("--force-refresh", action="store_true", help="scrape everything, updating the cache")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH, help="price history store (default: %(default)s)")
+    parser.add_argument("--no-history", action="store_true", help="do not append this run to the price history")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="only write rows whose RSP, stock or seller changed since the previous run (or are new)")
+    parser.add_argument("--journal", help="run journal path (default: <input>.journal.jsonl)")
+    parser.add_argument("--no-journal", action="store_true", help="do not keep a run journal")
+    parser.add_argument("--resume", action="store_true", help="skip products an interrupted run already finished")
+    parser.add_argument("--record", metavar="DIR", help="save every network exchange as HAR files in DIR")
+    parser.add_argument("--replay", metavar="DIR", help="serve network exchanges from a --record directory, offline")
+    parser.add_argument("--replay-latency", default="recorded",
+                        help="seconds added per replayed exchange, or 'recorded' (default) for the recorded timings")
+    parser.add_argument("--stage-columns", action="store_true", help="add per-stage timing columns to the output")
+    parser.add_argument("--run-log", metavar="PATH", help="write a JSON-lines log with per-stage timings of every product")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve live Prometheus metrics on http://127.0.0.1:PORT/metrics while running")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="rewrite live Prometheus metrics to this file every 15s (node_exporter textfile format)")
+    parser.add_argument("--summary", help="also write the JSON summary to this file")
+    parser.add_argument("--max-error-rate", type=float,
+                        help="exit with status 1 when more than this fraction of checked rows failed")
+    parser.add_argument("-q", "--quiet", action="store_true", help="discard the scraper's logs")
+    return parser.parse_args(argv)
+
+def retailer_of(url):
+    return scraper.site_for(url) or 'other'
+
+def read_input(path, url_column):
+    """(urls, df): df is None for .xlsx/.xlsm, which are streamed rather than loaded.
+    Raises ValueError when the input has no url_column."""
+    if supports_streaming(path):
+        try:
+            return read_columns(path, (url_column,))[url_column], None
+        except KeyError:
+            raise ValueError(f"{path} has no {url_column!r} column") from None
+    lowered = path.lower()
+    if lowered.endswith('.xls'):
+        df = pd.read_excel(path)
+    elif lowered.endswith('.csv'):
+        df = pd.read_csv(path)
+    else:
+        with open(path, encoding='utf-8') as f:
+            df = pd.DataFrame({url_column: [line.strip() for line in f if line.strip()]})
+    if url_column not in df.columns:
+        raise ValueError(f"{path} has no {url_column!r} column")
+    return df[url_column].tolist(), df
+
+def default_output(path, fmt):
+    name = os.path.splitext(path)[0]
+    return f"{name}_updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+def write_output(args, df, results, output, fmt, only_matched=False, columns=None):
+    if fmt == 'jsonl':
+        with open(output, 'w', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, default=str) + '\n')
+        return
+    if fmt == 'xlsx' and df is None:
+        # Joined to the input by product, one row at a time
+        export_results(args.input, results, output, url_column=args.url_column, only_matched=only_matched,
+                       columns=columns)
+        return
+    if df is None:
+        df = pd.read_excel(args.input)
+    df = merge_results(df, results, url_column=args.url_column, only_matched=only_matched, columns=columns)
+    df = df.drop(columns=[c for c in STAR_COLUMNS if c in df.columns])
+    if fmt == 'csv':
+        df.to_csv(output, index=False)
+    else:
+        df.to_excel(output, index=False)
+
+def _latency(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'mean': round(statistics.fmean(ordered), 3),
+        'p50': round(statistics.median(ordered), 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max': round(ordered[-1], 3),
+    }
+
+def summarize(urls, results, elapsed):
+    """Run summary: throughput, errors by class, result sources and per-domain latency of fresh scrapes"""
+    errors, sources, domains = {}, {}, {}
+    for url, result in zip(urls, results):
+        domain = domain_of(url) if scraper.is_valid_url(url) else 'invalid'
+        stats = domains.setdefault(domain, {'rows': 0, 'errors': 0, 'from_cache': 0, 'times': []})
+        stats['rows'] += 1
+        error_class = result.get('Error Class', 'None')
+        if result.get('Error', 'None') != 'None':
+            stats['errors'] += 1
+            errors[error_class] = errors.get(error_class, 0) + 1
+        sources[result.get('Source', 'N/A')] = sources.get(result.get('Source', 'N/A'), 0) + 1
+        if result.get('From Cache'):
+            stats['from_cache'] += 1
+        elif result.get('Attempts'):
+            stats['times'].append(float(result.get('Scrape Time (s)') or 0))
+    for stats in domains.values():
+        stats['latency_s'] = _latency(stats.pop('times'))
+    return {
+        'rows': len(results),
+        'products': len(group_by_product(urls)),
+        'elapsed_s': round(elapsed, 2),
+        'rows_per_sec': round(len(results) / elapsed, 3) if elapsed else None,
+        'error_rows': sum(errors.values()),
+        'errors': errors,
+        'from_cache': sum(1 for r in results if r.get('From Cache')),
+        'sources': sources,
+        'domains': domains,
+    }
+
+@contextlib.contextmanager
+def _logs_to(stream):
+    """Point file descriptor 1 at stream, so stdout stays clean for the summary.
+    Done at the descriptor level so worker processes, which inherit it, follow too."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    os.dup2(stream.fileno(), 1)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+def network(args):
+    """Record / replay tape for the run, if one was asked for"""
+    if args.record and args.replay:
+        raise ValueError("--record and --replay cannot be combined")
+    if args.record:
+        return recording(args.record)
+    if args.replay:
+        latency = args.replay_latency if args.replay_latency == 'recorded' else float(args.replay_latency)
+        return replaying(args.replay, latency)
+    return contextlib.nullcontext()
+
+@contextlib.contextmanager
+def live_metrics(args):
+    """Expose the run's metrics as it goes, if asked to"""
+    server = serve_metrics(args.metrics_port) if args.metrics_port else None
+    writer = MetricsFileWriter(args.metrics_file) if args.metrics_file else None
+    try:
+        yield
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if writer is not None:
+            writer.stop()
+
+def run(args):
+    urls, df = read_input(args.input, args.url_column)
+    selected = [i for i, url in enumerate(urls)
+                if not args.retailer or (scraper.is_valid_url(url) and retailer_of(url) in args.retailer)]
+    checked = [urls[i] for i in selected]
+
+    fmt = args.format or (os.path.splitext(args.output)[1].lstrip('.').lower() if args.output else 'xlsx')
+    if fmt not in FORMATS:
+        raise ValueError(f"unsupported output format: {fmt}")
+    output = args.output or default_output(args.input, fmt)
+
+    journal = None
+    if not args.no_journal:
+        journal = RunJournal(args.journal or os.path.splitext(args.input)[0] + ".journal.jsonl")
+    if args.changed_only and args.no_history:
+        raise ValueError("--changed-only needs the price history; drop --no-history")
+    cache = None if args.no_cache else args.cache
+    history = None if args.no_history else PriceHistory(args.history)
+    options = dict(concurrency=args.concurrency, http_first=not args.browser_only, cache=cache,
+                   max_age=args.max_age * 3600 if args.max_age is not None else None,
+                   force_refresh=args.force_refresh, journal=journal, resume=args.resume,
+                   stage_columns=args.stage_columns, run_log=args.run_log, history=history)
+
+    started = time.perf_counter()
+    try:
+        if args.processes > 1:
+            from sharding import scrape_products_sharded
+            results = scrape_products_sharded(checked, args.processes, **options)
+        else:
+            options['cache'] = ResultCache(cache) if cache else None
+            try:
+                results = scraper.scrape_products_batch(checked, **options)
+            finally:
+                if options['cache'] is not None:
+                    options['cache'].close()
+        elapsed = time.perf_counter() - started
+
+        # Products that moved since their previous observation (or were seen for the first time)
+        changed = history.changed_rows(results) if history is not None else None
+        if args.changed_only:
+            # The full header even when nothing changed
+            write_output(args, df, changed, output, fmt, only_matched=True, columns=history.changed_columns(results))
+        else:
+            write_output(args, df, results, output, fmt)
+    finally:
+        if history is not None:
+            history.close()
+    if journal is not None:
+        journal.discard()
+
+    summary = summarize(checked, results, elapsed)
+    summary.update(input=args.input, output=output, skipped_rows=len(urls) - len(checked))
+    if changed is not None:
+        summary['changed_products'] = len(changed)
+    return summary
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        with open(os.devnull, 'w') if args.quiet else contextlib.nullcontext(sys.stderr) as logs:
+            with _logs_to(logs), network(args), live_metrics(args):
+                summary = run(args)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    text = json.dumps(summary, indent=2)
+    print(text)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    checked_rows = summary['rows']
+    if args.max_error_rate is not None and checked_rows and summary['error_rows'] / checked_rows > args.max_error_rate:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
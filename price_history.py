@@ -0,0 +1,247 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from canonical import canonical_url
+from resource_policy import host_of
+from result_cache import LAST_CHECKED_FORMAT
+
+DEFAULT_HISTORY_PATH = os.environ.get("PRICE_HISTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_history.sqlite3"))
+
+# Result columns a change in which makes a row worth looking at; column name: history field
+TRACKED = {
+    'RSP': 'rsp',
+    'Stock Availability': 'stock',
+    'Seller': 'seller',
+}
+# Extra columns a changed-rows export carries, next to the current values
+PREVIOUS_COLUMNS = {column: f"Previous {column}" for column in TRACKED}
+CHANGED_COLUMN = "Changed"
+PREVIOUS_CHECKED_COLUMN = "Previously Checked"
+
+_FIELDS = ('key', 'run_id', 'checked_at', 'host', 'price', 'rsp', 'original_price', 'stock', 'seller', 'description')
+
+def price_value(rsp):
+    """'1,299' / '1299.00' / '5689,00' as a number, or None when there is no price"""
+    digits = re.sub(r'[^\d.,]', '', str(rsp or ''))
+    if not re.search(r'\d', digits):
+        return None
+    if ',' in digits and '.' in digits:
+        digits = digits.replace(',', '')
+    elif ',' in digits:
+        # A comma before exactly two trailing digits is a decimal comma; otherwise it groups thousands
+        digits = digits.replace(',', '.') if re.search(r',\d{2}$', digits) and digits.count(',') == 1 else digits.replace(',', '')
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+class PriceHistory:
+    """Append-only time series of scraped prices, one observation per product per run.
+
+    Observations are keyed by canonical URL and check time, and carry the price (as text and as a
+    number), stock, seller and description; the full result lives in ResultCache, not here, so
+    the table stays small. Only rows without an error are recorded, and rows served from the cache
+    or the journal are not, since they are not new observations.
+    Safe to share between the threads of one process.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self.last_run_id = None
+        self._lock = threading.Lock()
+        # The batch loop runs on the browser manager's thread, hence check_same_thread=False
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("""CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL NOT NULL,
+                label TEXT
+            )""")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS observations (
+                key TEXT NOT NULL,
+                run_id INTEGER,
+                checked_at REAL NOT NULL,
+                host TEXT NOT NULL,
+                price REAL,
+                rsp TEXT,
+                original_price TEXT,
+                stock TEXT,
+                seller TEXT,
+                description TEXT
+            )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS observations_key_time ON observations (key, checked_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS observations_run ON observations (run_id)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS observations_time ON observations (checked_at)")
+
+    # --- Writing ---
+
+    def start_run(self, label=None):
+        """Open a run; its id groups the observations a batch records. Also kept as last_run_id."""
+        with self._lock, self._db:
+            run_id = self._db.execute("INSERT INTO runs (started_at, label) VALUES (?, ?)",
+                                      (time.time(), label)).lastrowid
+        self.last_run_id = run_id
+        return run_id
+
+    def record(self, url, result, run_id=None, checked_at=None):
+        """Append one observation; returns False for rows that are not recorded (errors, cached rows)"""
+        if result.get("Error", "None") != "None" or result.get("From Cache"):
+            return False
+        checked_at = time.time() if checked_at is None else checked_at
+        key = canonical_url(url)
+        rsp = result.get("RSP")
+        with self._lock, self._db:
+            self._db.execute(f"INSERT INTO observations ({', '.join(_FIELDS)}) VALUES ({', '.join('?' * len(_FIELDS))})",
+                             (key, run_id if run_id is not None else self.last_run_id, checked_at, host_of(key),
+                              price_value(rsp), rsp, result.get("Original Price"), result.get("Stock Availability"),
+                              result.get("Seller"), result.get("Description")))
+        return True
+
+    # --- Queries ---
+
+    def latest(self, url=None):
+        """Newest observation of one product (a dict, or None), or {key: observation} for every product"""
+        with self._lock:
+            if url is not None:
+                row = self._db.execute("SELECT * FROM observations WHERE key = ? ORDER BY checked_at DESC LIMIT 1",
+                                       (canonical_url(url),)).fetchone()
+                return dict(row) if row else None
+            rows = self._db.execute("""SELECT o.* FROM observations o JOIN (
+                SELECT key, MAX(checked_at) AS checked_at FROM observations GROUP BY key
+            ) newest ON o.key = newest.key AND o.checked_at = newest.checked_at""").fetchall()
+        return {row['key']: dict(row) for row in rows}
+
+    def history(self, url, days=None):
+        """Every observation of one product, oldest first, optionally only the last `days` days"""
+        since = time.time() - days * 86400 if days is not None else 0
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM observations WHERE key = ? AND checked_at >= ? ORDER BY checked_at",
+                                    (canonical_url(url), since)).fetchall()
+        return [dict(row) for row in rows]
+
+    def price_range(self, days=30, url=None):
+        """{key: {'min', 'max', 'mean', 'count', 'first', 'last'}} of the numeric price over the last `days` days"""
+        since = time.time() - days * 86400
+        query = """SELECT key, MIN(price) AS min, MAX(price) AS max, AVG(price) AS mean, COUNT(price) AS count,
+                          MIN(checked_at) AS first, MAX(checked_at) AS last
+                   FROM observations WHERE checked_at >= ? AND price IS NOT NULL"""
+        params = [since]
+        if url is not None:
+            query += " AND key = ?"
+            params.append(canonical_url(url))
+        with self._lock:
+            rows = self._db.execute(query + " GROUP BY key", params).fetchall()
+        return {row['key']: {k: row[k] for k in ('min', 'max', 'mean', 'count', 'first', 'last')} for row in rows}
+
+    def changes(self, run_id=None, fields=tuple(TRACKED)):
+        """Products whose tracked fields differ from their previous observation, for one run
+        (default: the last run this object started, else the newest run in the store).
+
+        Returns {key: {'previous': observation or None, 'current': observation, 'changed': [column, ...]}};
+        products seen for the first time are included with previous None and changed ['New'].
+        """
+        if run_id is None:
+            run_id = self.last_run_id
+        with self._lock:
+            if run_id is None:
+                newest = self._db.execute("SELECT MAX(run_id) FROM runs").fetchone()[0]
+                if newest is None:
+                    return {}
+                run_id = newest
+            # Each observation of the run next to the same product's observation just before it
+            rows = self._db.execute("""SELECT cur.*, (
+                SELECT prev.rowid FROM observations prev
+                WHERE prev.key = cur.key AND prev.checked_at < cur.checked_at
+                ORDER BY prev.checked_at DESC LIMIT 1
+            ) AS previous_rowid FROM observations cur WHERE cur.run_id = ?""", (run_id,)).fetchall()
+            previous_ids = [row['previous_rowid'] for row in rows if row['previous_rowid'] is not None]
+            previous = {}
+            for start in range(0, len(previous_ids), 500):
+                chunk = previous_ids[start:start + 500]
+                for row in self._db.execute(f"SELECT rowid, * FROM observations WHERE rowid IN ({', '.join('?' * len(chunk))})", chunk):
+                    previous[row['rowid']] = {k: row[k] for k in _FIELDS}
+
+        out = {}
+        for row in rows:
+            current = {k: row[k] for k in _FIELDS}
+            before = previous.get(row['previous_rowid'])
+            if before is None:
+                changed = ['New']
+            else:
+                changed = [column for column in fields if _differs(column, before, current)]
+            if changed:
+                out[current['key']] = {'previous': before, 'current': current, 'changed': changed}
+        return out
+
+    def changed_rows(self, results, run_id=None, fields=tuple(TRACKED)):
+        """The result dicts whose product changed in the run, each with 'Previous ...' columns and
+        a 'Changed' column listing what changed (see changes())"""
+        changes = self.changes(run_id, fields)
+        out = []
+        seen = set()
+        for result in results:
+            key = canonical_url(result.get('Link'))
+            change = changes.get(key)
+            if change is None or key in seen:
+                continue
+            seen.add(key)
+            before = change['previous'] or {}
+            row = dict(result)
+            for column, previous_column in PREVIOUS_COLUMNS.items():
+                row[previous_column] = before.get(TRACKED[column], "N/A") if before else "N/A"
+            row[PREVIOUS_CHECKED_COLUMN] = (datetime.fromtimestamp(before['checked_at']).strftime(LAST_CHECKED_FORMAT)
+                                            if before else "N/A")
+            row[CHANGED_COLUMN] = ', '.join(change['changed'])
+            out.append(row)
+        return out
+
+    def changed_columns(self, results):
+        """The columns changed_rows(results) produces, known even when nothing changed (for a header)"""
+        first = next(iter(results), None) or {}
+        return list(first) + list(PREVIOUS_COLUMNS.values()) + [PREVIOUS_CHECKED_COLUMN, CHANGED_COLUMN]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM observations").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def _differs(column, before, current):
+    field = TRACKED[column]
+    if column == 'RSP':
+        # Compare prices as numbers, so '1,299' and '1299.00' are the same price
+        a, b = before['price'], current['price']
+        if a is not None and b is not None:
+            return abs(a - b) > 0.005
+    return (before[field] or '').strip() != (current[field] or '').strip()
+
+def open_history(history):
+    """history may be a PriceHistory, a path, or None. Returns (history, owned)."""
+    if history is None or isinstance(history, PriceHistory):
+        return history, False
+    return PriceHistory(history), True
+
+if __name__ == "__main__":
+    # python price_history.py URL [--days N]
+    # Prints the product's observations over the last N days (default 30) and its price range.
+    import json
+    import sys
+    args = sys.argv[1:]
+    days = 30
+    if '--days' in args:
+        i = args.index('--days')
+        days = float(args[i + 1])
+        del args[i:i + 2]
+    store = PriceHistory()
+    for url in args:
+        for observation in store.history(url, days):
+            observation['checked_at'] = datetime.fromtimestamp(observation['checked_at']).strftime(LAST_CHECKED_FORMAT)
+            print(json.dumps(observation))
+        print(json.dumps({'key': canonical_url(url), 'days': days, 'range': store.price_range(days, url).get(canonical_url(url))}))
+    store.close()
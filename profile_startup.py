@@ -0,0 +1,33 @@
+import sys
+import time
+import importlib
+
+# Cold-start profile: how long each piece takes the first time a session needs it.
+# Run in a fresh interpreter: python profile_startup.py  (add --browser to time the Chromium launch too)
+
+def timed(label, fn):
+    start = time.perf_counter()
+    value = fn()
+    print(f"{label:<40} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    return value
+
+print("--- Imports ---")
+for module in ("pandas", "openpyxl", "scraper", "workbook", "streamlit"):
+    timed(f"import {module}", lambda: importlib.import_module(module))
+
+import scraper
+from browser_pool import ensure_chromium_installed
+
+print("--- Lazy pieces ---")
+timed("playwright.async_api (first browser use)", lambda: importlib.import_module("playwright.async_api"))
+timed("fake_useragent data (first random UA)", lambda: scraper._user_agents().random)
+timed("requests (first HTTP-tier session)", lambda: importlib.import_module("requests"))
+timed("bs4 (first HTTP-tier page)", lambda: importlib.import_module("bs4"))
+
+print("--- Browser ---")
+timed("install check", ensure_chromium_installed)
+if "--browser" in sys.argv:
+    manager = scraper.shared_browser_manager()
+    timed("first context (launches Chromium)", lambda: manager.submit(manager.context(scraper.DEFAULT_USER_AGENT)).result())
+    timed("second context (warm)", lambda: manager.submit(manager.context(scraper.DEFAULT_USER_AGENT)).result())
+    manager.shutdown()
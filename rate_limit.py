@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from itertools import zip_longest
+from resource_policy import host_of
+
+# Starting request rates per retailer (products per second). Buckets halve their rate on a block
+# page or a 429/503 and creep back up after a run of clean responses, within [min, max].
+DEFAULT_RATE = 1.0
+DEFAULT_DOMAIN_RATES = {
+    'takealot.com': 2.0,   # mostly served by the product-details API
+    'amazon.co.za': 0.5,
+    'makro.co.za': 0.3,    # the strictest anti-bot checks
+}
+DEFAULT_BURST = 2
+
+BACKOFF_FACTOR = 0.5     # rate multiplier on a block
+RAMP_FACTOR = 1.2        # rate multiplier after RAMP_AFTER clean responses in a row
+RAMP_AFTER = 5
+MIN_RATE_FRACTION = 0.05 # floor, relative to the starting rate
+MAX_RATE_FRACTION = 4.0  # ceiling, relative to the starting rate
+
+def domain_of(url):
+    host = host_of(str(url))
+    return host[4:] if host.startswith('www.') else host
+
+class AdaptiveTokenBucket:
+    """Token bucket whose refill rate reacts to how the site answers.
+
+    report(blocked=True) halves the rate and empties the bucket; RAMP_AFTER clean reports in a row
+    raise it again. State is guarded by a threading lock and waits use asyncio.sleep, so one bucket
+    can be shared by batches running on different event loops.
+    Waiters queue first come, first served: only the one at the head sleeps until the next token,
+    and it hands the turn to the next waiter once it has its token, so N waiters cost N wakeups.
+    """
+
+    def __init__(self, rate, burst=DEFAULT_BURST):
+        self.initial_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = rate * MIN_RATE_FRACTION
+        self.max_rate = rate * MAX_RATE_FRACTION
+        self.blocks = 0
+        self._tokens = float(burst)
+        self._clean_streak = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        # (loop, future) per waiting acquire(); the head's future is set when its turn comes
+        self._waiters = deque()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return the seconds until one will be"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        """Wait for a token; returns the seconds waited"""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._lock:
+            self._waiters.append(waiter)
+            if len(self._waiters) == 1:
+                waiter[1].set_result(None)
+        try:
+            await waiter[1]
+            while True:
+                delay = self.try_acquire()
+                if not delay:
+                    return time.monotonic() - started
+                # The rate may change while we sleep (report()), so look again rather than assume a token
+                await asyncio.sleep(delay)
+        finally:
+            self._leave(waiter)
+
+    def _leave(self, waiter):
+        # Called with the token taken, or on cancellation; the head passes its turn on
+        with self._lock:
+            was_head = self._waiters[0] is waiter
+            self._waiters.remove(waiter)
+            if was_head and self._waiters:
+                loop, future = self._waiters[0]
+                loop.call_soon_threadsafe(_wake, future)
+
+    def report(self, blocked):
+        with self._lock:
+            if blocked:
+                self.blocks += 1
+                self._clean_streak = 0
+                self.rate = max(self.min_rate, self.rate * BACKOFF_FACTOR)
+                self._refill(time.monotonic())
+                self._tokens = min(self._tokens, 0.0)
+            else:
+                self._clean_streak += 1
+                if self._clean_streak >= RAMP_AFTER:
+                    self._clean_streak = 0
+                    self.rate = min(self.max_rate, self.rate * RAMP_FACTOR)
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class DomainRateLimiter:
+    """One AdaptiveTokenBucket per retailer domain"""
+
+    def __init__(self, default_rate=DEFAULT_RATE, domain_rates=None, burst=DEFAULT_BURST):
+        self.default_rate = default_rate
+        self.domain_rates = DEFAULT_DOMAIN_RATES if domain_rates is None else domain_rates
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, url):
+        domain = domain_of(url)
+        with self._lock:
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                rate = next((r for d, r in self.domain_rates.items() if domain == d or domain.endswith('.' + d)),
+                            self.default_rate)
+                bucket = self._buckets[domain] = AdaptiveTokenBucket(rate, self.burst)
+            return bucket
+
+    async def acquire(self, url):
+        return await self.bucket_for(url).acquire()
+
+    def report(self, url, blocked):
+        self.bucket_for(url).report(blocked)
+
+    def snapshot(self):
+        """{domain: (current rate, blocks seen)} for logging"""
+        with self._lock:
+            return {d: (round(b.rate, 3), b.blocks) for d, b in self._buckets.items()}
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+def shared_rate_limiter():
+    """Process-wide limiter, so concurrent batches (e.g. several Streamlit sessions) share each site's budget"""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = DomainRateLimiter()
+        return _shared_limiter
+
+def interleave_by_domain(items, url_of):
+    """Round-robin items across retailer domains (keeping each domain's own order), so one slow or
+    throttled site never sits in front of the others: T1 A1 M1 T2 A2 M2 ..."""
+    by_domain = {}
+    for item in items:
+        by_domain.setdefault(domain_of(url_of(item)), []).append(item)
+    return [item for round_ in zip_longest(*by_domain.values()) for item in round_ if item is not None]
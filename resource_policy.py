@@ -0,0 +1,138 @@
+from urllib.parse import urlparse
+
+# Resource types we never read: the scraper only uses text, JSON-LD and __NEXT_DATA__
+DEFAULT_BLOCK_TYPES = ('image', 'media', 'font')
+
+# Types that can carry the data we scrape (prices are often filled in by XHR/fetch,
+# and the visibility checks depend on stylesheets). These are only ever blocked
+# when their host is explicitly deny-listed.
+PROTECTED_TYPES = ('document', 'xhr', 'fetch', 'script', 'stylesheet')
+
+# Analytics, ad and beacon hosts seen on the supported retailers
+DEFAULT_DENY_DOMAINS = (
+    'google-analytics.com',
+    'analytics.google.com',
+    'googletagmanager.com',
+    'googleadservices.com',
+    'googlesyndication.com',
+    'doubleclick.net',
+    'facebook.net',
+    'facebook.com',
+    'connect.facebook.net',
+    'hotjar.com',
+    'clarity.ms',
+    'bat.bing.com',
+    'criteo.com',
+    'criteo.net',
+    'amazon-adsystem.com',
+    'scorecardresearch.com',
+    'analytics.tiktok.com',
+    'nr-data.net',
+    'newrelic.com',
+    'segment.io',
+    'optimizely.com',
+    'adnxs.com',
+    'taboola.com',
+    'outbrain.com',
+)
+
+# Rough transfer sizes used to estimate what a blocked request would have cost.
+# Blocked requests are never sent, so the real size is unknowable.
+TYPICAL_BYTES = {
+    'image': 45000,
+    'media': 400000,
+    'font': 35000,
+    'script': 30000,
+    'stylesheet': 20000,
+    'xhr': 3000,
+    'fetch': 3000,
+    'other': 2000,
+}
+
+def host_of(url):
+    try:
+        return (urlparse(url).hostname or '').lower()
+    except ValueError:
+        return ''
+
+def host_matches(host, domains):
+    """True if host is one of the domains or a subdomain of one"""
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+class ResourcePolicy:
+    """Decides which requests a product page may make.
+
+    block_types: resource types aborted everywhere (unless the host is allow-listed).
+    deny_domains: hosts aborted for every resource type (trackers, ad beacons).
+    allow_domains: hosts that are never blocked.
+    site_rules: per retailer overrides keyed by page domain, e.g.
+        {'makro.co.za': {'allow': ['rukminim1.flixcart.com'], 'deny': [...], 'block_types': ['font']}}
+    """
+
+    def __init__(self, block_types=DEFAULT_BLOCK_TYPES, deny_domains=DEFAULT_DENY_DOMAINS,
+                 allow_domains=(), site_rules=None):
+        self.block_types = tuple(block_types)
+        self.deny_domains = tuple(deny_domains)
+        self.allow_domains = tuple(allow_domains)
+        self.site_rules = site_rules or {}
+
+    def _rules_for(self, page_host):
+        for domain, rules in self.site_rules.items():
+            if host_matches(page_host, (domain,)):
+                return rules
+        return {}
+
+    def should_block(self, request_url, resource_type, page_host=''):
+        rules = self._rules_for(page_host)
+        host = host_of(request_url)
+        if not host:
+            # data:, blob: and similar never hit the network
+            return False
+
+        if host_matches(host, self.allow_domains + tuple(rules.get('allow', ()))):
+            return False
+        if host_matches(host, self.deny_domains + tuple(rules.get('deny', ()))):
+            return True
+
+        if resource_type in PROTECTED_TYPES:
+            return False
+        return resource_type in rules.get('block_types', self.block_types)
+
+class ResourceBlocker:
+    """Applies a ResourcePolicy to a browser context and counts what it blocked per page"""
+
+    def __init__(self, policy):
+        self.policy = policy
+        self._pages = {}
+
+    async def attach(self, context):
+        await context.route("**/*", self._handle)
+
+    def start_page(self, page, url):
+        """Reset the counters for a tab that is about to load url"""
+        self._pages[page] = {'host': host_of(url), 'requests': 0, 'bytes': 0}
+
+    def page_stats(self, page):
+        stats = self._pages.get(page)
+        if not stats:
+            return {'requests': 0, 'bytes': 0}
+        return {'requests': stats['requests'], 'bytes': stats['bytes']}
+
+    async def _handle(self, route):
+        request = route.request
+        stats = None
+        try:
+            stats = self._pages.get(request.frame.page)
+        except Exception:
+            # Service worker requests have no frame
+            pass
+
+        page_host = stats['host'] if stats else ''
+        if self.policy.should_block(request.url, request.resource_type, page_host):
+            if stats is not None:
+                stats['requests'] += 1
+                stats['bytes'] += TYPICAL_BYTES.get(request.resource_type, TYPICAL_BYTES['other'])
+            await route.abort('blockedbyclient')
+        else:
+            # fallback() lets any other handler on the context see the request
+            await route.fallback()
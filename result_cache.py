@@ -0,0 +1,106 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from canonical import canonical_url
+from resource_policy import host_of, host_matches
+
+DEFAULT_CACHE_PATH = os.environ.get("PRICE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_cache.sqlite3"))
+
+# How long a scraped row stays fresh, in seconds. Amazon reprices more often than the others.
+DEFAULT_TTL = 12 * 3600
+DEFAULT_DOMAIN_TTLS = {
+    'amazon.co.za': 4 * 3600,
+    'takealot.com': 12 * 3600,
+    'makro.co.za': 12 * 3600,
+}
+
+# Eviction: rows older than this are deleted outright, and the table is trimmed to the newest max_entries
+DEFAULT_RETENTION = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50000
+
+LAST_CHECKED_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class ResultCache:
+    """On-disk store of finished scrape results, keyed by canonical URL.
+
+    ttl / domain_ttls: default and per retailer freshness in seconds ({'takealot.com': 3600}).
+    retention / max_entries: eviction by age and by size, applied by evict() (and on close()).
+    Only rows without an error are stored. Safe to share between the threads of one process.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, domain_ttls=None,
+                 retention=DEFAULT_RETENTION, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.domain_ttls = DEFAULT_DOMAIN_TTLS if domain_ttls is None else domain_ttls
+        self.retention = retention
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # The batch loop runs on the browser manager's thread, hence check_same_thread=False
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("""CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                host TEXT NOT NULL,
+                checked_at REAL NOT NULL,
+                result TEXT NOT NULL
+            )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_checked_at ON results (checked_at)")
+
+    def ttl_for(self, url):
+        host = host_of(canonical_url(url))
+        for domain, ttl in self.domain_ttls.items():
+            if host_matches(host, (domain,)):
+                return ttl
+        return self.ttl
+
+    def get(self, url, max_age=None):
+        """Cached result for url, or None when missing or older than its TTL (or max_age, if shorter)"""
+        key = canonical_url(url)
+        with self._lock:
+            row = self._db.execute("SELECT checked_at, result FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        checked_at, payload = row
+        limit = self.ttl_for(url)
+        if max_age is not None:
+            limit = min(limit, max_age)
+        if time.time() - checked_at > limit:
+            return None
+        result = json.loads(payload)
+        # The row keeps its own Link so it fans out to whichever spelling of the URL asked for it
+        result["Link"] = url
+        return result
+
+    def put(self, url, result, checked_at=None):
+        if result.get("Error", "None") != "None":
+            return
+        checked_at = time.time() if checked_at is None else checked_at
+        key = canonical_url(url)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO results (key, host, checked_at, result) VALUES (?, ?, ?, ?)",
+                             (key, host_of(key), checked_at, json.dumps(result)))
+
+    def evict(self):
+        """Drop rows past the retention age, then the oldest rows beyond max_entries. Returns rows removed."""
+        with self._lock, self._db:
+            removed = self._db.execute("DELETE FROM results WHERE checked_at < ?",
+                                       (time.time() - self.retention,)).rowcount
+            removed += self._db.execute("""DELETE FROM results WHERE key NOT IN (
+                SELECT key FROM results ORDER BY checked_at DESC LIMIT ?)""", (self.max_entries,)).rowcount
+        return removed
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM results")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,86 @@
+import random
+
+# --- Error classes ---
+# Every failed row gets one of these in its 'Error Class' column; successful rows get "None".
+TIMEOUT = "timeout"
+NAVIGATION = "navigation"
+BLOCKED = "blocked"
+PARSE_MISS = "parse_miss"
+INVALID_URL = "invalid_url"
+OTHER = "other"
+
+# Total attempts per class (1 = never retried)
+DEFAULT_ATTEMPT_BUDGETS = {
+    TIMEOUT: 3,
+    NAVIGATION: 3,
+    BLOCKED: 3,
+    PARSE_MISS: 2,
+    INVALID_URL: 1,
+    OTHER: 2,
+}
+
+# First retry delay per class in seconds; doubles with each attempt, capped at MAX_RETRY_DELAY
+DEFAULT_BASE_DELAYS = {
+    TIMEOUT: 5.0,
+    NAVIGATION: 5.0,
+    BLOCKED: 30.0,   # give the anti-bot system (and the rate limiter) time to cool down
+    PARSE_MISS: 10.0,
+    OTHER: 5.0,
+}
+MAX_RETRY_DELAY = 300.0
+
+# Fragments of Playwright / network error messages, checked in order
+_MESSAGE_CLASSES = (
+    ('timeout', TIMEOUT),
+    ('net::err_', NAVIGATION),
+    ('navigation', NAVIGATION),
+    ('target closed', NAVIGATION),
+    ('has been closed', NAVIGATION),
+    ('connection', NAVIGATION),
+)
+
+def classify_exception(error):
+    """Error class for an exception raised while scraping a page"""
+    if isinstance(error, TimeoutError) or type(error).__name__ == 'TimeoutError':
+        return TIMEOUT
+    message = str(error).lower()
+    return next((cls for fragment, cls in _MESSAGE_CLASSES if fragment in message), OTHER)
+
+def classify_result(result):
+    """Error class of a finished result: its 'Error Class' if set, else inferred from 'Error'"""
+    error = str(result.get("Error", "None"))
+    if error == "None":
+        return None
+    known = result.get("Error Class")
+    if known and known != "None":
+        return known
+    if error == "Invalid URL":
+        return INVALID_URL
+    if error == "Price Not Found":
+        return PARSE_MISS
+    if error.startswith("Blocked"):
+        return BLOCKED
+    return classify_exception(Exception(error))
+
+class RetryPolicy:
+    """How often and how soon each error class is retried.
+
+    Delays use exponential backoff with full jitter: a uniform draw from
+    [0, min(max_delay, base * 2 ** (attempt - 1))], so retries of a burst of failures spread out.
+    """
+
+    def __init__(self, budgets=None, base_delays=None, max_delay=MAX_RETRY_DELAY):
+        self.budgets = dict(DEFAULT_ATTEMPT_BUDGETS, **(budgets or {}))
+        self.base_delays = dict(DEFAULT_BASE_DELAYS, **(base_delays or {}))
+        self.max_delay = max_delay
+
+    def should_retry(self, error_class, attempts):
+        return error_class is not None and attempts < self.budgets.get(error_class, 1)
+
+    def delay(self, error_class, attempts):
+        """Seconds to wait before attempt number attempts + 1"""
+        base = self.base_delays.get(error_class, DEFAULT_BASE_DELAYS[OTHER])
+        return random.uniform(0, min(self.max_delay, base * 2 ** (attempts - 1)))
+
+# A policy that never retries, for callers that handle failures themselves
+NO_RETRIES = RetryPolicy(budgets={cls: 1 for cls in DEFAULT_ATTEMPT_BUDGETS})
@@ -3,9 +3,134 @@ import random
 import re
 import json
 import asyncio
-import sys
-from playwright.sync_api import sync_playwright
-from fake_useragent import UserAgent
+import threading
+import os
+import queue
+from datetime import datetime
+import functools
+from http_fetcher import SessionPool, map_meta_tags, BLOCK_STATUSES, BLOCK_MARKERS
+from extraction_plans import (
+    plan_js, AMAZON_CORE_PRICE_CONTAINERS, AMAZON_FALLBACK_PRICE_SELECTORS, AMAZON_ORIGINAL_PRICE_SELECTORS,
+    AMAZON_SELLER_SELECTORS, MAKRO_PRICE_SELECTORS, TAKEALOT_PRICE_SELECTORS, TAKEALOT_ORIGINAL_PRICE_SELECTORS,
+    TAKEALOT_SELLER_SELECTORS, TAKEALOT_SHIPPING_LOCATIONS
+)
+from takealot_api import plid_from_url, fetch_product_details, map_product_details
+from result_cache import ResultCache, LAST_CHECKED_FORMAT
+from canonical import group_by_product
+from browser_pool import BrowserManager
+from rate_limit import shared_rate_limiter, interleave_by_domain, domain_of
+from retries import RetryPolicy, classify_exception, classify_result, BLOCKED, INVALID_URL, PARSE_MISS
+from stage_timing import StageTimer, StageStats, open_run_log
+from metrics import MetricsRegistry, ResponseMeter, shared_metrics
+from price_history import open_history
+
+# Playwright and fake_useragent are the slowest imports here, and runs served entirely over HTTP
+# need neither, so both load on first use
+def async_playwright():
+    """Playwright's async entry point, imported on first browser launch"""
+    from playwright.async_api import async_playwright as playwright_entry
+    return playwright_entry()
+
+@functools.lru_cache(maxsize=1)
+def _user_agents():
+    """fake_useragent's browser data, loaded once per process and only when a random UA is wanted"""
+    from fake_useragent import UserAgent
+    return UserAgent()
+
+@functools.lru_cache(maxsize=1)
+def _process_user_agent():
+    """The random UA for batches without Makro links, picked once per process: the UA is part of a
+    warm context's key (see BrowserManager.context), so a new one per batch would push out the warm
+    contexts and their tabs"""
+    return _user_agents().random
+
+# Makro-friendly desktop Chrome UA (mimics a real Windows user, generally good for the others too)
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+BROWSER_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--start-maximized',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-infobars',
+    '--window-position=0,0',
+    '--ignore-certifcate-errors',
+    '--ignore-certificate-errors-spki-list',
+    '--disable-accelerated-2d-canvas',
+    '--disable-gpu'
+]
+
+# Stealth scripts
+STEALTH_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
+    window.chrome = { runtime: {} };
+    Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5], });
+    Object.defineProperty(navigator, 'languages', { get: () => ['en-ZA', 'en-US', 'en'], });
+"""
+
+JSONLD_SCRIPTS_JS = """() => {
+    const scripts = document.querySelectorAll('script[type="application/ld+json"]');
+    return Array.from(scripts).map(s => s.innerText);
+}"""
+
+NEXT_DATA_JS = """() => {
+    const script = document.getElementById('__NEXT_DATA__');
+    if (script) return JSON.parse(script.innerText);
+    return null;
+}"""
+
+# --- Readiness conditions ---
+# Each retailer's page counts as ready as soon as the data we read is in the DOM.
+# The timeouts (ms) are ceilings, matching the old fixed waits in the worst case.
+JSONLD_PRODUCT_JS = """Array.from(document.querySelectorAll('script[type="application/ld+json"]'))
+        .some(s => /"@type"\\s*:\\s*"(?:http:\\/\\/schema\\.org\\/)?Product"/.test(s.textContent))"""
+
+READY_CONDITIONS = {
+    'amazon': """() => {
+        const title = document.querySelector('#productTitle');
+        if (!title || !title.textContent.trim()) return false;
+        const price = document.querySelector('#corePriceDisplay_desktop_feature_div .a-offscreen, #corePrice_desktop .a-offscreen, #apex_desktop .a-offscreen, .priceToPay .a-offscreen, #priceblock_ourprice');
+        return !!(price && price.textContent.trim()) || !!document.querySelector('#availability');
+    }""",
+    'takealot': """() => {
+        const nd = document.getElementById('__NEXT_DATA__');
+        if (nd && nd.textContent.indexOf('"buybox"') !== -1) return true;
+        const price = document.querySelector('[class*="buybox"] [class*="currency"], .buy-box-price, [data-ref="buy-box-price"]');
+        return !!(price && /R\\s?\\d/.test(price.textContent));
+    }""",
+    'makro': """() => {
+        const title = document.title.toLowerCase();
+        if (title.indexOf('human') !== -1 || title.indexOf('denied') !== -1) return false;
+        if (""" + JSONLD_PRODUCT_JS + """) return true;
+        const h1 = document.querySelector('h1');
+        const price = document.querySelector('.price, .prod-price, [data-test="product-price"]');
+        return !!(h1 && price && /\\d/.test(price.textContent));
+    }""",
+    None: """() => document.readyState === 'complete' || """ + JSONLD_PRODUCT_JS,
+}
+
+READY_TIMEOUTS = {'amazon': 8000, 'takealot': 5000, 'makro': 6000, None: 3000}
+
+# Takealot lazy-loads reviews and shipping info once scrolled
+TAKEALOT_LAZY_CONDITION = """() => !!document.querySelector('[class*="review"], [class*="rating"]')"""
+TAKEALOT_LAZY_TIMEOUT = 1000
+
+def site_for(url):
+    """Which supported retailer a URL belongs to ('amazon', 'makro', 'takealot'), or None"""
+    lowered = str(url).lower()
+    for site in ('amazon', 'makro', 'takealot'):
+        if site in lowered:
+            return site
+    return None
+
+async def wait_for_condition(page, condition, timeout_ms):
+    """Poll a JS condition until it holds or the ceiling passes. Returns the seconds actually waited."""
+    start = time.monotonic()
+    try:
+        await page.wait_for_function(condition, timeout=timeout_ms, polling=100)
+    except Exception:
+        pass
+    return time.monotonic() - start
 
 def clean_price(price_str):
     if not price_str or price_str == "N/A":
@@ -27,796 +152,1184 @@ def extract_price_from_text(text):
         return matches[0]
     return None
 
+def parse_jsonld_scripts(structured_data_list):
+    """Map the raw text of JSON-LD scripts onto our result fields"""
+    data_extracted = {}
+    for sd_text in structured_data_list or []:
+        try:
+            data = json.loads(sd_text)
+            
+            # Helper to process a product node
+            def process_product_node(node):
+                extracted = {}
+                if node.get('@type') in ['Product', 'http://schema.org/Product']:
+                    if 'name' in node: extracted['Description'] = node['name']
+                    if 'sku' in node: extracted['Product Code'] = node['sku']
+                    if 'productID' in node: extracted['PLID'] = node['productID']
+                    
+                    # Offers
+                    offers = node.get('offers')
+                    if isinstance(offers, dict):
+                        if 'price' in offers: extracted['RSP'] = str(offers['price'])
+                        if 'priceCurrency' in offers: extracted['Currency'] = offers['priceCurrency']
+                        if 'availability' in offers: extracted['Stock Availability'] = offers['availability'].split('/')[-1]
+                        if 'seller' in offers:
+                            seller = offers['seller']
+                            if isinstance(seller, dict) and 'name' in seller:
+                                extracted['Seller'] = seller['name']
+                    elif isinstance(offers, list) and len(offers) > 0:
+                        # Take first offer
+                        first_offer = offers[0]
+                        if 'price' in first_offer: extracted['RSP'] = str(first_offer['price'])
+                        if 'availability' in first_offer: extracted['Stock Availability'] = first_offer['availability'].split('/')[-1]
+                        if 'seller' in first_offer:
+                            seller = first_offer['seller']
+                            if isinstance(seller, dict) and 'name' in seller:
+                                extracted['Seller'] = seller['name']
+
+                    # Ratings
+                    if 'aggregateRating' in node:
+                        rating = node['aggregateRating']
+                        if isinstance(rating, dict):
+                            if 'ratingValue' in rating: extracted['Rating'] = str(rating['ratingValue'])
+                            if 'reviewCount' in rating: extracted['Review Count'] = str(rating['reviewCount'])
+                    
+                    return extracted
+                return None
+
+            # Traverse JSON-LD structure
+            found_data = None
+            if isinstance(data, dict):
+                found_data = process_product_node(data)
+                if not found_data and '@graph' in data and isinstance(data['@graph'], list):
+                    for item in data['@graph']:
+                        found_data = process_product_node(item)
+                        if found_data: break
+            elif isinstance(data, list):
+                for item in data:
+                    found_data = process_product_node(item)
+                    if found_data: break
+            
+            if found_data:
+                data_extracted.update(found_data)
+
+        except:
+            continue
+    return data_extracted
+
 def extract_from_jsonld(page):
     """Helper to extract product data from JSON-LD structured data"""
-    data_extracted = {}
     try:
         # Get all JSON-LD scripts
-        structured_data_list = page.evaluate("""() => {
-            const scripts = document.querySelectorAll('script[type="application/ld+json"]');
-            return Array.from(scripts).map(s => s.innerText);
-        }""")
+        structured_data_list = page.evaluate(JSONLD_SCRIPTS_JS)
+    except:
+        return {}
+    return parse_jsonld_scripts(structured_data_list)
+
+async def extract_from_jsonld_async(page):
+    """Async version of extract_from_jsonld for playwright.async_api pages"""
+    try:
+        structured_data_list = await page.evaluate(JSONLD_SCRIPTS_JS)
+    except:
+        return {}
+    return parse_jsonld_scripts(structured_data_list)
+
+def parse_takealot_next_data(next_data_json):
+    """Map a parsed Takealot __NEXT_DATA__ blob onto our result fields"""
+    data_extracted = {}
+    if not next_data_json:
+        return data_extracted
+    try:
+        # Helper to find dictionary with specific keys recursively
+        def find_key(obj, key):
+            if isinstance(obj, dict):
+                if key in obj: return obj[key]
+                for k, v in obj.items():
+                    found = find_key(v, key)
+                    if found: return found
+            elif isinstance(obj, list):
+                for item in obj:
+                    found = find_key(item, key)
+                    if found: return found
+            return None
+            
+        # Search for 'product' or 'reviews' keys anywhere in the props
+        props = next_data_json.get('props', {})
         
-        for sd_text in structured_data_list:
-            try:
-                data = json.loads(sd_text)
+        # 1. Try to find product info
+        product_data = find_key(props, 'product')
+        if not product_data:
+             # Try finding something with 'buybox' which implies product data
+            buybox_parent = find_key(props, 'buybox')
+            if buybox_parent:
+                 # Use the parent of buybox as product data if possible, or the dict itself if it contains title
+                 pass # Hard to reconstruct parent from recursive return, assume standard paths failed if we are here.
+
+        if product_data:
+             if 'title' in product_data: data_extracted['Description'] = product_data['title']
+             if 'core' in product_data and 'title' in product_data['core']: data_extracted['Description'] = product_data['core']['title']
+             
+             buybox = product_data.get('buybox', {})
+             if buybox:
+                if 'prettyPrice' in buybox: data_extracted['RSP'] = buybox['prettyPrice']
+                elif 'price' in buybox: data_extracted['RSP'] = str(buybox['price'])
                 
-                # Helper to process a product node
-                def process_product_node(node):
-                    extracted = {}
-                    if node.get('@type') in ['Product', 'http://schema.org/Product']:
-                        if 'name' in node: extracted['Description'] = node['name']
-                        if 'sku' in node: extracted['Product Code'] = node['sku']
-                        if 'productID' in node: extracted['PLID'] = node['productID']
-                        
-                        # Offers
-                        offers = node.get('offers')
-                        if isinstance(offers, dict):
-                            if 'price' in offers: extracted['RSP'] = str(offers['price'])
-                            if 'priceCurrency' in offers: extracted['Currency'] = offers['priceCurrency']
-                            if 'availability' in offers: extracted['Stock Availability'] = offers['availability'].split('/')[-1]
-                            if 'seller' in offers:
-                                seller = offers['seller']
-                                if isinstance(seller, dict) and 'name' in seller:
-                                    extracted['Seller'] = seller['name']
-                        elif isinstance(offers, list) and len(offers) > 0:
-                            # Take first offer
-                            first_offer = offers[0]
-                            if 'price' in first_offer: extracted['RSP'] = str(first_offer['price'])
-                            if 'availability' in first_offer: extracted['Stock Availability'] = first_offer['availability'].split('/')[-1]
-                            if 'seller' in first_offer:
-                                seller = first_offer['seller']
-                                if isinstance(seller, dict) and 'name' in seller:
-                                    extracted['Seller'] = seller['name']
-
-                        # Ratings
-                        if 'aggregateRating' in node:
-                            rating = node['aggregateRating']
-                            if isinstance(rating, dict):
-                                if 'ratingValue' in rating: extracted['Rating'] = str(rating['ratingValue'])
-                                if 'reviewCount' in rating: extracted['Review Count'] = str(rating['reviewCount'])
-                        
-                        return extracted
-                    return None
-
-                # Traverse JSON-LD structure
-                found_data = None
-                if isinstance(data, dict):
-                    found_data = process_product_node(data)
-                    if not found_data and '@graph' in data and isinstance(data['@graph'], list):
-                        for item in data['@graph']:
-                            found_data = process_product_node(item)
-                            if found_data: break
-                elif isinstance(data, list):
-                    for item in data:
-                        found_data = process_product_node(item)
-                        if found_data: break
+                # Original Price / List Price
+                if 'prices' in buybox and isinstance(buybox['prices'], list):
+                     # Often the list price is the max price in the list or explicitly labeled
+                     # But usually 'prettyOldPrice' or similar is easier if available
+                     pass
+
+                if 'prettyOldPrice' in buybox and buybox['prettyOldPrice']:
+                    data_extracted['Original Price'] = buybox['prettyOldPrice']
+                elif 'oldPrice' in buybox and buybox['oldPrice']:
+                    data_extracted['Original Price'] = str(buybox['oldPrice'])
+                
+                if 'stockAvailability' in buybox: 
+                    status = buybox['stockAvailability'].get('status', '')
+                    if status: data_extracted['Stock Availability'] = status
                 
-                if found_data:
-                    data_extracted.update(found_data)
+                if 'seller' in buybox:
+                    data_extracted['Seller'] = buybox['seller'].get('name')
+                    
+             # Reviews in product object
+             reviews = product_data.get('reviews', {})
+             if reviews:
+                if 'starRating' in reviews: data_extracted['Rating'] = str(reviews['starRating'])
+                if 'reviewCount' in reviews: data_extracted['Review Count'] = str(reviews['reviewCount'])
 
-            except:
-                continue
-    except:
-        pass
+    except Exception as e:
+        print(f"Error parsing Takealot NEXT_DATA content: {e}")
+        
     return data_extracted
 
 def extract_from_takealot_next_data(page):
     """Helper to extract Takealot data from __NEXT_DATA__ or similar state blobs"""
-    data_extracted = {}
     try:
         # Try to find the __NEXT_DATA__ script
-        next_data_json = page.evaluate("""() => {
-            const script = document.getElementById('__NEXT_DATA__');
-            if (script) return JSON.parse(script.innerText);
-            return null;
-        }""")
-
-        if next_data_json:
-            try:
-                # Helper to find dictionary with specific keys recursively
-                def find_key(obj, key):
-                    if isinstance(obj, dict):
-                        if key in obj: return obj[key]
-                        for k, v in obj.items():
-                            found = find_key(v, key)
-                            if found: return found
-                    elif isinstance(obj, list):
-                        for item in obj:
-                            found = find_key(item, key)
-                            if found: return found
-                    return None
-                    
-                # Search for 'product' or 'reviews' keys anywhere in the props
-                props = next_data_json.get('props', {})
-                
-                # 1. Try to find product info
-                product_data = find_key(props, 'product')
-                if not product_data:
-                     # Try finding something with 'buybox' which implies product data
-                    buybox_parent = find_key(props, 'buybox')
-                    if buybox_parent:
-                         # Use the parent of buybox as product data if possible, or the dict itself if it contains title
-                         pass # Hard to reconstruct parent from recursive return, assume standard paths failed if we are here.
-
-                if product_data:
-                     if 'title' in product_data: data_extracted['Description'] = product_data['title']
-                     if 'core' in product_data and 'title' in product_data['core']: data_extracted['Description'] = product_data['core']['title']
-                     
-                     buybox = product_data.get('buybox', {})
-                     if buybox:
-                        if 'prettyPrice' in buybox: data_extracted['RSP'] = buybox['prettyPrice']
-                        elif 'price' in buybox: data_extracted['RSP'] = str(buybox['price'])
-                        
-                        # Original Price / List Price
-                        if 'prices' in buybox and isinstance(buybox['prices'], list):
-                             # Often the list price is the max price in the list or explicitly labeled
-                             # But usually 'prettyOldPrice' or similar is easier if available
-                             pass
-
-                        if 'prettyOldPrice' in buybox and buybox['prettyOldPrice']:
-                            data_extracted['Original Price'] = buybox['prettyOldPrice']
-                        elif 'oldPrice' in buybox and buybox['oldPrice']:
-                            data_extracted['Original Price'] = str(buybox['oldPrice'])
-                        
-                        if 'stockAvailability' in buybox: 
-                            status = buybox['stockAvailability'].get('status', '')
-                            if status: data_extracted['Stock Availability'] = status
-                        
-                        if 'seller' in buybox:
-                            data_extracted['Seller'] = buybox['seller'].get('name')
-                            
-                     # Reviews in product object
-                     reviews = product_data.get('reviews', {})
-                     if reviews:
-                        if 'starRating' in reviews: data_extracted['Rating'] = str(reviews['starRating'])
-                        if 'reviewCount' in reviews: data_extracted['Review Count'] = str(reviews['reviewCount'])
-
-            except Exception as e:
-                print(f"Error parsing Takealot NEXT_DATA content: {e}")
-                
+        next_data_json = page.evaluate(NEXT_DATA_JS)
     except Exception as e:
         # print(f"Error finding Takealot NEXT_DATA: {e}")
-        pass
-        
-    return data_extracted
+        return {}
+    return parse_takealot_next_data(next_data_json)
+
+async def extract_from_takealot_next_data_async(page):
+    """Async version of extract_from_takealot_next_data for playwright.async_api pages"""
+    try:
+        next_data_json = await page.evaluate(NEXT_DATA_JS)
+    except Exception:
+        return {}
+    return parse_takealot_next_data(next_data_json)
+
+def codes_from_url(url, site=None):
+    """Product identifiers that can be read straight off the URL (Amazon ASIN, Takealot PLID)"""
+    site = site or site_for(url)
+    codes = {}
+    if site == 'amazon':
+        asin_match = re.search(r'/dp/([A-Z0-9]{10})', url)
+        if asin_match:
+            codes["Product Code"] = asin_match.group(1)
+    elif site == 'takealot':
+        clean_url = url.split('?')[0]
+        # Get last part of URL as code
+        code = clean_url.rstrip('/').split('/')[-1]
+        if code:
+            codes["Product Code"] = code
+            codes["PLID"] = code
+    return codes
 
-def scrape_products_batch(urls, progress_callback=None):
-    if sys.platform == 'win32':
-        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+def is_valid_url(url):
+    """Excel blanks come through pandas as NaN"""
+    return bool(url) and str(url).lower() != 'nan'
 
-    results = []
-    ua = UserAgent()
+def _empty_result(url):
+    return {
+        "Product Code": "N/A",
+        "Description": "N/A",
+        "Link": url,
+        "PLID": "N/A",
+        "RSP": "N/A",
+        "Original Price": "N/A",
+        "Seller": "N/A",
+        "Stock Availability": "N/A",
+        "Province": "N/A",
+        "Rating": "N/A",
+        "Review Count": "N/A",
+        "Other Seller": "N/A",
+        "Other Price": "N/A",
+        "Error": "None",
+        "Error Class": "None",
+        "Attempts": 0,
+        "Scrape Time (s)": 0.0,
+        "Ready Wait (s)": 0.0,
+        "Blocked Requests": 0,
+        "Bytes Saved (est.)": 0,
+        "Source": "N/A",
+        "Last Checked": "N/A",
+        "From Cache": False
+    }
+
+# --- Extraction plan finishers ---
+# Priority and cleanup rules applied to the candidates one extraction plan run returns
+# (see extraction_plans.py). They only touch Python data, so they work on any source of candidates.
+
+def _finish_amazon(result, c, url, page_title):
+    # Title
+    if result["Description"] == "N/A":
+        if c.get('title') is not None:
+            result["Description"] = c['title'].strip()
+        elif c.get('h1') is not None:
+            result["Description"] = c['h1'].strip()
+        else:
+            result["Description"] = page_title.strip()
     
-    # Check if any URL is Makro to decide on the global UserAgent strategy
-    # Makro is stricter, so if we have Makro links, we might want to use the specific UA for everything 
-    # or switch contexts. For simplicity in batching, let's use the Makro-friendly UA for all if any Makro exists,
-    # as it mimics a real Windows/Chrome user which is generally good for others too.
-    has_makro = any('makro' in u.lower() for u in urls)
+    # Price - Focused on "Core Price Display" (Standard for Desktop)
+    html_price = None
+    for i in range(len(AMAZON_CORE_PRICE_CONTAINERS)):
+        # 1. Look for "Price To Pay" class (Used for Deals and Regular)
+        # Try a-offscreen first (hidden accessible text)
+        offscreen = c.get(f'core{i}_offscreen')
+        if offscreen is not None:
+            txt = offscreen.strip()
+            if txt and 'R' in txt:
+                html_price = txt
+                break
+        
+        # Try visible text components (Whole + Fraction)
+        whole = c.get(f'core{i}_whole')
+        if whole is not None:
+            fraction = c.get(f'core{i}_fraction')
+            f_txt = fraction.strip() if fraction is not None else "00"
+            # Handle "5 689" -> "5689" later in clean_price, just join here
+            html_price = f"R {whole.strip()}.{f_txt}"
+            break
+        
+        # 2. Look for Apex Price (Deal specific sometimes)
+        apex = c.get(f'core{i}_apex')
+        if apex is not None:
+            html_price = apex
+            break
+        
+        # 3. Generic a-price that is NOT a text price (List Price)
+        # We grab the first one that is visible
+        for p in c.get(f'core{i}_prices') or []:
+            if p.get('offscreen') is not None:
+                html_price = p['offscreen']
+                break
+            # Fallback to text
+            txt = (p.get('text') or '').strip()
+            if txt and 'R' in txt:
+                html_price = txt
+                break
+        if html_price:
+            break
     
-    final_ua = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36" 
-    if not has_makro:
-        final_ua = ua.random
+    # Fallback if Core Price container failed (e.g. older layouts)
+    if not html_price:
+        for i in range(len(AMAZON_FALLBACK_PRICE_SELECTORS)):
+            visible_prices = c.get(f'fallback{i}') or []
+            if visible_prices:
+                html_price = visible_prices[0]
+            if html_price:
+                break
 
-    run_headless = True
+    # Fallback: Direct search for a-price-whole if all else failed
+    if not html_price and c.get('whole') is not None:
+        fraction = c.get('fraction')
+        f_txt = fraction.strip() if fraction is not None else "00"
+        html_price = f"R {c['whole'].strip()}.{f_txt}"
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=run_headless,
-            args=[
-                '--disable-blink-features=AutomationControlled',
-                '--start-maximized',
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-infobars',
-                '--window-position=0,0',
-                '--ignore-certifcate-errors',
-                '--ignore-certificate-errors-spki-list',
-                '--disable-accelerated-2d-canvas',
-                '--disable-gpu'
-            ]
-        )
-        
-        context = browser.new_context(
-            user_agent=final_ua,
-            viewport={'width': 1920, 'height': 1080},
-            locale='en-ZA',
-            timezone_id='Africa/Johannesburg'
-        )
-
-        # Stealth scripts
-        context.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
-            window.chrome = { runtime: {} };
-            Object.defineProperty(navigator, 'plugins', { get: () => [1, 2, 3, 4, 5], });
-            Object.defineProperty(navigator, 'languages', { get: () => ['en-ZA', 'en-US', 'en'], });
-        """)
+    if html_price:
+        result["RSP"] = html_price
+
+    # Original Price (List Price / Was Price)
+    if result["Original Price"] == "N/A":
+        # Strategy 1: Look for "List Price:" label explicitly (User Request)
+        if c.get('list_price_offscreen') is not None:
+            result["Original Price"] = c['list_price_offscreen'].strip()
+        elif c.get('list_price_parent'):
+            # Try to extract R xxx from text
+            match = re.search(r'List Price:\s*(R\s?[\d,.\s]+)', c['list_price_parent'], re.IGNORECASE)
+            if match:
+                result["Original Price"] = match.group(1).strip()
+
+        # Strategy 2: Standard selectors
+        if result["Original Price"] == "N/A":
+            for i in range(len(AMAZON_ORIGINAL_PRICE_SELECTORS)):
+                for txt in c.get(f'original{i}') or []:
+                    txt = (txt or '').strip()
+                    if txt and 'R' in txt:
+                        cleaned_op = clean_price(txt)
+                        cleaned_rsp = clean_price(result["RSP"])
+                        
+                        if cleaned_op and cleaned_rsp and cleaned_op != cleaned_rsp:
+                            result["Original Price"] = txt
+                            break
+                if result["Original Price"] != "N/A":
+                    break
+
+    # Seller
+    if result["Seller"] == "N/A":
+        for i in range(len(AMAZON_SELLER_SELECTORS)):
+            text = c.get(f'seller{i}')
+            if text is not None:
+                text = text.strip().replace("Sold by", "").strip()
+                if "fulfilled by" in text.lower():
+                    text = text.split("fulfilled by")[0].strip()
+                result["Seller"] = text
+                break
         
-        page = context.new_page()
+        if result["Seller"] == "N/A":
+            result["Seller"] = "Amazon"
+    
+    # Stock
+    if result["Stock Availability"] == "N/A" and c.get('availability') is not None:
+        result["Stock Availability"] = c['availability'].strip()
+    
+    # Rating & Reviews
+    if result["Rating"] == "N/A":
+        if c.get('rating_out_of') is not None:
+            result["Rating"] = c['rating_out_of']
+        elif c.get('rating_star') is not None:
+            result["Rating"] = c['rating_star']
+    
+    if result["Review Count"] == "N/A":
+        if c.get('review_text') is not None:
+            result["Review Count"] = c['review_text']
+        elif c.get('review_total') is not None:
+            result["Review Count"] = c['review_total']
+        else:
+            for text in c.get('review_matches') or []:
+                match = re.search(r'(\d[\d,]*)\s+(?:global\s+|customer\s+)?(?:ratings|reviews)', (text or '').strip(), re.IGNORECASE)
+                if match:
+                    result["Review Count"] = match.group(1)
+                    break
+
+    # ASIN / Product Code
+    url_codes = codes_from_url(url, 'amazon')
+    if url_codes:
+        result.update(url_codes)
+    elif c.get('asin') is not None:
+        result["Product Code"] = c['asin']
+
+def _finish_makro(result, c, h):
+    # Title
+    if result["Description"] == "N/A" and c.get('h1') is not None:
+        result["Description"] = c['h1'].strip()
+
+    # Price (if JSON failed)
+    if result["RSP"] == "N/A":
+        for i in range(len(MAKRO_PRICE_SELECTORS)):
+            text = c.get(f'price{i}')
+            if text is not None and any(char.isdigit() for char in text):
+                result["RSP"] = text
+                break
+    
+    # Seller
+    if result["Seller"] == "N/A" and c.get('seller_name') is not None:
+        result["Seller"] = c['seller_name'].strip()
+    
+    # Stock (Inferred)
+    if result["Stock Availability"] == "N/A":
+        if h.get('out_of_stock'):
+            result["Stock Availability"] = "Out of Stock"
+        elif h.get('add_to_cart'):
+            result["Stock Availability"] = "In Stock"
+
+def _finish_takealot(result, c, h):
+    # Title
+    if result["Description"] == "N/A" and c.get('h1') is not None:
+        result["Description"] = c['h1'].strip()
+
+    # Price (scoped to the main product container)
+    if result["RSP"] == "N/A":
+        for i in range(len(TAKEALOT_PRICE_SELECTORS)):
+            if c.get(f'price{i}') is not None:
+                result["RSP"] = c[f'price{i}']
+                break
+    
+    # Original Price (List Price)
+    # FORCE CHECK HTML to match user visual expectation (overwriting JSON if found)
+    html_original_price = None
+    
+    # Strategy 1: User Reported Structure (Specific Buybox Class)
+    # User provided: <span class="buybox-offer-module_list-price_..."><span class="currency...">R 2,199</span>...</span>
+    if c.get('list_price_currency') is not None:
+        html_original_price = c['list_price_currency'].strip()
+    elif c.get('list_price') is not None:
+        html_original_price = c['list_price'].strip()
+
+    if not html_original_price:
+        # Strategy 2: Adjacent 'currency plus' spans (Legacy/Fallback)
+        valid_prices = []
+        for txt in c.get('currency_plus') or []:
+            txt = (txt or '').strip()
+            if 'R' in txt: valid_prices.append(txt)
         
-        for i, url in enumerate(urls):
-            if progress_callback:
-                progress_callback(i, url)
-                
-            print(f"Scraping ({i+1}/{len(urls)}): {url}...")
+        # If we found at least 2, and the current RSP is likely one of them
+        if len(valid_prices) >= 2:
+            p1 = valid_prices[0]
+            p2 = valid_prices[1]
             
-            result = {
-                "Product Code": "N/A",
-                "Description": "N/A",
-                "Link": url,
-                "PLID": "N/A",
-                "RSP": "N/A",
-                "Original Price": "N/A",
-                "Seller": "N/A",
-                "Stock Availability": "N/A",
-                "Province": "N/A",
-                "Rating": "N/A",
-                "Review Count": "N/A",
-                "Other Seller": "N/A",
-                "Other Price": "N/A",
-                "Error": "None"
-            }
-
-            if not url or str(url).lower() == 'nan':
-                result["Error"] = "Invalid URL"
-                results.append(result)
-                continue
+            # Heuristic: If we haven't found RSP yet, assume first is RSP
+            if result["RSP"] == "N/A":
+                result["RSP"] = p1
             
-            is_makro = 'makro' in url.lower()
+            # Identify Original: It should be different from RSP
+            curr_clean = clean_price(result["RSP"])
             
-            try:
-                page.goto(url, timeout=60000, wait_until='domcontentloaded')
-                
-                # Anti-bot logic for Makro
-                if is_makro:
-                    try:
-                        page.wait_for_load_state('networkidle', timeout=5000)
-                        time.sleep(1)
-                        if "human" in page.title().lower() or "denied" in page.title().lower():
-                            print("  Blocked by Makro security. Waiting...")
-                            try:
-                                page.wait_for_function("document.title.indexOf('human') === -1", timeout=20000)
-                            except: pass
-                    except: pass
-                    
-                    # Mouse movement simulation
-                    try:
-                        page.mouse.move(random.randint(100, 500), random.randint(100, 500))
-                    except: pass
-                else:
-                    time.sleep(3) # Generic wait for others
+            if clean_price(p1) != curr_clean:
+                html_original_price = p1
+            elif clean_price(p2) != curr_clean:
+                html_original_price = p2
 
-                # --- 1. Extract from JSON-LD first (Most reliable) ---
-                json_data = extract_from_jsonld(page)
-                result.update(json_data)
-
-                # --- 2. Site-Specific Fallbacks and Additional Data ---
-                
-                # --- AMAZON ---
-                if 'amazon' in url.lower():
-                    # Ensure page is loaded (Amazon can be slow/heavy)
-                    try:
-                        page.wait_for_selector('#productTitle', timeout=5000)
-                    except: pass
-
-                    # Title
-                    if result["Description"] == "N/A":
-                        if page.locator('#productTitle').count() > 0:
-                            result["Description"] = page.locator('#productTitle').first.text_content().strip()
-                        elif page.locator('h1').count() > 0:
-                            result["Description"] = page.locator('h1').first.text_content().strip()
-                        else:
-                            result["Description"] = page.title().strip()
-                    
-                    # Price - Focused on "Core Price Display" (Standard for Desktop)
-                    html_price = None
-                    
-                    # The main price block usually has ID 'corePriceDisplay_desktop_feature_div' or 'corePrice_desktop'
-                    core_price_selectors = [
-                        '#corePriceDisplay_desktop_feature_div',
-                        '#corePrice_desktop',
-                        '#apex_desktop',
-                        '.priceToPay' # Fallback container
-                    ]
-                    
-                    for container_sel in core_price_selectors:
-                        container = page.locator(container_sel).first
-                        if container.count() > 0:
-                            # 1. Look for "Price To Pay" class (Used for Deals and Regular)
-                            price_to_pay = container.locator('.priceToPay').first
-                            if price_to_pay.count() > 0:
-                                # Try a-offscreen first (hidden accessible text)
-                                offscreen = price_to_pay.locator('.a-offscreen').first
-                                if offscreen.count() > 0:
-                                    txt = offscreen.text_content().strip()
-                                    if txt and 'R' in txt:
-                                        html_price = txt
-                                        break
-                                
-                                # Try visible text components (Whole + Fraction)
-                                whole = price_to_pay.locator('.a-price-whole').first
-                                fraction = price_to_pay.locator('.a-price-fraction').first
-                                if whole.count() > 0:
-                                    w_txt = whole.text_content().strip()
-                                    f_txt = fraction.text_content().strip() if fraction.count() > 0 else "00"
-                                    # Handle "5 689" -> "5689" later in clean_price, just join here
-                                    html_price = f"R {w_txt}.{f_txt}"
-                                    break
-                            
-                            # 2. Look for Apex Price (Deal specific sometimes)
-                            apex = container.locator('.apexPriceToPay .a-offscreen').first
-                            if apex.count() > 0:
-                                html_price = apex.text_content()
-                                break
-                            
-                            # 3. Generic a-price that is NOT a text price (List Price)
-                            # We grab the first one that is visible
-                            prices = container.locator('.a-price:not(.a-text-price)').all()
-                            for p in prices:
-                                if p.is_visible():
-                                    offscreen = p.locator('.a-offscreen').first
-                                    if offscreen.count() > 0:
-                                        html_price = offscreen.text_content()
-                                        break
-                                    # Fallback to text
-                                    txt = p.text_content().strip()
-                                    if txt and 'R' in txt:
-                                        html_price = txt
-                                        break
-                            if html_price:
-                                break
-                    
-                    # Fallback if Core Price container failed (e.g. older layouts)
-                    if not html_price:
-                         fallback_selectors = ['#priceblock_ourprice', '#priceblock_dealprice', '.a-price.a-text-price.a-size-medium .a-offscreen']
-                         for sel in fallback_selectors:
-                             if page.locator(sel).count() > 0:
-                                prices = page.locator(sel).all()
-                                for p in prices:
-                                    if p.is_visible():
-                                        html_price = p.text_content()
-                                        break
-                                if html_price:
-                                    break
-
-                    # Fallback: Direct search for a-price-whole if all else failed
-                    if not html_price:
-                        whole = page.locator('.a-price-whole').first
-                        fraction = page.locator('.a-price-fraction').first
-                        if whole.count() > 0:
-                            w_txt = whole.text_content().strip()
-                            f_txt = fraction.text_content().strip() if fraction.count() > 0 else "00"
-                            html_price = f"R {w_txt}.{f_txt}"
-                    
-                    if html_price:
-                        result["RSP"] = html_price
-
-                    # Original Price (List Price / Was Price)
-                    if result["Original Price"] == "N/A":
-                        # Strategy 1: Look for "List Price:" label explicitly (User Request)
-                        try:
-                            list_price_label = page.get_by_text("List Price:", exact=False).first
-                            if list_price_label.count() > 0:
-                                # Look in parent context
-                                parent = list_price_label.locator('..')
-                                # Try to find the price element .a-text-price
-                                price_el = parent.locator('.a-text-price .a-offscreen').first
-                                if price_el.count() > 0:
-                                    result["Original Price"] = price_el.text_content().strip()
-                                else:
-                                    # Try to extract R xxx from text
-                                    parent_text = parent.inner_text()
-                                    match = re.search(r'List Price:\s*(R\s?[\d,.\s]+)', parent_text, re.IGNORECASE)
-                                    if match:
-                                        result["Original Price"] = match.group(1).strip()
-                        except: pass
-
-                        # Strategy 2: Standard selectors
-                        if result["Original Price"] == "N/A":
-                            op_selectors = [
-                                '#corePriceDisplay_desktop_feature_div .a-text-price .a-offscreen',
-                                '#corePrice_desktop .a-text-price .a-offscreen',
-                                '.basisPrice .a-offscreen',
-                                'span[data-a-strike="true"]',
-                                '.a-price.a-text-price .a-offscreen'
-                            ]
-                            for sel in op_selectors:
-                                 if page.locator(sel).count() > 0:
-                                    candidates = page.locator(sel).all()
-                                    for c in candidates:
-                                        txt = c.text_content().strip()
-                                        if txt and 'R' in txt:
-                                            cleaned_op = clean_price(txt)
-                                            cleaned_rsp = clean_price(result["RSP"])
-                                            
-                                            if cleaned_op and cleaned_rsp and cleaned_op != cleaned_rsp:
-                                                result["Original Price"] = txt
-                                                break
-                                    if result["Original Price"] != "N/A":
-                                        break
-
-                    # Seller
-                    if result["Seller"] == "N/A":
-                        seller_selectors = ['#merchant-info', '#sellerProfileTriggerId', 'div[tabular-attribute-name="Sold by"]', '.offer-display-feature-text-message']
-                        for sel in seller_selectors:
-                            if page.locator(sel).count() > 0:
-                                text = page.locator(sel).first.text_content().strip()
-                                text = text.replace("Sold by", "").strip()
-                                if "fulfilled by" in text.lower():
-                                    text = text.split("fulfilled by")[0].strip()
-                                result["Seller"] = text
-                                break
-                        
-                        if result["Seller"] == "N/A":
-                            result["Seller"] = "Amazon"
-                    
-                    # Stock
-                    if result["Stock Availability"] == "N/A":
-                        if page.locator('#availability').count() > 0:
-                            result["Stock Availability"] = page.locator('#availability').first.text_content().strip()
-                    
-                    # Rating & Reviews
-                    if result["Rating"] == "N/A":
-                        if page.locator('span[data-hook="rating-out-of-text"]').count() > 0:
-                            result["Rating"] = page.locator('span[data-hook="rating-out-of-text"]').first.text_content()
-                        elif page.locator('.a-icon-star').count() > 0:
-                            result["Rating"] = page.locator('.a-icon-star').first.text_content()
-                    
-                    if result["Review Count"] == "N/A":
-                        if page.locator('#acrCustomerReviewText').count() > 0:
-                            result["Review Count"] = page.locator('#acrCustomerReviewText').first.text_content()
-                        elif page.locator('span[data-hook="total-review-count"]').count() > 0:
-                            result["Review Count"] = page.locator('span[data-hook="total-review-count"]').first.text_content()
-                        else:
-                            try:
-                                candidates = page.get_by_text(re.compile(r'\d[\d,]*\s+(global\s+)?(ratings|reviews)', re.IGNORECASE)).all()
-                                for c in candidates:
-                                    text = c.text_content().strip()
-                                    match = re.search(r'(\d[\d,]*)\s+(?:global\s+|customer\s+)?(?:ratings|reviews)', text, re.IGNORECASE)
-                                    if match:
-                                        result["Review Count"] = match.group(1)
-                                        break
-                            except: pass
-
-                    # ASIN / Product Code
-                    try:
-                        asin_match = re.search(r'/dp/([A-Z0-9]{10})', url)
-                        if asin_match:
-                            result["Product Code"] = asin_match.group(1)
-                        elif page.locator('#ASIN').count() > 0:
-                             result["Product Code"] = page.locator('#ASIN').get_attribute('value')
-                    except: pass
-
-                # --- MAKRO ---
-                elif 'makro' in url.lower():
-                    # Title
-                    if result["Description"] == "N/A":
-                        if page.locator('h1').count() > 0:
-                            result["Description"] = page.locator('h1').first.text_content().strip()
-
-                    # Price (if JSON failed)
-                    if result["RSP"] == "N/A":
-                        selectors = ['.price', '.prod-price', '[data-test="product-price"]', 'div[class*="price"]']
-                        for sel in selectors:
-                            if page.locator(sel).count() > 0:
-                                text = page.locator(sel).first.text_content()
-                                if any(char.isdigit() for char in text):
-                                    result["RSP"] = text
-                                    break
-                    
-                    # Seller
-                    if result["Seller"] == "N/A":
-                        if page.locator('#sellerName').count() > 0:
-                            result["Seller"] = page.locator('#sellerName').first.text_content().strip()
-                    
-                    # Stock (Inferred)
-                    if result["Stock Availability"] == "N/A":
-                        text = page.inner_text('body').lower()
-                        if "out of stock" in text or "sold out" in text:
-                            result["Stock Availability"] = "Out of Stock"
-                        elif "add to cart" in text:
-                            result["Stock Availability"] = "In Stock"
-
-                # --- TAKEALOT ---
-                elif 'takealot' in url.lower():
-                    # Scroll to trigger lazy loading
-                    try:
-                        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                        time.sleep(1)
-                    except: pass
+    if not html_original_price:
+        # Strategy 3: Standard Selectors for the crossed-out list price (Relative to search_scope)
+        for i in range(len(TAKEALOT_ORIGINAL_PRICE_SELECTORS)):
+            raw_text = c.get(f'original{i}')
+            if raw_text is not None:
+                raw_text = raw_text.strip()
+                # Clean potential duplication (e.g. "R 4,9994999") by extracting the first valid price pattern
+                match = re.search(r'R\s?[\d,.]+', raw_text)
+                if match:
+                    html_original_price = match.group(0)
+                else:
+                    html_original_price = raw_text
+                break
     
-                    # Product Code from URL (Takealot specific request)
-                    try:
-                        clean_url = url.split('?')[0]
-                        # Get last part of URL as code
-                        code = clean_url.rstrip('/').split('/')[-1]
-                        result["Product Code"] = code
-                        result["PLID"] = code
-                    except: pass
-                    
-                    # Try hidden NEXT_DATA JSON first (Most detailed)
-                    next_data = extract_from_takealot_next_data(page)
-                    if next_data:
-                        result.update(next_data)
+    # Fallback text search if selector fails (e.g., "List price is R 4,999")
+    # CRITICAL: Only searched inside the product container to avoid Related Products
+    if not html_original_price:
+        for text in c.get('list_price_matches') or []:
+            # Extract price pattern R xxx
+            price_match = re.search(r'R\s?[\d,.]+', text or '')
+            if price_match:
+                found_price = price_match.group(0)
+                # Ensure it's not the same as the current price
+                if clean_price(found_price) != clean_price(result["RSP"]):
+                    html_original_price = found_price
+                    break
     
-                    # Title
-                    if result["Description"] == "N/A":
-                        if page.locator('h1').count() > 0:
-                            result["Description"] = page.locator('h1').first.text_content().strip()
+    if html_original_price:
+        result["Original Price"] = html_original_price
+
+    # Seller
+    if result["Seller"] == "N/A":
+        for i in range(len(TAKEALOT_SELLER_SELECTORS)):
+            if c.get(f'seller{i}') is not None:
+                result["Seller"] = c[f'seller{i}'].strip()
+                break
+        
+        # Fallback text search for "Sold by" if selector fails
+        if result["Seller"] == "N/A":
+            for raw_text in c.get('sold_by') or []:
+                # Normalize text (remove newlines, extra spaces)
+                text = " ".join((raw_text or '').split())
+                
+                if "Sold by" in text:
+                    # Extract part after "Sold by"
+                    after_sold_by = text.split("Sold by")[-1].strip()
                     
-                    # --- SCOPED SEARCH FOR PRICES ---
-                    # Define the main product container to avoid scanning related products/footer
-                    product_container = page.locator('.pdp-main-panel').first
-                    if product_container.count() == 0:
-                        # Fallback to a wider selection if main panel class changes, but try to stay above tabs/related
-                        product_container = page.locator('.pdp-body').first 
+                    # Cleanup: Remove "Fulfilled by..." and other common suffixes
+                    candidate = after_sold_by.split("Fulfilled")[0].strip()
+                    candidate = candidate.split("Seller Score")[0].strip() # Handle user example case
                     
-                    search_scope = product_container if product_container.count() > 0 else page
+                    # Heuristic: A valid seller name is usually short (e.g., < 50 chars)
+                    if 0 < len(candidate) < 50:
+                        result["Seller"] = candidate
+                        break
+        
+        # Check for "Sold by Takealot" explicitly if still N/A
+        if result["Seller"] == "N/A" and h.get('sold_by_takealot'):
+            result["Seller"] = "Takealot"
+
+        # Default to Takealot if still N/A (User request)
+        if result["Seller"] == "N/A":
+            result["Seller"] = "Takealot"
+
+    # Province / Location Availability
+    if result["Province"] == "N/A":
+        # Check for specific shipping text patterns
+        found_locs = [code for place, code in TAKEALOT_SHIPPING_LOCATIONS if h.get(f'shipped_{code}')]
+        if found_locs:
+            result["Province"] = ", ".join(found_locs)
+
+    # Stock
+    if result["Stock Availability"] == "N/A":
+        # Check for specific "Supplier out of stock" text as per user report
+        if h.get('supplier_out_of_stock'):
+            result["Stock Availability"] = "Supplier out of stock"
+        elif c.get('stock_class') is not None:
+            result["Stock Availability"] = c['stock_class'].strip()
+        elif c.get('stock_ref') is not None:
+            result["Stock Availability"] = c['stock_ref'].strip()
+        
+        # Fallback Logic: Check for negative indicators, otherwise assume In Stock
+        if result["Stock Availability"] == "N/A":
+            if h.get('out_of_stock'):
+                result["Stock Availability"] = "Out of Stock"
+            else:
+                # If we are here, we found no evidence of it being out of stock
+                result["Stock Availability"] = "In Stock"
     
-                    # Price
-                    if result["RSP"] == "N/A":
-                        selectors = ['.buy-box-price', '[data-ref="buy-box-price"]', '.price-container', 'div[class*="price"]']
-                        for sel in selectors:
-                            if search_scope.locator(sel).count() > 0:
-                                result["RSP"] = search_scope.locator(sel).first.text_content()
-                                break
-                    
-                    # Original Price (List Price)
-                    # FORCE CHECK HTML to match user visual expectation (overwriting JSON if found)
-                    html_original_price = None
-                    
-                    # Strategy 1: User Reported Structure (Specific Buybox Class)
-                    # User provided: <span class="buybox-offer-module_list-price_..."><span class="currency...">R 2,199</span>...</span>
-                    try:
-                        # This class is specific to the main buybox list price
-                        # Use 'page' instead of 'search_scope' because Buybox is often in a sidebar (aside) not main panel
-                        list_price_container = page.locator('span[class*="buybox-offer-module_list-price"]').first
-                        if list_price_container.count() > 0:
-                            # Try nested currency span first
-                            curr = list_price_container.locator('span[class*="currency"]').first
-                            if curr.count() > 0:
-                                html_original_price = curr.text_content().strip()
-                            else:
-                                html_original_price = list_price_container.text_content().strip()
-                    except: pass
-
-                    if not html_original_price:
-                        # Strategy 2: Adjacent 'currency plus' spans (Legacy/Fallback)
-                        try:
-                            # Find all spans with both classes (Takealot specific styling)
-                            currency_elements = search_scope.locator('span[class*="currency"][class*="plus"]').all()
-                            valid_prices = []
-                            for el in currency_elements:
-                                txt = el.text_content().strip()
-                                if 'R' in txt: valid_prices.append(txt)
-                            
-                            # If we found at least 2, and the current RSP is likely one of them
-                            if len(valid_prices) >= 2:
-                                p1 = valid_prices[0]
-                                p2 = valid_prices[1]
-                                
-                                # Heuristic: If we haven't found RSP yet, assume first is RSP
-                                if result["RSP"] == "N/A":
-                                    result["RSP"] = p1
-                                
-                                # Identify Original: It should be different from RSP
-                                curr_clean = clean_price(result["RSP"])
-                                
-                                if clean_price(p1) != curr_clean:
-                                    html_original_price = p1
-                                elif clean_price(p2) != curr_clean:
-                                    html_original_price = p2
-                        except: pass
-
-                    if not html_original_price:
-                        # Strategy 3: Standard Selectors for the crossed-out list price (Relative to search_scope)
-                        op_selectors = ['.buy-box-old-price', '[data-ref="buy-box-list-price"]', '.list-price', 'div[class*="list-price"]']
-                        for sel in op_selectors:
-                            if search_scope.locator(sel).count() > 0:
-                                # Use inner_text() to avoid hidden metadata
-                                raw_text = search_scope.locator(sel).first.inner_text().strip()
-                                
-                                # Clean potential duplication (e.g. "R 4,9994999") by extracting the first valid price pattern
-                                match = re.search(r'R\s?[\d,.]+', raw_text)
-                                if match:
-                                    html_original_price = match.group(0)
-                                else:
-                                    html_original_price = raw_text
-                                break
-                    
-                    # Fallback text search if selector fails (e.g., "List price is R 4,999")
-                    # CRITICAL: Only search inside the product container to avoid Related Products
-                    if not html_original_price:
-                        try:
-                            # Look for text containing "List price" or "Was" near the price
-                            list_price_els = search_scope.get_by_text(re.compile(r'List price|Was', re.IGNORECASE)).all()
-                            for el in list_price_els:
-                                text = el.text_content()
-                                # Extract price pattern R xxx
-                                price_match = re.search(r'R\s?[\d,.]+', text)
-                                if price_match:
-                                    found_price = price_match.group(0)
-                                    # Ensure it's not the same as the current price
-                                    if clean_price(found_price) != clean_price(result["RSP"]):
-                                        html_original_price = found_price
-                                        break
-                        except: pass
-                    
-                    if html_original_price:
-                        result["Original Price"] = html_original_price
-                    # Seller
-                    if result["Seller"] == "N/A":
-                        # Try multiple selectors for seller
-                        seller_selectors = ['.seller-name span', '.seller-name a', '[data-ref="seller-name"]', '.pdp-module_seller-name_3-h0m']
-                        for sel in seller_selectors:
-                            if page.locator(sel).count() > 0:
-                                result["Seller"] = page.locator(sel).first.text_content().strip()
-                                break
-                        
-                        # Fallback text search for "Sold by" if selector fails
-                        if result["Seller"] == "N/A":
-                            try:
-                                # Get all elements containing "Sold by"
-                                sold_by_elements = page.get_by_text("Sold by", exact=False).all()
-                                for el in sold_by_elements:
-                                    raw_text = el.text_content()
-                                    # Normalize text (remove newlines, extra spaces)
-                                    text = " ".join(raw_text.split())
-                                    
-                                    if "Sold by" in text:
-                                        # Extract part after "Sold by"
-                                        after_sold_by = text.split("Sold by")[-1].strip()
-                                        
-                                        # Cleanup: Remove "Fulfilled by..." and other common suffixes
-                                        candidate = after_sold_by.split("Fulfilled")[0].strip()
-                                        candidate = candidate.split("Seller Score")[0].strip() # Handle user example case
-                                        
-                                        # Heuristic: A valid seller name is usually short (e.g., < 50 chars)
-                                        # and shouldn't just be "Takealot" if we are looking for 3rd parties (though it could be).
-                                        if 0 < len(candidate) < 50:
-                                            result["Seller"] = candidate
-                                            break
-                            except: pass
-                        
-                        # Check for "Sold by Takealot" explicitly if still N/A
-                        if result["Seller"] == "N/A":
-                            body_text_lower = page.inner_text('body').lower()
-                            if "sold by takealot" in body_text_lower:
-                                result["Seller"] = "Takealot"
-
-                        # Default to Takealot if still N/A (User request)
-                        if result["Seller"] == "N/A":
-                            result["Seller"] = "Takealot"
-
-                    # Province / Location Availability
-                    if result["Province"] == "N/A":
-                        found_locs = []
-                        # Check for specific shipping text patterns
-                        if page.get_by_text("shipped from Durban", exact=False).count() > 0:
-                            found_locs.append("DBN")
-                        if page.get_by_text("shipped from Johannesburg", exact=False).count() > 0:
-                            found_locs.append("JHB")
-                        if page.get_by_text("shipped from Cape Town", exact=False).count() > 0:
-                            found_locs.append("CPT")
-                        
-                        if found_locs:
-                            result["Province"] = ", ".join(found_locs)
+    # Rating & Review Count (HTML Fallback)
+    if result["Rating"] == "N/A" or result["Review Count"] == "N/A":
+        # Elements containing "Review" (covers "Reviews" and "Review"), with their neighbours' text
+        for el in c.get('review_els') or []:
+            text = (el.get('text') or '').strip()
+            
+            count_found = None
+            
+            # Strategy 1: "56 Reviews" in text
+            matches = re.search(r'(\d+)\s*Review', text, re.IGNORECASE)
+            if matches:
+                count_found = matches.group(1)
+            
+            # Strategy 2: Text is just "Reviews", count is previous sibling
+            elif text.lower() in ["reviews", "review", "(reviews)", "reviews)"]:
+                prev_text = (el.get('prev') or '').strip()
+                if prev_text.isdigit():
+                    count_found = prev_text
 
-                    
-                    # Stock
-                    if result["Stock Availability"] == "N/A":
-                        # Check for specific "Supplier out of stock" text as per user report
-                        if page.get_by_text("Supplier out of stock").count() > 0:
-                             result["Stock Availability"] = "Supplier out of stock"
-                        elif page.locator('.stock-availability').count() > 0:
-                            result["Stock Availability"] = page.locator('.stock-availability').first.text_content().strip()
-                        elif page.locator('[data-ref="stock-availability"]').count() > 0:
-                            result["Stock Availability"] = page.locator('[data-ref="stock-availability"]').first.text_content().strip()
-                        
-                        # Fallback Logic: Check for negative indicators, otherwise assume In Stock
-                        if result["Stock Availability"] == "N/A":
-                            body_text_lower = page.inner_text('body').lower()
-                            if "out of stock" in body_text_lower or "sold out" in body_text_lower:
-                                result["Stock Availability"] = "Out of Stock"
-                            else:
-                                # If we are here, we found no evidence of it being out of stock
-                                result["Stock Availability"] = "In Stock"
-                    
-                    # Rating & Review Count (HTML Fallback)
-                    if result["Rating"] == "N/A" or result["Review Count"] == "N/A":
-                         try:
-                            # Find all elements containing "Review" (covers "Reviews" and "Review")
-                            review_els = page.get_by_text("Review", exact=False).all()
-                            for el in review_els:
-                                text = el.text_content().strip()
-                                
-                                count_found = None
-                                
-                                # Strategy 1: "56 Reviews" in text
-                                matches = re.search(r'(\d+)\s*Review', text, re.IGNORECASE)
-                                if matches:
-                                    count_found = matches.group(1)
-                                
-                                # Strategy 2: Text is just "Reviews", count is previous sibling
-                                elif text.lower() in ["reviews", "review", "(reviews)", "reviews)"]:
-                                    try:
-                                        prev_text = el.evaluate("el => el.previousElementSibling ? el.previousElementSibling.innerText : ''").strip()
-                                        if prev_text.isdigit():
-                                            count_found = prev_text
-                                    except: pass
-
-                                if count_found:
-                                    result["Review Count"] = count_found
-                                    
-                                    # Try to find Rating near this element
-                                    # Context Strategy: Previous Sibling
-                                    try:
-                                        prev = el.evaluate("el => el.previousElementSibling ? el.previousElementSibling.innerText : ''")
-                                        # If prev was the count, check prev-prev for rating
-                                        if prev.strip() == count_found:
-                                             prev = el.evaluate("el => el.previousElementSibling && el.previousElementSibling.previousElementSibling ? el.previousElementSibling.previousElementSibling.innerText : ''")
-                                        
-                                        if prev and re.match(r'^\d\.\d$', prev.strip()):
-                                            result["Rating"] = prev.strip()
-                                    except: pass
-                                    
-                                    # Context Strategy: Parent's text
-                                    if result["Rating"] == "N/A":
-                                        try:
-                                            parent_text = el.evaluate("el => el.parentElement ? el.parentElement.innerText : ''")
-                                            rating_match = re.search(r'(\d\.\d)', parent_text)
-                                            if rating_match:
-                                                result["Rating"] = rating_match.group(1)
-                                        except: pass
-                                    
-                                    break # Found a count, stop
-                            
-                            # Fallback for Rating if still N/A
-                            if result["Rating"] == "N/A":
-                                 # Look for the big number rating usually at top
-                                 rating_el = page.locator('.rating-score').first
-                                 if rating_el.count() > 0:
-                                     result["Rating"] = rating_el.text_content().strip()
-                                 else:
-                                     # Try searching for text that looks like a rating "4.2" standing alone
-                                     potential_ratings = page.get_by_text(re.compile(r'^\s*\d\.\d\s*$')).all()
-                                     for pr in potential_ratings:
-                                         try:
-                                             val = float(pr.text_content().strip())
-                                             if 1.0 <= val <= 5.0:
-                                                 result["Rating"] = str(val)
-                                                 break
-                                         except: pass
-
-                         except Exception as e:
-                             print(f"Error in HTML fallback for reviews: {e}")
-
-                # --- Final Cleanup ---
-                result["RSP"] = clean_price(result["RSP"])
-                result["Original Price"] = clean_price(result["Original Price"])
+            if count_found:
+                result["Review Count"] = count_found
+                
+                # Try to find Rating near this element
+                # Context Strategy: Previous Sibling
+                prev = el.get('prev') or ''
+                # If prev was the count, check prev-prev for rating
+                if prev.strip() == count_found:
+                    prev = el.get('prev2') or ''
                 
-                if result["RSP"] == "N/A" or result["RSP"] == "":
-                    # Fallback text search
-                    body_text = page.inner_text("body")
-                    extracted = extract_price_from_text(body_text)
-                    if extracted:
-                        result["RSP"] = extracted
-                    else:
-                        result["Error"] = "Price Not Found"
+                if prev and re.match(r'^\d\.\d$', prev.strip()):
+                    result["Rating"] = prev.strip()
                 
-                results.append(result)
-                print(f"  > Scraped: {result['Description'][:30]}... | Price: {result['RSP']}")
+                # Context Strategy: Parent's text
+                if result["Rating"] == "N/A":
+                    rating_match = re.search(r'(\d\.\d)', el.get('parent') or '')
+                    if rating_match:
+                        result["Rating"] = rating_match.group(1)
                 
-            except Exception as e:
-                print(f"Error scraping {url}: {e}")
-                result["Error"] = str(e)[:100]
-                results.append(result)
+                break # Found a count, stop
+        
+        # Fallback for Rating if still N/A
+        if result["Rating"] == "N/A":
+            # Look for the big number rating usually at top
+            if c.get('rating_score') is not None:
+                result["Rating"] = c['rating_score'].strip()
+            else:
+                # Text that looks like a rating "4.2" standing alone
+                for pr in c.get('rating_matches') or []:
+                    try:
+                        val = float((pr or '').strip())
+                        if 1.0 <= val <= 5.0:
+                            result["Rating"] = str(val)
+                            break
+                    except ValueError: pass
+
+def finish_extraction(result, extraction, url, site=None, timer=None):
+    """Fill result from one extraction plan run: JSON-LD first, then the site's candidates and text heuristics"""
+    site = site or site_for(url)
+    timer = timer or StageTimer()
+    candidates = extraction.get('candidates') or {}
+    heuristics = extraction.get('heuristics') or {}
+
+    # --- 1. Extract from JSON-LD first (Most reliable) ---
+    with timer.stage('jsonld'):
+        result.update(parse_jsonld_scripts(extraction.get('jsonld')))
+    with timer.stage('site_rules'):
+        return _finish_site(result, extraction, url, site, candidates, heuristics)
+
+def _finish_site(result, extraction, url, site, candidates, heuristics):
+    # --- 2. Site-Specific Fallbacks and Additional Data ---
+    if site == 'amazon':
+        _finish_amazon(result, candidates, url, extraction.get('title') or '')
+    elif site == 'makro':
+        _finish_makro(result, candidates, heuristics)
+    elif site == 'takealot':
+        # Product Code from URL (Takealot specific request)
+        result.update(codes_from_url(url, site))
+        # Hidden NEXT_DATA JSON next (Most detailed)
+        result.update(parse_takealot_next_data(extraction.get('next_data')))
+        _finish_takealot(result, candidates, heuristics)
+
+    # --- Final Cleanup ---
+    result["RSP"] = clean_price(result["RSP"])
+    result["Original Price"] = clean_price(result["Original Price"])
+    
+    if result["RSP"] == "N/A" or result["RSP"] == "":
+        # Fallback text search (R xxx.xx pattern, matched in the page)
+        extracted = heuristics.get('first_price')
+        if extracted:
+            result["RSP"] = extracted
+        else:
+            result["Error"] = "Price Not Found"
+            result["Error Class"] = PARSE_MISS
+    return result
+
+async def _scrape_url(page, url, blocker=None, limiter=None, timer=None):
+    """Scrape a single product page on an already-open tab.
+    limiter (a rate_limit.DomainRateLimiter or metrics.ResponseMeter) is told whether the site answered with a block page;
+    timer (a stage_timing.StageTimer) gets the time spent in each stage."""
+    result = _empty_result(url)
+    timer = timer or StageTimer()
+
+    if not is_valid_url(url):
+        result["Error"] = "Invalid URL"
+        result["Error Class"] = INVALID_URL
+        return result
+    
+    site = site_for(url)
+    is_makro = site == 'makro'
+    waited = 0.0
+    if blocker:
+        blocker.start_page(page, url)
+    
+    try:
+        with timer.stage('goto'):
+            response = await page.goto(url, timeout=60000, wait_until='domcontentloaded')
+            try:
+                title = (await page.title()).lower()
+            except Exception:
+                title = ""
+        status = response.status if response is not None else 200
+        block_signal = status in BLOCK_STATUSES or any(marker in title for marker in BLOCK_MARKERS)
+        if limiter:
+            limiter.report(url, block_signal)
         
-        browser.close()
+        # Anti-bot logic for Makro
+        if is_makro:
+            try:
+                if "human" in title or "denied" in title:
+                    print("  Blocked by Makro security. Waiting...")
+                    antibot = await wait_for_condition(page, "document.title.indexOf('human') === -1", 20000)
+                    timer.add('antibot_wait', antibot)
+                    waited += antibot
+                    title = (await page.title()).lower()
+                    block_signal = "human" in title or "denied" in title
+            except: pass
+            
+            # Mouse movement simulation
+            try:
+                await page.mouse.move(random.randint(100, 500), random.randint(100, 500))
+            except: pass
+
+        # Wait until this retailer's data is in the DOM (or the ceiling passes)
+        ready = await wait_for_condition(page, READY_CONDITIONS[site], READY_TIMEOUTS[site])
+        timer.add('ready_wait', ready)
+        waited += ready
+
+        # Takealot lazy-loads reviews and shipping info: scroll to trigger it
+        if site == 'takealot':
+            try:
+                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                lazy = await wait_for_condition(page, TAKEALOT_LAZY_CONDITION, TAKEALOT_LAZY_TIMEOUT)
+                timer.add('lazy_wait', lazy)
+                waited += lazy
+            except: pass
+
+        # One round trip returns JSON-LD, __NEXT_DATA__ and every selector candidate for this site
+        with timer.stage('evaluate'):
+            extraction = await page.evaluate(plan_js(site))
+        finish_extraction(result, extraction, url, site, timer)
+
+        # No price on a page that looked like an interstitial: report the block, not a parse miss
+        if result["Error"] == "Price Not Found" and block_signal:
+            result["Error"] = f"Blocked (HTTP {status})" if status in BLOCK_STATUSES else f"Blocked ({title[:60]})"
+            result["Error Class"] = BLOCKED
+
+        print(f"  > Scraped: {result['Description'][:30]}... | Price: {result['RSP']}")
+        
+    except Exception as e:
+        print(f"Error scraping {url}: {e}")
+        result["Error"] = str(e)[:100]
+        result["Error Class"] = classify_exception(e)
+
+    result["Source"] = "Browser"
+    result["Ready Wait (s)"] = round(waited, 2)
+    if blocker:
+        blocked = blocker.page_stats(page)
+        result["Blocked Requests"] = blocked['requests']
+        result["Bytes Saved (est.)"] = blocked['bytes']
+
+    return result
+
+async def _notify(progress_callback, completed, url):
+    if progress_callback:
+        outcome = progress_callback(completed, url)
+        # Async services can pass a coroutine function as the callback
+        if asyncio.iscoroutine(outcome):
+            await outcome
+
+# Fields a plain HTTP response must yield before we trust it over the browser
+HTTP_REQUIRED_FIELDS = ("Description", "RSP")
+# ...and, for the retailers with their own rules, these too: a page whose seller or stock only
+# appear once scripts run goes through the browser rather than losing them
+HTTP_RETAILER_FIELDS = ("Seller", "Stock Availability")
+
+def scrape_via_http(sessions, url, timer=None):
+    """Tier 1: plain pooled HTTP GET, then meta tags and the site's extraction plan over the HTML.
+
+    Blocking; returns a finished result, or None when the page must go through the browser
+    (request failed, anti-bot page, or required fields missing).
+    """
+    import requests  # loaded on first use, like playwright and bs4
+    site = site_for(url)
+    timer = timer or StageTimer()
+    try:
+        with timer.stage('http_fetch'):
+            page = sessions.fetch_page(url)
+    except requests.RequestException:
+        return None
+    if page.blocked or page.status >= 400:
+        return None
+    with timer.stage('http_parse'):
+        return _result_from_http_page(page, url, site)
+
+def _result_from_http_page(page, url, site):
+    # The site's own extraction plan over the fetched HTML, as the browser would run it (see
+    # offline_extract.py), so the HTTP tier fills the same fields the same way
+    from offline_extract import extract_http_page
+    extraction, meta = extract_http_page(page.html, site)
+    result = _empty_result(url)
+    # Meta tags first: JSON-LD and the site rules override them
+    result.update(map_meta_tags(meta))
+    finish_extraction(result, extraction, url, site)
+    result.update(codes_from_url(url, site))
+
+    if result["Error"] != "None":
+        return None
+    required = HTTP_REQUIRED_FIELDS + (HTTP_RETAILER_FIELDS if site else ())
+    if any(result.get(field) in (None, "", "N/A") for field in required):
+        return None
+
+    result["Source"] = "HTTP"
+    return result
+
+def scrape_via_takealot_api(sessions, url, api_base=None, timer=None):
+    """Tier 1 for Takealot: go straight from the PLID to the product-details JSON, no rendering.
+
+    Blocking; returns a finished result, or None to fall back to the browser.
+    """
+    plid = plid_from_url(url)
+    if not plid:
+        return None
+    timer = timer or StageTimer()
+    with timer.stage('api_fetch'):
+        payload = fetch_product_details(sessions, plid, api_base, url)
+    if not payload:
+        return None
+    with timer.stage('api_parse'):
+        return _result_from_product_details(payload, url)
+
+def _result_from_product_details(payload, url):
+    result = _empty_result(url)
+    result.update(map_product_details(payload))
+    result.update(codes_from_url(url, 'takealot'))
+
+    if any(result.get(field) in (None, "", "N/A") for field in HTTP_REQUIRED_FIELDS):
+        return None
+
+    if result["Seller"] in (None, "N/A"):
+        # As _finish_takealot does when the page names no seller
+        result["Seller"] = "Takealot"
+    result["RSP"] = clean_price(result["RSP"])
+    result["Original Price"] = clean_price(result["Original Price"])
+    result["Other Price"] = clean_price(result["Other Price"])
+    result["Source"] = "Takealot API"
+    return result
+
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'locale': 'en-ZA',
+    'timezone_id': 'Africa/Johannesburg',
+}
+
+def new_browser_manager(ws_endpoint=None):
+    """A BrowserManager that launches (or, with ws_endpoint, connects to) Chromium set up like the scraper expects"""
+    return BrowserManager(lambda: async_playwright(), BROWSER_ARGS, CONTEXT_OPTIONS, STEALTH_SCRIPT, ws_endpoint)
+
+_shared_browsers = None
+_shared_browsers_lock = threading.Lock()
+
+def shared_browser_manager():
+    """The process-wide warm browser behind the synchronous API (scrape_products_iter, scrape_product...).
+
+    Launched on first use and closed at interpreter exit. Set PLAYWRIGHT_WS_ENDPOINT to connect to
+    a running Playwright browser server instead, sharing one browser between processes.
+    """
+    global _shared_browsers
+    with _shared_browsers_lock:
+        if _shared_browsers is None:
+            _shared_browsers = new_browser_manager(os.environ.get("PLAYWRIGHT_WS_ENDPOINT")).register_shutdown()
+        return _shared_browsers
+
+class _TabPool:
+    """Hands a batch tabs of one warm context.
+
+    With a shared BrowserManager the browser, context and idle tabs outlive the batch; without one
+    the batch gets a private manager, launched on first use and closed with the pool.
+    """
+
+    def __init__(self, user_agent, resource_policy=None, browsers=None, metrics=None):
+        self.user_agent = user_agent
+        self.resource_policy = resource_policy
+        # The batch's registry, which its tabs' browser traffic is counted in
+        self.metrics = metrics
+        self._owns_browsers = browsers is None
+        self._browsers = browsers or new_browser_manager()
+        self._contexts = {}
+
+    async def acquire(self):
+        warm = await self._browsers.context(self.user_agent, self.resource_policy)
+        page = await warm.acquire(self.metrics)
+        self._contexts[page] = warm
+        return page
+
+    def blocker_for(self, page):
+        warm = self._contexts.get(page)
+        return warm.blocker if warm else None
+
+    async def release(self, page):
+        warm = self._contexts.pop(page, None)
+        if warm is not None:
+            await warm.release(page)
+
+    async def close(self):
+        if self._owns_browsers:
+            await self._browsers.close()
+
+def _open_cache(cache):
+    """cache may be a ResultCache, a path to one, or None/False for no caching.
+    Returns (cache, owned) where owned means we opened it and must close it."""
+    if isinstance(cache, ResultCache):
+        return cache, False
+    if not cache:
+        return None, False
+    return ResultCache(cache), True
+
+async def scrape_products_iter_async(urls, progress_callback=None, concurrency=1, resource_policy=None,
+                                     http_first=True, cache=None, max_age=None, force_refresh=False,
+                                     journal=None, resume=False, browsers=None, rate_limiter=None,
+                                     retry_policy=None, stage_columns=False, run_log=None, metrics=None,
+                                     history=None):
+    """Scrape a list of URLs on the asyncio event loop, yielding (index, result) as each row finishes.
+
+    Rows come out in completion order, not input order; index is the row's position in urls.
+
+    At most `concurrency` URLs are in flight at once, each on its own tab of a single Chromium.
+    progress_callback(completed, url) may be a plain function or a coroutine function.
+    resource_policy decides which requests (images, fonts, trackers...) are aborted;
+    None uses the default ResourcePolicy() and False loads every page in full.
+    http_first tries a plain HTTP GET (the product-details API for Takealot) before the browser;
+    the 'Source' column says which tier served each row.
+    cache (a ResultCache or a path to one) serves rows scraped within their TTL, or within
+    max_age seconds if that is shorter; force_refresh scrapes everything but still refreshes the cache.
+    Cached rows keep their original 'Last Checked' time and have 'From Cache' set.
+    URLs naming the same product (see canonical.canonical_url) are scraped once and the
+    result is copied to each of their rows.
+    journal (a journal.RunJournal) records every finished product as it completes; with resume,
+    products the journal already holds without an error are not scraped again.
+    browsers is a BrowserManager whose warm browser the batch borrows (it must belong to this
+    event loop); None launches a private browser for this batch only.
+    Products are started round-robin across retailers, and each retailer has an adaptive token
+    bucket (rate_limiter, default the process-wide shared_rate_limiter(); False disables) that
+    slows down on block pages or 429/503 answers and speeds back up while responses are clean.
+    Failures are classified ('Error Class': timeout, navigation, blocked, parse_miss, invalid_url,
+    other) and retried per retry_policy (default RetryPolicy(); retries.NO_RETRIES disables) with
+    exponential backoff and jitter; 'Attempts' reports how many tries each row took.
+    Wall time is recorded per stage of every scrape (see stage_timing.STAGES): stage_columns adds
+    it to each row as 'Stage ... (s)' columns, run_log (a stage_timing.RunLog or a path) gets one
+    JSON line per product, and a percentile table per retailer and stage is printed at the end.
+    metrics (a metrics.MetricsRegistry, default the process-wide shared_metrics(); False disables)
+    is fed live: finished and in-flight products, responses and block pages, retries, bytes and
+    rate-limit rates per retailer, for metrics.serve_metrics() or a dashboard to read mid-run.
+    history (a price_history.PriceHistory or a path) gets every freshly scraped row without an
+    error, under a run of its own; its changes() then lists what moved since the previous run.
+    """
+    urls = list(urls)
+    
+    # Check if any URL is Makro to decide on the global UserAgent strategy
+    # Makro is stricter, so if we have Makro links, we might want to use the specific UA for everything 
+    # or switch contexts. For simplicity in batching, let's use the Makro-friendly UA for all if any Makro exists,
+    # as it mimics a real Windows/Chrome user which is generally good for others too.
+    has_makro = any('makro' in str(u).lower() for u in urls)
+    
+    final_ua = DEFAULT_USER_AGENT
+    if not has_makro:
+        final_ua = _process_user_agent()
+
+    # Each product is scraped once, however many rows (or URL spellings) name it
+    groups = group_by_product(urls)
+    if len(groups) < len(urls):
+        print(f"{len(urls)} rows name {len(groups)} distinct products")
+
+    concurrency = max(1, min(int(concurrency or 1), len(groups) or 1))
     
+    # The semaphore bounds how many URLs are in flight; browser work borrows a tab from the pool
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = shared_rate_limiter() if rate_limiter is None else (rate_limiter or None)
+    retry_policy = retry_policy or RetryPolicy()
+    metrics = shared_metrics() if metrics is None else (metrics or MetricsRegistry())
+    tabs = _TabPool(final_ua, resource_policy, browsers, metrics)
+    # Counts every response (and its bytes) before the limiter hears about it
+    meter = ResponseMeter(metrics, limiter)
+    sessions = SessionPool(final_ua, pool_size=concurrency, observer=meter.report, byte_counter=meter.http_bytes)
+    cache, owns_cache = _open_cache(cache)
+    run_log, owns_run_log = open_run_log(run_log)
+    history, owns_history = open_history(history)
+    run_id = history.start_run() if history is not None else None
+    stage_stats = StageStats()
+    completed = 0
+    finished_rows = asyncio.Queue()
+
+    # Rows an interrupted run already finished cleanly; rows that ended in an error are tried again
+    finished = {}
+    if journal is not None and resume:
+        finished = {key: row for key, row in journal.load().items() if row.get("Error") == "None"}
+        done = sum(len(indexes) for key, indexes in groups.items() if key in finished)
+        if done:
+            print(f"Resuming: {done} of {len(urls)} rows already finished")
+
+    async def fan_out(indexes, result):
+        # Every row that names the same product gets the result, under its own Link
+        nonlocal completed
+        for n, j in enumerate(indexes):
+            finished_rows.put_nowait((j, result if n == 0 else dict(result, Link=urls[j])))
+            completed += 1
+            await _notify(progress_callback, completed, urls[j])
+
+    async def scrape_once(url, timer):
+        if not is_valid_url(url):
+            return await _scrape_url(None, url)
+        if http_first:
+            # Takealot pages are client-rendered, so its HTML never carries the data; use the API instead
+            if site_for(url) == 'takealot':
+                result = await asyncio.to_thread(scrape_via_takealot_api, sessions, url, None, timer)
+            else:
+                result = await asyncio.to_thread(scrape_via_http, sessions, url, timer)
+            if result:
+                print(f"  > Scraped via {result['Source']}: {result['Description'][:30]}... | Price: {result['RSP']}")
+                return result
+        with timer.stage('tab_acquire'):
+            page = await tabs.acquire()
+        try:
+            return await _scrape_url(page, url, tabs.blocker_for(page), meter, timer)
+        finally:
+            await tabs.release(page)
+
+    def log_row(url, result, timer=None, source=None):
+        # Cached and resumed rows have no stages of their own, but get the columns for a uniform sheet
+        stages = timer.stages if timer else {}
+        domain = domain_of(url) if is_valid_url(url) else 'invalid'
+        metrics.page_finished(domain, source or result.get('Source') or 'None',
+                              'ok' if result.get('Error Class') in (None, 'None') else result['Error Class'])
+        if stages:
+            stage_stats.add(domain, stages)
+        if stage_columns:
+            result.update((timer or StageTimer()).columns())
+        if run_log is not None:
+            run_log.record(url, domain, result, stages)
+
+    async def run_one(key, indexes):
+        i = indexes[0]
+        url = urls[i]
+        if key in finished:
+            print(f"Resumed ({i+1}/{len(urls)}): {url} (already in the journal)")
+            resumed = dict(finished[key], Link=url)
+            log_row(url, resumed, source='Journal')
+            await fan_out(indexes, resumed)
+            return
+
+        cached = None
+        if cache is not None and not force_refresh and is_valid_url(url):
+            cached = cache.get(url, max_age)
+        if cached is not None:
+            cached["From Cache"] = True
+            print(f"Cached ({i+1}/{len(urls)}): {url} (checked {cached.get('Last Checked')})")
+            if journal is not None:
+                journal.record(url, cached)
+            log_row(url, cached, source='Cache')
+            await fan_out(indexes, cached)
+            return
+
+        attempts = 0
+        busy = 0.0
+        timer = StageTimer()
+        domain = domain_of(url) if is_valid_url(url) else 'invalid'
+        while True:
+            # Wait for this retailer's token before taking a slot, so a throttled site never holds up the others
+            if limiter and is_valid_url(url):
+                with timer.stage('rate_wait'):
+                    await limiter.acquire(url)
+
+            waiting = time.perf_counter()
+            async with semaphore:
+                timer.add('slot_wait', time.perf_counter() - waiting)
+                attempts += 1
+                print(f"Scraping ({i+1}/{len(urls)}): {url}..." + (f" (attempt {attempts})" if attempts > 1 else ""))
+                started = time.perf_counter()
+                metrics.page_started(domain)
+                try:
+                    result = await scrape_once(url, timer)
+                finally:
+                    metrics.page_stopped(domain)
+                busy += time.perf_counter() - started
+
+            error_class = classify_result(result)
+            if not retry_policy.should_retry(error_class, attempts):
+                break
+            # Deferred retry: sleep without holding a slot or a token, so other products carry on meanwhile
+            delay = retry_policy.delay(error_class, attempts)
+            print(f"  Retrying {url} in {delay:.1f}s ({error_class}: {result['Error']})")
+            metrics.retry(domain, error_class)
+            with timer.stage('retry_backoff'):
+                await asyncio.sleep(delay)
+
+        result["Error Class"] = error_class or "None"
+        result["Attempts"] = attempts
+        # Time spent scraping, across attempts; rate-limit waits and retry back-offs are not counted
+        result["Scrape Time (s)"] = round(busy, 2)
+        result["Last Checked"] = datetime.now().strftime(LAST_CHECKED_FORMAT)
+        if cache is not None and is_valid_url(url):
+            cache.put(url, result)
+        log_row(url, result, timer)
+        if journal is not None:
+            journal.record(url, result)
+        if history is not None and is_valid_url(url):
+            history.record(url, result, run_id)
+        await fan_out(indexes, result)
+
+    # Rows are queued by fan_out as they finish; None marks that every product is done (or one failed)
+    order = interleave_by_domain(groups.items(), lambda group: urls[group[1][0]])
+    tasks = [asyncio.ensure_future(run_one(key, indexes)) for key, indexes in order]
+    workers = asyncio.gather(*tasks)
+    workers.add_done_callback(lambda _: finished_rows.put_nowait(None))
+    try:
+        while True:
+            row = await finished_rows.get()
+            if row is None:
+                break
+            yield row
+        # Surface an unexpected failure rather than silently yielding fewer rows
+        workers.result()
+    finally:
+        # The consumer may stop early, or one product may have failed while the others still run
+        # (gather does not cancel them); cancel and await every unfinished task before closing anything
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await tabs.close()
+        sessions.close()
+        if owns_cache:
+            cache.close()
+        if journal is not None:
+            journal.close()
+        if stage_stats.summary():
+            print("--- Stage timings (s) ---\n" + stage_stats.format())
+        if run_log is not None:
+            run_log.summary(stage_stats)
+            if owns_run_log:
+                run_log.close()
+        if owns_history:
+            history.close()
+
+async def scrape_products_batch_async(urls, progress_callback=None, concurrency=1, resource_policy=None,
+                                      http_first=True, cache=None, max_age=None, force_refresh=False,
+                                      journal=None, resume=False, rate_limiter=None, retry_policy=None,
+                                      stage_columns=False, run_log=None, metrics=None, history=None,
+                                      browsers=None):
+    """Scrape a list of URLs on the asyncio event loop, returning results in input order.
+
+    Collects from scrape_products_iter_async, which documents the options; browsers is a
+    BrowserManager of this event loop to borrow a warm browser from (None: a private one).
+    """
+    urls = list(urls)
+    results = [None] * len(urls)
+    rows = scrape_products_iter_async(urls, progress_callback, concurrency, resource_policy, http_first,
+                                      cache, max_age, force_refresh, journal, resume, browsers, rate_limiter,
+                                      retry_policy, stage_columns, run_log, metrics, history)
+    async for i, result in rows:
+        results[i] = result
+    return results
+
+async def scrape_product_async(url):
+    """Async single-URL lookup"""
+    results = await scrape_products_batch_async([url])
+    return results[0]
+
+def scrape_products_iter(urls, progress_callback=None, concurrency=1, resource_policy=None, http_first=True,
+                         cache=None, max_age=None, force_refresh=False, journal=None, resume=False,
+                         rate_limiter=None, retry_policy=None, stage_columns=False, run_log=None, metrics=None,
+                         history=None):
+    """Scrape a list of URLs from synchronous code, yielding (index, result) as each row finishes.
+
+    The work runs on the loop thread of shared_browser_manager(), so this works whether or not the
+    caller's thread already has a running loop (Jupyter, async frameworks), and every call reuses
+    the same warm browser instead of launching Chromium. Rows come out in completion order;
+    stopping the iteration early cancels the remaining work (the shared browser stays warm).
+    progress_callback(completed, url) is called on the caller's thread, just before each row is yielded.
+    See scrape_products_iter_async for the other options.
+    """
+    urls = list(urls)
+    rows = queue.Queue()
+    done = object()
+    stopped = threading.Event()
+    browsers = shared_browser_manager()
+
+    async def pump():
+        # Runs on the shared manager's loop, so the batch borrows its warm browser
+        agen = scrape_products_iter_async(urls, None, concurrency, resource_policy, http_first,
+                                          cache, max_age, force_refresh, journal, resume, browsers, rate_limiter,
+                                          retry_policy, stage_columns, run_log, metrics, history)
+        try:
+            async for row in agen:
+                rows.put(row)
+        finally:
+            await agen.aclose()
+            stopped.set()
+
+    future = browsers.submit(pump())
+    future.add_done_callback(lambda _: rows.put(done))
+    completed = 0
+    try:
+        while True:
+            row = rows.get()
+            if row is done:
+                break
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, urls[row[0]])
+            yield row
+        # Re-raise whatever stopped the batch early
+        future.result()
+    finally:
+        if not future.done():
+            future.cancel()
+            stopped.wait()
+
+def scrape_products_batch(urls, progress_callback=None, concurrency=1, resource_policy=None, http_first=True,
+                          cache=None, max_age=None, force_refresh=False, journal=None, resume=False,
+                          rate_limiter=None, retry_policy=None, stage_columns=False, run_log=None, metrics=None,
+                          history=None):
+    """Scrape a list of URLs, returning one result dict per URL in input order.
+
+    Collects from scrape_products_iter; shared by the CLI, Tk and Streamlit front ends.
+    concurrency sets how many tabs of the single Chromium work in parallel.
+    progress_callback(completed, url) fires as each URL finishes.
+    See scrape_products_iter_async for resource_policy, http_first, the cache options, journal/resume,
+    rate_limiter, retry_policy, stage_columns, run_log, metrics and history.
+    """
+    urls = list(urls)
+    results = [None] * len(urls)
+    for i, result in scrape_products_iter(urls, progress_callback, concurrency, resource_policy, http_first,
+                                          cache, max_age, force_refresh, journal, resume, rate_limiter, retry_policy,
+                                          stage_columns, run_log, metrics, history):
+        results[i] = result
     return results
 
 def scrape_product(url):
     """Wrapper for backward compatibility"""
     results = scrape_products_batch([url])
-    return results[0]
\ No newline at end of file
+    return results[0]
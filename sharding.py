@@ -0,0 +1,277 @@
+import multiprocessing
+import os
+import queue
+import traceback
+from datetime import datetime
+
+from canonical import group_by_product
+from network_tape import active_tape
+from rate_limit import DomainRateLimiter, domain_of
+from result_cache import ResultCache, LAST_CHECKED_FORMAT
+from stage_timing import StageStats, open_run_log, stages_from_columns
+from metrics import MetricsRegistry, shared_metrics, delta
+from price_history import open_history
+from retries import OTHER
+import scraper
+
+# Rough seconds per product by retailer, used to balance shards. Takealot is mostly answered by the
+# product-details API; Makro needs the browser and waits out its anti-bot checks.
+EXPECTED_LATENCY = {
+    'takealot': 1.0,
+    'amazon': 6.0,
+    'makro': 10.0,
+    None: 4.0,
+}
+
+# How often the parent checks that its workers are still alive while waiting for rows
+_POLL_SECONDS = 1.0
+
+def expected_latency(url, latency=EXPECTED_LATENCY):
+    return latency.get(scraper.site_for(url), latency[None])
+
+def plan_shards(urls, shards, latency=EXPECTED_LATENCY):
+    """Split URLs into at most `shards` lists of input indexes, balanced by retailer and expected latency.
+
+    Rows naming the same product stay together (only the first is scraped; see scrape_products_sharded).
+    Each retailer's products are dealt across shards so every shard gets an even share of every site
+    (and so of every rate limit), most expensive retailer first, each product going to the least loaded
+    of the shards holding the fewest of its site. Returns [[index, ...], ...], empty shards dropped.
+    """
+    urls = list(urls)
+    shards = max(1, int(shards or 1))
+    by_domain = {}
+    for indexes in group_by_product(urls).values():
+        by_domain.setdefault(domain_of(urls[indexes[0]]), []).append(indexes[0])
+
+    plan = [[] for _ in range(shards)]
+    load = [0.0] * shards
+    cost = lambda indexes: sum(expected_latency(urls[i], latency) for i in indexes)
+    for indexes in sorted(by_domain.values(), key=cost, reverse=True):
+        count = [0] * shards
+        for i in indexes:
+            target = min(range(shards), key=lambda s: (count[s], load[s]))
+            plan[target].append(i)
+            count[target] += 1
+            load[target] += expected_latency(urls[i], latency)
+    return [sorted(shard) for shard in plan if shard]
+
+def _shard_rates(rate_limiter, processes):
+    # Every worker gets an equal slice of each site's budget, so N processes together stay within it.
+    # Limiters hold locks and cannot be pickled; workers rebuild one from these arguments.
+    if rate_limiter is False:
+        return False
+    base = rate_limiter if isinstance(rate_limiter, DomainRateLimiter) else DomainRateLimiter()
+    return (base.default_rate / processes,
+            {domain: rate / processes for domain, rate in base.domain_rates.items()},
+            base.burst)
+
+def _run_shard(shard, urls, options, rates, feed):
+    """Worker process: scrape one shard on its own browser, streaming rows back to the parent"""
+    try:
+        limiter = DomainRateLimiter(*rates) if rates else False
+        # The worker's metrics go to the parent as changes, alongside each row
+        metrics = shared_metrics()
+        sent = {}
+
+        def send_metrics():
+            nonlocal sent
+            current = metrics.values()
+            feed.put(('metrics', shard, None, delta(current, sent)))
+            sent = current
+
+        for i, result in scraper.scrape_products_iter(urls, rate_limiter=limiter, metrics=metrics, **options):
+            send_metrics()
+            feed.put(('row', shard, i, result))
+        send_metrics()
+        feed.put(('done', shard, None, None))
+    except BaseException:
+        feed.put(('failed', shard, None, traceback.format_exc()))
+    finally:
+        # multiprocessing skips atexit handlers in workers, so close the browser (and save a recording) here
+        scraper.shared_browser_manager().shutdown()
+        tape = active_tape()
+        if tape is not None:
+            tape.close()
+
+def _worker_failed_result(url, reason):
+    result = scraper._empty_result(url)
+    result["Error"] = f"Worker process failed: {reason}"
+    result["Error Class"] = OTHER
+    result["Last Checked"] = datetime.now().strftime(LAST_CHECKED_FORMAT)
+    return result
+
+def scrape_products_sharded_iter(urls, processes=None, progress_callback=None, concurrency=1,
+                                 resource_policy=None, http_first=True, cache=None, max_age=None,
+                                 force_refresh=False, journal=None, resume=False, rate_limiter=None,
+                                 retry_policy=None, stage_columns=False, run_log=None, metrics=None,
+                                 history=None, latency=EXPECTED_LATENCY):
+    """Scrape a list of URLs across several worker processes, yielding (index, result) as rows finish.
+
+    One process drives one event loop under one GIL; for very large lists this runs `processes`
+    workers (default: one per CPU), each with its own Chromium and `concurrency` tabs, on shards
+    from plan_shards(). Workers are started with the 'spawn' method and stream rows back over a
+    multiprocessing queue, so no broker is needed; callers must keep the usual
+    `if __name__ == '__main__':` guard around the call.
+
+    Runs in the parent: deduplication, progress_callback(completed, url), the journal (one writer,
+    so journal/resume behave exactly as in scrape_products_iter), the price history (one run for
+    the whole batch), the run log, with a stage timing summary over all workers, and metrics (see
+    scrape_products_iter_async), which the workers' own registries are merged into as their rows
+    arrive. Workers open the cache themselves, so it is passed on as a path (a ResultCache's
+    path is used). rate_limiter (None: the defaults, False: none, or a DomainRateLimiter whose
+    rates are used) is divided evenly between the workers.
+    A worker that dies leaves its unfinished rows with an Error and 'Error Class' other.
+    See scrape_products_iter_async for the remaining options.
+    """
+    urls = list(urls)
+    groups = group_by_product(urls)
+    members = {indexes[0]: indexes for indexes in groups.values()}
+    completed = 0
+    run_log, owns_run_log = open_run_log(run_log)
+    stage_stats = StageStats()
+    metrics = shared_metrics() if metrics is None else (metrics or MetricsRegistry())
+    history, owns_history = open_history(history)
+    run_id = history.start_run() if history is not None else None
+
+    def record(first, result):
+        # Workers send their stage times as columns whenever the parent keeps a run log
+        url = urls[first]
+        if run_log is not None:
+            stages = stages_from_columns(result)
+            domain = domain_of(url) if scraper.is_valid_url(url) else 'invalid'
+            if stages and not result.get('From Cache'):
+                stage_stats.add(domain, stages)
+            run_log.record(url, domain, result, stages)
+            if not stage_columns:
+                for column in [c for c in result if c.startswith('Stage ')]:
+                    del result[column]
+        if journal is not None:
+            journal.record(url, result)
+        if history is not None and scraper.is_valid_url(url):
+            history.record(url, result, run_id)
+
+    def fan_out(first, result):
+        nonlocal completed
+        for n, j in enumerate(members[first]):
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, urls[j])
+            yield j, (result if n == 0 else dict(result, Link=urls[j]))
+
+    finished = {}
+    if journal is not None and resume:
+        finished = {key: row for key, row in journal.load().items() if row.get("Error") == "None"}
+    pending = []
+    for key, indexes in groups.items():
+        if key in finished:
+            resumed = dict(finished[key], Link=urls[indexes[0]])
+            metrics.page_finished(domain_of(urls[indexes[0]]), 'Journal', 'ok')
+            if run_log is not None:
+                run_log.record(urls[indexes[0]], domain_of(urls[indexes[0]]), resumed, {})
+            yield from fan_out(indexes[0], resumed)
+        else:
+            pending.append(indexes[0])
+    if not pending:
+        if journal is not None:
+            journal.close()
+        if owns_run_log:
+            run_log.close()
+        if owns_history:
+            history.close()
+        return
+
+    processes = max(1, min(int(processes or os.cpu_count() or 1), len(pending)))
+    shards = [[pending[i] for i in shard] for shard in plan_shards([urls[i] for i in pending], processes, latency)]
+    print(f"Scraping {len(pending)} products in {len(shards)} processes: {', '.join(str(len(s)) for s in shards)} per shard")
+
+    options = {
+        'concurrency': concurrency,
+        'resource_policy': resource_policy,
+        'http_first': http_first,
+        'cache': cache.path if isinstance(cache, ResultCache) else cache,
+        'max_age': max_age,
+        'force_refresh': force_refresh,
+        'retry_policy': retry_policy,
+        'stage_columns': stage_columns or run_log is not None,
+    }
+    context = multiprocessing.get_context('spawn')
+    feed = context.Queue()
+    rates = _shard_rates(rate_limiter, len(shards))
+    workers = [context.Process(target=_run_shard, args=(n, [urls[i] for i in shard], options, rates, feed),
+                               name=f"price-shard-{n}", daemon=True)
+               for n, shard in enumerate(shards)]
+    remaining = [set(range(len(shard))) for shard in shards]
+    running = set(range(len(shards)))
+
+    def abandon(shard, reason):
+        # Rows the worker never sent back still get a result, so the output keeps every row
+        print(f"Shard {shard} failed: {reason}")
+        running.discard(shard)
+        for i in sorted(remaining[shard]):
+            first = shards[shard][i]
+            result = _worker_failed_result(urls[first], reason.strip().splitlines()[-1])
+            metrics.page_finished(domain_of(urls[first]) if scraper.is_valid_url(urls[first]) else 'invalid', 'None', OTHER)
+            record(first, result)
+            yield from fan_out(first, result)
+        remaining[shard].clear()
+
+    try:
+        for worker in workers:
+            worker.start()
+        while running:
+            try:
+                kind, shard, i, payload = feed.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                for shard in list(running):
+                    if not workers[shard].is_alive():
+                        yield from abandon(shard, f"exited with code {workers[shard].exitcode}")
+                continue
+            if kind == 'row':
+                remaining[shard].discard(i)
+                first = shards[shard][i]
+                record(first, payload)
+                yield from fan_out(first, payload)
+            elif kind == 'metrics':
+                metrics.merge(payload)
+            elif kind == 'done':
+                running.discard(shard)
+            else:
+                yield from abandon(shard, payload)
+    finally:
+        # Finished workers are closing their browsers; stop any still scraping (the consumer may stop early)
+        for shard, worker in enumerate(workers):
+            if worker.pid is None:
+                continue
+            if shard not in running:
+                worker.join(30)
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        feed.close()
+        if journal is not None:
+            journal.close()
+        if run_log is not None:
+            if stage_stats.summary():
+                print("--- Stage timings, all workers (s) ---\n" + stage_stats.format())
+            run_log.summary(stage_stats)
+            if owns_run_log:
+                run_log.close()
+        if owns_history:
+            history.close()
+
+def scrape_products_sharded(urls, processes=None, progress_callback=None, concurrency=1, resource_policy=None,
+                            http_first=True, cache=None, max_age=None, force_refresh=False, journal=None,
+                            resume=False, rate_limiter=None, retry_policy=None, stage_columns=False, run_log=None,
+                            metrics=None, history=None, latency=EXPECTED_LATENCY):
+    """Multi-process scrape_products_batch: one result dict per URL, in input order.
+
+    Collects from scrape_products_sharded_iter, which documents the options.
+    """
+    urls = list(urls)
+    results = [None] * len(urls)
+    for i, result in scrape_products_sharded_iter(urls, processes, progress_callback, concurrency,
+                                                  resource_policy, http_first, cache, max_age, force_refresh,
+                                                  journal, resume, rate_limiter, retry_policy, stage_columns,
+                                                  run_log, metrics, history, latency):
+        results[i] = result
+    return results
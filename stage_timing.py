@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# --- Per-URL stage timing ---
+# Wall time per stage of one product's scrape, summed over its attempts. Stages never overlap,
+# so they add up to (roughly) the row's 'Scrape Time (s)' plus the waits before each attempt.
+STAGES = (
+    'rate_wait',      # waiting for the retailer's rate-limit token
+    'slot_wait',      # waiting for one of the batch's `concurrency` slots
+    'retry_backoff',  # sleeping before a retry
+    'http_fetch',     # HTTP tier GET
+    'http_parse',     # HTTP tier JSON-LD / __NEXT_DATA__ / meta parsing
+    'api_fetch',      # Takealot product-details request
+    'api_parse',
+    'tab_acquire',    # borrowing a tab (launches the browser on first use)
+    'goto',           # page.goto until domcontentloaded
+    'antibot_wait',   # Makro "are you human" interstitial
+    'ready_wait',     # retailer readiness condition
+    'lazy_wait',      # Takealot scroll for reviews and shipping info
+    'evaluate',       # in-page extraction plan, text heuristics included
+    'jsonld',         # JSON-LD parsing of the page's scripts
+    'site_rules',     # retailer finishers and price cleanup
+)
+STAGE_LABELS = {stage: stage.replace('_', ' ').title().replace('Http', 'HTTP').replace('Api', 'API').replace('Jsonld', 'JSON-LD')
+                for stage in STAGES}
+
+def stage_column(stage):
+    return f"Stage {STAGE_LABELS[stage]} (s)"
+
+class StageTimer:
+    """Accumulates wall time per stage for one URL"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def columns(self):
+        """Every stage as a result column ('Stage Goto (s)'), zero when the stage did not run"""
+        return {stage_column(stage): round(self.stages.get(stage, 0.0), 3) for stage in STAGES}
+
+def stages_from_columns(result):
+    """The stage times back out of a row carrying StageTimer.columns()"""
+    return {stage: result[stage_column(stage)] for stage in STAGES if result.get(stage_column(stage))}
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+class StageStats:
+    """Stage times of a batch per retailer domain, summarised as percentiles at the end"""
+
+    def __init__(self):
+        self._times = {}
+        self._lock = threading.Lock()
+
+    def add(self, domain, stages):
+        with self._lock:
+            by_stage = self._times.setdefault(domain, {})
+            for stage, seconds in stages.items():
+                by_stage.setdefault(stage, []).append(seconds)
+
+    def summary(self):
+        """{domain: {stage: {'count', 'p50', 'p90', 'p99', 'max', 'total'}}} in seconds"""
+        out = {}
+        with self._lock:
+            for domain, by_stage in self._times.items():
+                out[domain] = {}
+                for stage in STAGES:
+                    times = sorted(by_stage.get(stage, ()))
+                    if times:
+                        out[domain][stage] = {
+                            'count': len(times),
+                            'p50': round(percentile(times, 0.5), 3),
+                            'p90': round(percentile(times, 0.9), 3),
+                            'p99': round(percentile(times, 0.99), 3),
+                            'max': round(times[-1], 3),
+                            'total': round(sum(times), 3),
+                        }
+        return out
+
+    def format(self):
+        lines = [f"{'retailer':<18}{'stage':<15}{'n':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"]
+        for domain, by_stage in self.summary().items():
+            for stage, s in by_stage.items():
+                lines.append(f"{domain:<18}{stage:<15}{s['count']:>6}{s['p50']:>9.3f}{s['p90']:>9.3f}{s['p99']:>9.3f}{s['max']:>9.3f}")
+        return '\n'.join(lines)
+
+class RunLog:
+    """JSON-lines log of a batch: one line per finished product, then a summary line.
+
+    Lines are appended and flushed as products finish, so a log can be tailed during a run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _write(self, entry):
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def record(self, url, domain, result, stages):
+        self._write({
+            'event': 'row',
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'url': url,
+            'domain': domain,
+            'source': result.get('Source'),
+            'error_class': result.get('Error Class'),
+            'attempts': result.get('Attempts'),
+            'from_cache': bool(result.get('From Cache')),
+            'scrape_time': result.get('Scrape Time (s)'),
+            'stages': {stage: round(seconds, 4) for stage, seconds in stages.items()},
+        })
+
+    def summary(self, stats):
+        self._write({'event': 'summary', 'time': datetime.now().isoformat(timespec='milliseconds'),
+                     'stages': stats.summary()})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def open_run_log(run_log):
+    """run_log may be a RunLog, a path, or None. Returns (log, owned)."""
+    if run_log is None or isinstance(run_log, RunLog):
+        return run_log, False
+    return RunLog(run_log), True
@@ -0,0 +1,111 @@
+import os
+import re
+
+# Product-details endpoint the Takealot PDP itself calls. Point TAKEALOT_API_BASE at a local
+# stand-in server (see verify_takealot_api.py) to replay recorded payloads.
+TAKEALOT_API_BASE = os.environ.get("TAKEALOT_API_BASE", "https://api.takealot.com/rest/v-1-12-0/product-details")
+
+# distribution_centres ids/text -> the Province codes the HTML path produces
+PROVINCE_CODES = {
+    'dbn': "DBN", 'durban': "DBN",
+    'jhb': "JHB", 'johannesburg': "JHB",
+    'cpt': "CPT", 'cape town': "CPT",
+}
+
+def plid_from_url(url):
+    """Takealot URLs end in the PLID, whatever the slug in front of it"""
+    match = re.search(r'(PLID\d+)', str(url), re.IGNORECASE)
+    return match.group(1).upper() if match else None
+
+def product_details_url(plid, base=None):
+    return f"{(base or TAKEALOT_API_BASE).rstrip('/')}/{plid}?platform=desktop&display_credit=false"
+
+def fetch_product_details(sessions, plid, base=None, product_url=None):
+    """GET the product-details payload through the pooled sessions. Returns the parsed JSON or None.
+    The response is reported as product_url's (see SessionPool.get), so it paces takealot.com,
+    not api.takealot.com."""
+    import requests  # already loaded by the session pool
+    try:
+        response = sessions.get(product_details_url(plid, base), headers={'Accept': 'application/json'},
+                                report_as=product_url)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+def _first(*values):
+    for value in values:
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+def _seller_name(seller):
+    if isinstance(seller, dict):
+        return _first(seller.get('display_name'), seller.get('name'))
+    return seller or None
+
+def map_product_details(payload):
+    """Map a product-details payload onto our result fields"""
+    extracted = {}
+    if not isinstance(payload, dict):
+        return extracted
+
+    core = payload.get('core') or {}
+    buybox = payload.get('buybox') or {}
+    stock = payload.get('stock_availability') or {}
+    reviews = payload.get('reviews') or {}
+
+    title = _first(payload.get('title'), core.get('title'))
+    if title: extracted['Description'] = title
+
+    prices = buybox.get('prices') or []
+    price = _first(prices[0] if prices else None, buybox.get('price'), buybox.get('pretty_price'))
+    if price is not None: extracted['RSP'] = str(price)
+
+    list_price = _first(buybox.get('listing_price'), buybox.get('pretty_listing_price'), buybox.get('old_price'))
+    if list_price is not None and str(list_price) != str(price):
+        extracted['Original Price'] = str(list_price)
+
+    seller = _first(_seller_name(buybox.get('seller')), _seller_name(payload.get('seller_detail')),
+                    _seller_name(payload.get('sold_by')))
+    if seller: extracted['Seller'] = seller
+
+    status = stock.get('status')
+    if status: extracted['Stock Availability'] = status
+
+    found_locs = []
+    for centre in stock.get('distribution_centres') or []:
+        if not isinstance(centre, dict):
+            continue
+        for key in ('id', 'text', 'description'):
+            value = str(centre.get(key) or '').lower()
+            code = next((c for name, c in PROVINCE_CODES.items() if name in value), None)
+            if code:
+                if code not in found_locs: found_locs.append(code)
+                break
+    if found_locs:
+        extracted['Province'] = ", ".join(found_locs)
+
+    rating = _first(reviews.get('star_rating'), core.get('star_rating'))
+    if rating is not None: extracted['Rating'] = str(rating)
+    count = _first(reviews.get('count'), core.get('reviews'))
+    if count is not None: extracted['Review Count'] = str(count)
+
+    # Other offers are grouped by condition; the first one not from the buybox seller wins
+    other_offers = payload.get('other_offers') or {}
+    for condition in other_offers.get('conditions') or []:
+        for item in condition.get('items') or []:
+            other_seller = _seller_name(item.get('seller'))
+            other_price = _first(item.get('price'), item.get('pretty_price'))
+            if other_seller and other_seller != seller and other_price is not None:
+                extracted['Other Seller'] = other_seller
+                extracted['Other Price'] = str(other_price)
+                break
+        if 'Other Seller' in extracted:
+            break
+
+    return extracted
@@ -0,0 +1,93 @@
+from io import BytesIO
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from canonical import canonical_url, group_by_product
+from workbook import merge_results, export_results
+
+# Which rows share a scraped result is decided here, so the rules are checked offline.
+
+def same_key(*urls):
+    keys = {canonical_url(u) for u in urls}
+    assert len(keys) == 1, keys
+    return keys.pop()
+
+# Takealot: the slug and the query never change the product, the PLID does
+takealot = same_key(
+    "https://www.takealot.com/xiaomi-smart-air-purifier-4-compact-eu/PLID91193746",
+    "https://takealot.com/x/PLID91193746",
+    "https://www.takealot.com/xiaomi-smart-air-purifier-4-compact-eu/plid91193746/?gclid=abc&utm_source=mail",
+    "HTTPS://WWW.TAKEALOT.COM/another-slug/PLID91193746?colour=black#reviews",
+)
+print(f"Takealot: {takealot}")
+assert takealot == "https://takealot.com/PLID91193746"
+assert canonical_url("https://www.takealot.com/x/PLID91193747") != takealot
+
+# Amazon: title slugs, /gp/product and ref paths all name the same ASIN
+amazon = same_key(
+    "https://www.amazon.co.za/dp/B09MR14ZWT",
+    "https://www.amazon.co.za/Some-Product-Title/dp/B09MR14ZWT/ref=sr_1_1?keywords=vacuum",
+    "https://amazon.co.za/gp/product/b09mr14zwt?psc=1",
+    "https://www.amazon.co.za/dp/B09MR14ZWT/?tag=partner-21",
+)
+print(f"Amazon: {amazon}")
+assert amazon == "https://amazon.co.za/dp/B09MR14ZWT"
+
+# Tracking parameters go, meaningful ones stay (and are sorted)
+shop = "https://shop.example.com/item?size=42&colour=red"
+assert canonical_url(shop) == "https://shop.example.com/item?colour=red&size=42"
+assert canonical_url(shop + "&utm_campaign=x&gclid=1&fbclid=2&ref=home") == canonical_url(shop)
+assert canonical_url("https://shop.example.com/item?size=43&colour=red") != canonical_url(shop)
+assert canonical_url("https://shop.example.com/item/") == canonical_url("https://shop.example.com/item#top")
+
+# Makro: campaign and listing parameters go, the product path stays
+makro = same_key(
+    "https://www.makro.co.za/bosch-drill/p/itm123abc",
+    "https://www.makro.co.za/bosch-drill/p/itm123abc?pid=XYZ&lid=LST1&cmpid=mail&otracker=search",
+)
+assert canonical_url("https://www.makro.co.za/bosch-drill/p/itm123abc?variant=2") != makro
+
+# Anything that is not an http(s) URL comes back stripped but unchanged
+assert canonical_url("  not a url ") == "not a url"
+assert canonical_url(None) == "None"
+
+# Rows naming one product are grouped in first-seen order
+rows = [
+    "https://www.takealot.com/a/PLID91193746",
+    "https://www.amazon.co.za/dp/B09MR14ZWT",
+    "https://takealot.com/b/PLID91193746?gclid=1",
+    "https://www.amazon.co.za/Title/dp/B09MR14ZWT/ref=x",
+    "https://www.makro.co.za/bosch-drill/p/itm123abc",
+]
+groups = group_by_product(rows)
+print(f"Groups: {groups}")
+assert list(groups.values()) == [[0, 2], [1, 3], [4]]
+
+# One result per product is joined onto every row naming it; each row keeps its own Link
+results = [
+    {"Link": rows[2], "RSP": "1799", "Seller": "Takealot"},
+    {"Link": rows[1], "RSP": "2499", "Seller": "Amazon"},
+]
+df = pd.DataFrame({"URL": rows, "Note": list("abcde")})
+merged = merge_results(df, results)
+assert list(merged["Link"][:4]) == rows[:4]
+assert list(merged["RSP"][:4]) == ["1799", "2499", "1799", "2499"]
+assert pd.isna(merged["RSP"][4]) and pd.isna(merged["Link"][4])
+assert list(merge_results(df, results, only_matched=True)["Link"]) == rows[:4]
+
+# The streamed export joins the same way
+wb = Workbook()
+wb.active.append(["URL", "Note"])
+for url, note in zip(rows, "abcde"):
+    wb.active.append([url, note])
+source = BytesIO()
+wb.save(source)
+dest = BytesIO()
+export_results(source, results, dest)
+exported = list(load_workbook(dest).active.iter_rows(values_only=True))
+header = exported[0]
+links = [row[header.index("Link")] for row in exported[1:]]
+prices = [row[header.index("RSP")] for row in exported[1:]]
+assert links == rows[:4] + [None], links
+assert prices == ["1799", "2499", "1799", "2499", None], prices
+
+print("\nAll checks passed!")
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from journal import RunJournal
+
+# A journal of a run cut short is resumed against a stand-in for api.takealot.com that answers
+# every PLID with the recorded payload and counts which ones were asked for.
+PAYLOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "takealot", "PLID91193746.json")
+requests_seen = []
+
+class StandInHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        requests_seen.append(self.path.split('?')[0].rstrip('/').split('/')[-1])
+        with open(PAYLOAD, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+os.environ["TAKEALOT_API_BASE"] = f"http://127.0.0.1:{server.server_port}/rest/v-1-12-0/product-details"
+import scraper  # reads TAKEALOT_API_BASE
+
+urls = [f"https://www.takealot.com/product-{n}/PLID{n}" for n in range(1, 6)]
+# PLID1 again under another spelling, which shares its journal entry
+urls.append("https://takealot.com/other-slug/PLID1?gclid=abc")
+
+path = os.path.join(tempfile.mkdtemp(), "run.journal.jsonl")
+journal = RunJournal(path)
+journal.record(urls[0], {"Link": urls[0], "RSP": "100", "Error": "None"})
+journal.record(urls[1], {"Link": urls[1], "RSP": "N/A", "Error": "Timeout 60000ms exceeded."})
+journal.record(urls[2], {"Link": urls[2], "RSP": "N/A", "Error": "Price Not Found"})
+# The latest entry wins: PLID3 failed first, then finished cleanly
+journal.record(urls[2], {"Link": urls[2], "RSP": "300", "Error": "None"})
+journal.record(urls[3], {"Link": urls[3], "RSP": "400", "Error": "None"})
+# PLID4 then failed again; PLID5 never started
+journal.record(urls[3], {"Link": urls[3], "RSP": "N/A", "Error": "Blocked (HTTP 429)"})
+journal.close()
+# A crash cut the last line short; it is ignored on load
+with open(path, "a", encoding="utf-8") as f:
+    f.write('{"key": "https://takealot.com/PLID5", "res')
+
+finished = RunJournal(path).load()
+assert [finished[k]["Error"] for k in sorted(finished)] == ["None", "Timeout 60000ms exceeded.", "None",
+                                                             "Blocked (HTTP 429)"], finished
+assert "https://takealot.com/PLID5" not in finished
+
+options = dict(rate_limiter=False, metrics=False)
+results = scraper.scrape_products_batch(urls, journal=RunJournal(path), resume=True, **options)
+print(f"Scraped on resume: {sorted(requests_seen)}")
+# Only the rows journaled without an error are skipped; failed and missing ones are scraped again
+assert sorted(requests_seen) == ["PLID2", "PLID4", "PLID5"], requests_seen
+assert results[0]["RSP"] == "100" and results[2]["RSP"] == "300"
+assert [r["RSP"] for r in (results[1], results[3], results[4])] == ["1799"] * 3
+# Resumed rows fan out under each row's own Link
+assert results[5]["RSP"] == "100" and results[5]["Link"] == urls[5]
+assert all(r["Error"] == "None" for r in results)
+
+# The resumed run journaled what it scraped, so resuming again scrapes nothing
+requests_seen.clear()
+scraper.scrape_products_batch(urls, journal=RunJournal(path), resume=True, **options)
+assert requests_seen == [], requests_seen
+
+# Without resume the journal is not consulted
+scraper.scrape_products_batch(urls[:2], journal=RunJournal(path), **options)
+assert sorted(requests_seen) == ["PLID1", "PLID2"], requests_seen
+
+RunJournal(path).discard()
+assert not os.path.exists(path)
+server.shutdown()
+print("\nAll checks passed!")
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import time
+from price_history import PriceHistory, price_value
+
+# The change detection behind --changed-only, checked on a throwaway store.
+
+# Prices as the retailers write them
+assert price_value("5689,00") == 5689.0
+assert price_value("1,299") == 1299.0
+assert price_value("R 1 299.00") == 1299.0
+assert price_value("1,299.50") == 1299.5
+assert price_value("1,234,567") == 1234567.0
+assert price_value("N/A") is None
+assert price_value(None) is None
+
+history = PriceHistory(os.path.join(tempfile.mkdtemp(), "history.sqlite3"))
+now = time.time()
+a = "https://www.takealot.com/x/PLID1"
+b = "https://www.takealot.com/x/PLID2"
+c = "https://www.makro.co.za/drill/p/itm3"
+d = "https://www.amazon.co.za/dp/B000000004"
+
+def row(url, rsp, stock="In stock", seller="Takealot", **extra):
+    return dict({"Link": url, "RSP": rsp, "Stock Availability": stock, "Seller": seller, "Error": "None"}, **extra)
+
+# Error rows and rows served from the cache are not observations
+first = history.start_run()
+assert not history.record(a, row(a, "N/A", Error="Price Not Found"), first, now - 60)
+assert not history.record(a, row(a, "1,299", **{"From Cache": True}), first, now - 60)
+assert len(history) == 0
+assert history.record(a, row(a, "1,299"), first, now - 60)
+assert history.record(b, row(b, "499"), first, now - 60)
+assert history.record(c, row(c, "5689,00", seller="Makro"), first, now - 60)
+assert len(history) == 3
+
+# A first sighting counts as changed
+assert {k: v["changed"] for k, v in history.changes(first).items()} == {
+    "https://takealot.com/PLID1": ["New"], "https://takealot.com/PLID2": ["New"],
+    "https://makro.co.za/drill/p/itm3": ["New"]}
+
+second = history.start_run()
+current = [
+    row(a, "1299.00"),                       # same price, written differently: unchanged
+    row(b, "449"),                           # cheaper
+    row(c, "5689.00", stock="Out of stock", seller="Makro"),
+    row(d, "899", seller="Amazon"),          # first sighting
+]
+for result in current:
+    history.record(result["Link"], result, second, now)
+changes = history.changes()
+print({key: change["changed"] for key, change in changes.items()})
+assert "https://takealot.com/PLID1" not in changes
+assert changes["https://takealot.com/PLID2"]["changed"] == ["RSP"]
+assert changes["https://makro.co.za/drill/p/itm3"]["changed"] == ["Stock Availability"]
+assert changes["https://amazon.co.za/dp/B000000004"]["changed"] == ["New"]
+
+# The changed-rows export: one row per changed product, with the previous values next to the current ones
+changed = history.changed_rows(current + [row("https://takealot.com/y/PLID2?gclid=1", "449")])
+assert [r["Link"] for r in changed] == [b, c, d]
+assert changed[0]["Previous RSP"] == "499" and changed[0]["Changed"] == "RSP"
+assert changed[1]["Previous Stock Availability"] == "In stock" and changed[1]["Previous Seller"] == "Makro"
+assert changed[2]["Previous RSP"] == "N/A" and changed[2]["Previously Checked"] == "N/A"
+assert list(changed[0]) == history.changed_columns(current)
+
+# A run in which nothing moved reports nothing
+third = history.start_run()
+for result in current:
+    history.record(result["Link"], result, third, now + 60)
+assert history.changes(third) == {}
+assert history.changed_rows(current) == []
+
+history.close()
+print("\nAll checks passed!")
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from result_cache import ResultCache
+
+# Rows are written with past check times, so freshness and eviction are checked without waiting.
+HOUR = 3600
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "takealot")
+
+tmp = tempfile.mkdtemp()
+cache = ResultCache(os.path.join(tmp, "cache.sqlite3"))
+now = time.time()
+row = {"RSP": "1799", "Error": "None"}
+
+takealot = "https://www.takealot.com/x/PLID91193746"
+amazon = "https://www.amazon.co.za/dp/B09MR14ZWT"
+other = "https://shop.example.com/item/1"
+
+# TTL by domain: Amazon rows go stale after 4 hours, Takealot after 12, anything else after the default 12
+assert cache.ttl_for(amazon) == 4 * HOUR
+assert cache.ttl_for("https://takealot.com/y/PLID1") == 12 * HOUR
+assert cache.ttl_for(other) == 12 * HOUR
+cache.put(takealot, row, checked_at=now - 6 * HOUR)
+cache.put(amazon, row, checked_at=now - 6 * HOUR)
+cache.put(other, row, checked_at=now - 13 * HOUR)
+assert cache.get(takealot) is not None
+assert cache.get(amazon) is None
+assert cache.get(other) is None
+print("TTL by domain: Takealot hit at 6h, Amazon miss at 6h, default miss at 13h")
+
+# A hit is served under whichever spelling asked for it
+spelling = "https://takealot.com/another-slug/PLID91193746?gclid=1"
+assert cache.get(spelling)["Link"] == spelling
+
+# max_age only ever shortens the TTL
+assert cache.get(takealot, max_age=7 * HOUR) is not None
+assert cache.get(takealot, max_age=5 * HOUR) is None
+assert cache.get(amazon, max_age=24 * HOUR) is None
+
+# Rows with an error are never stored
+cache.put("https://www.takealot.com/x/PLID2", {"RSP": "N/A", "Error": "Price Not Found"})
+assert cache.get("https://www.takealot.com/x/PLID2") is None
+assert len(cache) == 3
+
+# Eviction: rows past the retention age go first, then the oldest beyond max_entries
+small = ResultCache(os.path.join(tmp, "evict.sqlite3"), retention=24 * HOUR, max_entries=3)
+for n, age in enumerate((30, 25, 5, 4, 3, 2, 1)):
+    small.put(f"https://shop.example.com/item/{n}", row, checked_at=now - age * HOUR)
+removed = small.evict()
+print(f"Evicted {removed} of 7 rows")
+assert removed == 4
+assert len(small) == 3
+assert [small.get(f"https://shop.example.com/item/{n}") is not None for n in range(7)] == [False] * 4 + [True] * 3
+small.close()
+
+# force_refresh: scrape_products_batch serves a fresh row from the cache unless asked to refresh,
+# checked against a stand-in for api.takealot.com that counts its requests
+requests_seen = []
+
+class StandInHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        plid = self.path.split('?')[0].rstrip('/').split('/')[-1]
+        requests_seen.append(plid)
+        path = os.path.join(FIXTURE_DIR, f"{plid}.json")
+        if not os.path.exists(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+os.environ["TAKEALOT_API_BASE"] = f"http://127.0.0.1:{server.server_port}/rest/v-1-12-0/product-details"
+import scraper  # reads TAKEALOT_API_BASE
+
+options = dict(cache=cache, rate_limiter=False, metrics=False)
+[served] = scraper.scrape_products_batch([takealot], **options)
+assert served["From Cache"] and requests_seen == []
+[refreshed] = scraper.scrape_products_batch([takealot], force_refresh=True, **options)
+assert requests_seen == ["PLID91193746"] and not refreshed.get("From Cache")
+assert refreshed["RSP"] == "1799" and refreshed["Source"] == "Takealot API"
+# The refresh was written back: the row is fresh again even under a 1 hour max_age
+assert cache.get(takealot, max_age=HOUR) is not None
+print("force_refresh: scraped once and written back; without it the cache answered")
+
+cache.close()
+server.shutdown()
+print("\nAll checks passed!")
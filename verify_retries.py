@@ -0,0 +1,67 @@
+import random
+from retries import (RetryPolicy, NO_RETRIES, classify_result, classify_exception, DEFAULT_ATTEMPT_BUDGETS,
+                     DEFAULT_BASE_DELAYS, TIMEOUT, NAVIGATION, BLOCKED, PARSE_MISS, INVALID_URL, OTHER)
+
+# The 'Error' texts the scraper writes, and the Playwright / network messages that end up in them
+EXPECTED = {
+    "None": None,
+    "Invalid URL": INVALID_URL,
+    "Price Not Found": PARSE_MISS,
+    "Blocked (HTTP 429)": BLOCKED,
+    "Blocked (Access Denied)": BLOCKED,
+    "Timeout 60000ms exceeded.": TIMEOUT,
+    "Page.goto: net::ERR_NAME_NOT_RESOLVED at https://www.makro.co.za/x": NAVIGATION,
+    "Navigation failed because page was closed!": NAVIGATION,
+    "Target closed": NAVIGATION,
+    "Browser has been closed": NAVIGATION,
+    "Connection reset by peer": NAVIGATION,
+    "'NoneType' object has no attribute 'group'": OTHER,
+}
+
+for error, expected in EXPECTED.items():
+    got = classify_result({"Error": error})
+    print(f"{error!r} -> {got}")
+    assert got == expected, (error, got, expected)
+
+# An 'Error Class' already on the row wins over the message
+assert classify_result({"Error": "Timeout 60000ms exceeded.", "Error Class": BLOCKED}) == BLOCKED
+assert classify_result({"Error": "Price Not Found", "Error Class": "None"}) == PARSE_MISS
+assert classify_result({}) is None
+
+class TimeoutError(Exception):
+    """Playwright's own TimeoutError is not the builtin one"""
+
+assert classify_exception(TimeoutError("waiting for selector")) == TIMEOUT
+assert classify_exception(OSError("net::ERR_CONNECTION_REFUSED")) == NAVIGATION
+assert classify_exception(ValueError("bad")) == OTHER
+
+# Successes and invalid URLs are never retried; the others get exactly their attempt budget
+policy = RetryPolicy()
+assert not policy.should_retry(None, 1)
+assert not policy.should_retry(INVALID_URL, 1)
+for error_class, budget in DEFAULT_ATTEMPT_BUDGETS.items():
+    attempts = 1
+    while policy.should_retry(error_class, attempts):
+        attempts += 1
+    assert attempts == budget, (error_class, attempts, budget)
+for error_class in DEFAULT_ATTEMPT_BUDGETS:
+    assert not NO_RETRIES.should_retry(error_class, 1)
+custom = RetryPolicy(budgets={TIMEOUT: 5})
+assert custom.should_retry(TIMEOUT, 4) and not custom.should_retry(TIMEOUT, 5)
+assert custom.budgets[BLOCKED] == DEFAULT_ATTEMPT_BUDGETS[BLOCKED]
+
+# Full jitter: every delay lies in [0, min(max_delay, base * 2 ** (attempt - 1))] and the draws spread out
+random.seed(7)
+policy = RetryPolicy(max_delay=60.0)
+for error_class, base in DEFAULT_BASE_DELAYS.items():
+    for attempt in range(1, 8):
+        bound = min(60.0, base * 2 ** (attempt - 1))
+        draws = [policy.delay(error_class, attempt) for _ in range(200)]
+        assert all(0 <= d <= bound for d in draws), (error_class, attempt, max(draws), bound)
+        assert max(draws) > bound * 0.8 and min(draws) < bound * 0.2, (error_class, attempt)
+    print(f"{error_class}: delays within [0, min(60, {base} * 2 ** (attempt - 1))]")
+assert all(policy.delay(BLOCKED, 20) <= 60.0 for _ in range(100))
+# Classes without a base delay of their own back off like OTHER
+assert all(policy.delay(INVALID_URL, 1) <= DEFAULT_BASE_DELAYS[OTHER] for _ in range(100))
+
+print("\nAll checks passed!")
@@ -0,0 +1,76 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import scraper
+from http_fetcher import SessionPool
+from rate_limit import DomainRateLimiter
+
+# Serves recorded product-details payloads from fixtures/takealot/<PLID>.json,
+# standing in for api.takealot.com so the PLID fast path can be checked offline.
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "takealot")
+
+class StandInHandler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        plid = self.path.split('?')[0].rstrip('/').split('/')[-1]
+        if plid == "PLID429":
+            # The API pushing back
+            self.send_error(429)
+            return
+        path = os.path.join(FIXTURE_DIR, f"{plid}.json")
+        if not os.path.exists(path):
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+api_base = f"http://127.0.0.1:{server.server_port}/rest/v-1-12-0/product-details"
+
+url = "https://www.takealot.com/xiaomi-smart-air-purifier-4-compact-eu/PLID91193746?gclid=abc"
+print(f"Testing URL: {url} against {api_base}")
+
+sessions = SessionPool(scraper.DEFAULT_USER_AGENT)
+data = scraper.scrape_via_takealot_api(sessions, url, api_base)
+for k, v in data.items():
+    print(f"{k}: {v}")
+
+assert data["Source"] == "Takealot API"
+assert data["RSP"] == "1799"
+assert data["Original Price"] == "2199"
+assert data["Seller"] == "Takealot"
+assert data["Stock Availability"] == "In stock"
+assert data["Province"] == "JHB, CPT"
+assert data["Rating"] == "4.6"
+assert data["Review Count"] == "58"
+assert data["Other Seller"] == "Gadget Hub SA"
+assert data["Other Price"] == "1899"
+
+# A PLID the stand-in has no payload for must fall back to the browser (None)
+missing = scraper.scrape_via_takealot_api(sessions, "https://www.takealot.com/x/PLID1", api_base)
+assert missing is None
+
+# A 429 from the API must slow down the takealot.com bucket the batch takes its tokens from,
+# not a separate bucket for the API host
+limiter = DomainRateLimiter()
+paced = SessionPool(scraper.DEFAULT_USER_AGENT, observer=limiter.report)
+product = "https://www.takealot.com/x/PLID429"
+before = limiter.bucket_for(product).rate
+for _ in range(3):
+    assert scraper.scrape_via_takealot_api(paced, product, api_base) is None
+print(f"takealot.com rate after 3 API 429s: {before} -> {limiter.bucket_for(product).rate}")
+assert limiter.bucket_for(product).rate < before
+assert set(limiter.snapshot()) == {"takealot.com"}
+paced.close()
+
+sessions.close()
+server.shutdown()
+print("\nAll checks passed!")
@@ -0,0 +1,131 @@
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from canonical import canonical_url
+
+# Star-breakdown columns older templates carry; they are dropped from every output
+STAR_COLUMNS = ["1★", "2★", "3★", "4★", "5★"]
+
+def merge_results(df, results, url_column='URL', renames=None, only_matched=False, columns=None):
+    """Join scraped rows back onto the uploaded sheet by canonical URL.
+
+    Works whatever order the results come in and however many rows share a product; the scraped
+    fields are shared, but each row's Link is its own URL.
+    renames maps scraper columns to new names (to keep the user's own columns);
+    any other scraper column that already exists in df is overwritten.
+    only_matched drops the rows no result names (e.g. for an export of changed products only).
+    columns lists result columns to include even when no result has them, so an export with
+    no matching rows still gets its full header.
+    """
+    results_df = pd.DataFrame(results)
+    for column in columns or ():
+        if column not in results_df.columns:
+            results_df[column] = None
+    if 'Link' not in results_df.columns:
+        return df.iloc[:0] if only_matched else df
+    if renames:
+        results_df = results_df.rename(columns=renames)
+
+    results_df['_product_key'] = results_df['Link'].map(canonical_url)
+    results_df = results_df.drop_duplicates('_product_key')
+
+    keys = df[url_column].map(canonical_url).rename('_product_key')
+    base = df.drop(columns=[c for c in results_df.columns if c in df.columns])
+    merged = pd.concat([base, keys], axis=1).merge(results_df, on='_product_key', how='left')
+    merged.index = df.index
+    matched = merged['_product_key'].isin(results_df['_product_key'])
+    if 'Link' in merged.columns:
+        merged.loc[matched, 'Link'] = df.loc[matched, url_column]
+    if only_matched:
+        merged = merged[matched]
+    return merged.drop(columns='_product_key')
+
+# --- Streaming workbook I/O ---
+# openpyxl read-only and write-only modes keep one sheet row in memory at a time (plus one result
+# dict per distinct product), so 100k-row sheets never become DataFrames. Only .xlsx is supported; callers fall back to pandas for .xls.
+
+def supports_streaming(filename):
+    return str(filename).lower().endswith(('.xlsx', '.xlsm'))
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+def iter_sheet(source):
+    """Yield the first sheet's header (list of names) and then each row as a tuple, read-only"""
+    _rewind(source)
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        yield [str(name) if name is not None else '' for name in header]
+        for row in rows:
+            if row and any(value is not None for value in row):
+                yield row
+    finally:
+        wb.close()
+
+def read_header(source):
+    return next(iter_sheet(source))
+
+def read_columns(source, columns=('URL',)):
+    """Load only the named columns, e.g. just URL and the key columns: {column: [values]}.
+
+    Raises KeyError naming the first column the sheet does not have.
+    """
+    rows = iter_sheet(source)
+    header = next(rows)
+    for name in columns:
+        if name not in header:
+            raise KeyError(name)
+    positions = {name: header.index(name) for name in columns}
+    values = {name: [] for name in columns}
+    for row in rows:
+        for name, pos in positions.items():
+            values[name].append(row[pos] if pos < len(row) else None)
+    return values
+
+def _cell(value):
+    # Keep numbers, dates and booleans typed; everything else (lists, dicts...) becomes text
+    if value is None or isinstance(value, (str, int, float, bool)) or hasattr(value, 'isoformat'):
+        return value
+    return str(value)
+
+def export_results(source, results, dest, url_column='URL', renames=None, drop_columns=STAR_COLUMNS,
+                   only_matched=False, columns=None):
+    """Write the input sheet plus the scraped columns to dest, one row at a time.
+
+    results is any iterable of result dicts (scrape_products_iter rows, a list, ...). It is read in
+    full before the first row is written, keeping one dict per distinct product, keyed by canonical
+    URL; the input sheet is never loaded whole. It is streamed a second time in read-only mode and
+    joined row by row, keeping the input order; each row's Link is its own URL.
+    renames / overwrite / only_matched / columns rules match merge_results. dest is a path or a writable binary buffer.
+    """
+    by_key = {}
+    result_columns = [renames.get(c, c) if renames else c for c in columns or ()]
+    for result in results:
+        row = {renames.get(k, k) if renames else k: v for k, v in result.items()}
+        for column in row:
+            if column not in result_columns:
+                result_columns.append(column)
+        by_key.setdefault(canonical_url(result.get('Link')), row)
+
+    rows = iter_sheet(source)
+    header = next(rows)
+    url_pos = header.index(url_column)
+    kept = [i for i, name in enumerate(header) if name not in result_columns and name not in drop_columns]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append([header[i] for i in kept] + result_columns)
+    for row in rows:
+        url = row[url_pos] if url_pos < len(row) else None
+        result = by_key.get(canonical_url(url))
+        if result is None:
+            if only_matched:
+                continue
+            result = {}
+        if result:
+            result = dict(result, Link=url)
+        ws.append([_cell(row[i]) if i < len(row) else None for i in kept] +
+                  [_cell(result.get(column)) for column in result_columns])
+    wb.save(dest)